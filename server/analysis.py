@@ -0,0 +1,92 @@
+# File: analysis.py
+import json
+import logging
+from typing import Optional
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Allowed values, as listed in prompts/ordnance.v1.txt
+ORDNANCE_TYPES = {
+    "mine_anti_personnel", "mine_anti_tank", "bomb_air_dropped", "bomb_improvised",
+    "artillery_155mm", "artillery_122mm", "mortar_60mm", "mortar_82mm", "grenade_frag",
+    "grenade_rgd5", "drone_quadcopter", "drone_fixedwing", "drone_loitering_munition",
+    "vehicle_tank", "vehicle_apc", "vehicle_truck_military", "unknown",
+}
+WARCRIME_ASSESSMENTS = {"likely", "possible", "unlikely", "unknown"}
+
+# Column names on UserCapture filled from the parsed response
+ANALYSIS_COLUMNS = (
+    "ordnance_type", "ordnance_subtype", "country_of_origin", "production_period",
+    "warcrime_assessment", "needs_specialist", "confidence", "short_advice",
+)
+
+class OrdnanceAnalysis(BaseModel):
+    """The JSON object the model is instructed to return, with values normalized."""
+    ordnance_type: str = "unknown"
+    subtype: Optional[str] = None
+    country_of_origin: Optional[str] = None
+    production_period: Optional[str] = None
+    warcrime_assessment: str = "unknown"
+    needs_specialist: Optional[bool] = None
+    confidence: Optional[float] = None
+    short_advice: Optional[str] = None
+
+    @field_validator("ordnance_type", mode="before")
+    @classmethod
+    def _ordnance_type(cls, value):
+        value = str(value or "").strip().lower()
+        return value if value in ORDNANCE_TYPES else "unknown"
+
+    @field_validator("warcrime_assessment", mode="before")
+    @classmethod
+    def _warcrime_assessment(cls, value):
+        value = str(value or "").strip().lower()
+        return value if value in WARCRIME_ASSESSMENTS else "unknown"
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _confidence(cls, value):
+        try:
+            return min(1.0, max(0.0, float(value)))
+        except (TypeError, ValueError):
+            return None
+
+
+def parse_analysis(ai_response: Optional[str]) -> Optional[OrdnanceAnalysis]:
+    """Parse a model response into OrdnanceAnalysis. Returns None if it is not the expected JSON object."""
+    if not ai_response:
+        return None
+    # Slicing from the first "{" to the last "}" also drops markdown fences and chatter around the object
+    start, end = ai_response.find("{"), ai_response.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        with span("json_parse"):
+            data = json.loads(ai_response[start:end + 1])
+            if not isinstance(data, dict):
+                return None
+            return OrdnanceAnalysis(**data)
+    except (json.JSONDecodeError, ValidationError) as e:
+        logger.debug(f"Could not parse analysis: {str(e)}")
+        return None
+
+
+def analysis_columns(ai_response: Optional[str]) -> dict:
+    """Typed UserCapture column values for an ai_response; all None when it does not parse."""
+    analysis = parse_analysis(ai_response)
+    if analysis is None:
+        return dict.fromkeys(ANALYSIS_COLUMNS)
+    return {
+        "ordnance_type": analysis.ordnance_type,
+        "ordnance_subtype": analysis.subtype,
+        "country_of_origin": analysis.country_of_origin,
+        "production_period": analysis.production_period,
+        "warcrime_assessment": analysis.warcrime_assessment,
+        "needs_specialist": analysis.needs_specialist,
+        "confidence": analysis.confidence,
+        "short_advice": analysis.short_advice,
+    }
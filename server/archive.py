@@ -0,0 +1,389 @@
+# File: archive.py
+import heapq
+import json
+import logging
+import os
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, delete, func, inspect, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_COMPRESSION
+from database import ArchivedImage, CaptureArchive, CaptureArchiveGuard, UserCapture, engine
+from image_store import image_store
+from pagination import decode_cursor, encode_cursor, keyset_page
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only needed to write or read archived captures
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+archive_root = Path(ARCHIVE_DIR)
+
+# Every UserCapture column; archive files name them by attribute (image_legacy, not image)
+_COLUMNS = [(attr.key, attr.columns[0]) for attr in inspect(UserCapture).column_attrs]
+
+# json_each binds a whole id list as one parameter (see ingest.py)
+_DELETE_IDS = text("DELETE FROM user_captures WHERE id IN (SELECT value FROM json_each(:ids))")
+_STILL_USED = text(
+    "SELECT DISTINCT image_sha256 FROM user_captures WHERE image_sha256 IN (SELECT value FROM json_each(:shas)) "
+    "AND id NOT IN (SELECT value FROM json_each(:ids))"
+)
+_ALREADY_ARCHIVED = text("SELECT sha256 FROM archived_images WHERE sha256 IN (SELECT value FROM json_each(:shas))")
+
+
+def _arrow_type(column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+ARCHIVE_SCHEMA = pa.schema([(key, _arrow_type(column)) for key, column in _COLUMNS]) if pa else None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Archived captures need the pyarrow package")
+
+
+class ArchivedCapture:
+    """A capture read back from an archive file, with the attributes of UserCapture."""
+    image = UserCapture.image  # data URL from the image store, which falls back to the image archives
+
+    def __init__(self, values: dict):
+        self.__dict__.update(values)
+
+
+def _fsync(path: Path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def _publish(tmp: Path, path: Path):
+    _fsync(tmp)
+    os.replace(tmp, path)
+
+
+def archive_captures(
+    older_than_days: int = ARCHIVE_AFTER_DAYS, now: Optional[datetime] = None, batch_size: int = ARCHIVE_BATCH_SIZE
+) -> dict:
+    """
+    Move captures created more than older_than_days ago out of user_captures, one UTC day
+    at a time: into captures/day=YYYY-MM-DD/part-<run>.parquet under ARCHIVE_DIR, and the
+    image blobs only they use into images/day=YYYY-MM-DD/part-<run>.zip.
+
+    The files are written from a read snapshot, without blocking writers. A short write
+    transaction per day then checks that none of the rows changed since, deletes them and
+    lists the file in capture_archives; a day whose rows changed is left for the next run.
+    Readers only open listed files, so an interrupted run leaves at most an unlisted file
+    behind and never shows a capture twice. Rollup and incident counts keep the archived
+    captures, and incidents list them from the archive files; the R*Tree, tiles and the
+    other list endpoints only cover hot rows.
+    """
+    _require_pyarrow()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    run = uuid.uuid4().hex[:12]
+    stats = {"days": 0, "captures": 0, "images": 0, "image_bytes": 0}
+    with engine.connect() as conn:
+        days = conn.scalars(
+            select(func.date(UserCapture.created_at)).where(UserCapture.created_at < cutoff).distinct()
+            .order_by(func.date(UserCapture.created_at))
+        ).all()
+    for day in days:
+        start = datetime.fromisoformat(day)
+        day_stats = _archive_day(day, start, min(start + timedelta(days=1), cutoff), run, batch_size)
+        if day_stats:
+            stats["days"] += 1
+            for key, value in day_stats.items():
+                stats[key] += value
+            logger.info(f"Archived {day}: {day_stats}")
+    return stats
+
+
+class _RowsChanged(Exception):
+    pass
+
+
+def _archive_day(day: str, start: datetime, end: datetime, run: str, batch_size: int) -> Optional[dict]:
+    relative = f"captures/day={day}/part-{run}.parquet"
+    archive = f"images/day={day}/part-{run}.zip"
+    stmt = (
+        select(*(column.label(key) for key, column in _COLUMNS))
+        .where(UserCapture.created_at >= start, UserCapture.created_at < end)
+        .order_by(UserCapture.created_at, UserCapture.id)
+    )
+    written = []  # files removed again unless the day is committed
+    try:
+        snapshot = _write_parquet(archive_root / relative, stmt, batch_size)
+        if snapshot is None:
+            return None
+        written.append(archive_root / relative)
+        digests, images, first, last = snapshot
+        ids = list(digests)
+        with engine.connect() as conn:
+            moving = _unshared_images(conn, ids, images)
+        image_bytes = 0
+        if moving:
+            image_bytes = _write_images(archive_root / archive, moving)
+            written.append(archive_root / archive)
+
+        with engine.begin() as conn:
+            # Takes the write lock; from here on the rows cannot change
+            conn.execute(insert(CaptureArchiveGuard).values(id=1))
+            if _rows_changed(conn, digests, batch_size):
+                raise _RowsChanged()
+            # A capture stored since may use one of the blobs again; it then stays in the store too
+            still_unshared = set(_unshared_images(conn, ids, {sha256: images[sha256] for sha256 in moving}))
+            moving = [sha256 for sha256 in moving if sha256 in still_unshared]
+            for offset in range(0, len(ids), batch_size):
+                conn.execute(_DELETE_IDS, {"ids": json.dumps(ids[offset:offset + batch_size])})
+            conn.execute(delete(CaptureArchiveGuard))
+            conn.execute(insert(CaptureArchive).values(
+                path=relative, day=day, row_count=len(ids), min_id=min(ids), max_id=max(ids),
+                min_created_at=first, max_created_at=last,
+            ))
+            if moving:
+                conn.execute(insert(ArchivedImage), [
+                    {"sha256": sha256, "archive": archive, "size": images[sha256][0], "mime": images[sha256][1]}
+                    for sha256 in moving
+                ])
+        written = []
+    except _RowsChanged:
+        logger.warning(f"Captures of {day} changed while they were archived; left for the next run")
+        return None
+    finally:
+        for path in written:
+            path.unlink(missing_ok=True)
+
+    # A blob uploaded again just now may lose its file here; reads then come from the zip
+    for sha256 in moving:
+        image_store.path_for(sha256).unlink(missing_ok=True)
+    return {"captures": len(ids), "images": len(moving), "image_bytes": image_bytes}
+
+
+def _write_parquet(path: Path, stmt, batch_size: int):
+    """
+    Write the rows of stmt to a new Parquet file, one row group per batch, from one read
+    snapshot. Returns the digest of every row by id, the images used, and the first and
+    last created_at; None (and no file) without rows.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".tmp-{path.name}")
+    digests, images = {}, {}
+    first = last = None
+    compression = None if ARCHIVE_COMPRESSION == "none" else ARCHIVE_COMPRESSION
+    try:
+        with engine.connect() as conn, pq.ParquetWriter(tmp, ARCHIVE_SCHEMA, compression=compression) as writer:
+            result = conn.execution_options(yield_per=batch_size).execute(stmt)
+            for rows in result.partitions():
+                writer.write_batch(pa.RecordBatch.from_pylist([row._asdict() for row in rows], ARCHIVE_SCHEMA))
+                for row in rows:
+                    digests[row.id] = hash(tuple(row))
+                    if row.image_sha256:
+                        images[row.image_sha256] = (row.image_size, row.image_mime)
+                first = first or rows[0].created_at
+                last = rows[-1].created_at
+        if not digests:
+            return None
+        _publish(tmp, path)
+        return digests, images, first, last
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _rows_changed(conn, digests: dict, batch_size: int) -> bool:
+    """Whether any of the rows was updated or deleted since it was written to the archive file."""
+    ids = list(digests)
+    columns = [column.label(key) for key, column in _COLUMNS]
+    for offset in range(0, len(ids), batch_size):
+        chunk = ids[offset:offset + batch_size]
+        rows = conn.execute(select(*columns).where(UserCapture.id.in_(chunk))).all()
+        if len(rows) != len(chunk) or any(digests[row.id] != hash(tuple(row)) for row in rows):
+            return True
+    return False
+
+
+def _unshared_images(conn, ids: List[int], images: dict) -> List[str]:
+    """Blobs of the archived rows that no remaining capture uses and that are not archived yet."""
+    shas = json.dumps(list(images))
+    keep = set(conn.execute(_STILL_USED, {"shas": shas, "ids": json.dumps(ids)}).scalars())
+    keep.update(conn.execute(_ALREADY_ARCHIVED, {"shas": shas}).scalars())
+    return [sha256 for sha256 in images if sha256 not in keep and image_store.exists(sha256)]
+
+
+def _write_images(path: Path, shas: List[str]) -> int:
+    """Copy blobs into a new zip, stored uncompressed (images are compressed already); returns their bytes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".tmp-{path.name}")
+    try:
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for sha256 in shas:
+                zf.write(image_store.path_for(sha256), sha256)
+        size = sum(info.file_size for info in zipfile.ZipFile(tmp).infolist())
+        _publish(tmp, path)
+        return size
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def archived_image(sha256: str) -> Optional[bytes]:
+    """The bytes of an archived image blob, or None; image_store.fallback."""
+    with engine.connect() as conn:
+        archive = conn.scalar(select(ArchivedImage.archive).where(ArchivedImage.sha256 == sha256))
+    if archive is None:
+        return None
+    try:
+        with zipfile.ZipFile(archive_root / archive) as zf:
+            return zf.read(sha256)
+    except (FileNotFoundError, KeyError):
+        logger.warning(f"Archived image {sha256} is missing from {archive}")
+        return None
+
+
+image_store.fallback = archived_image
+
+
+async def archive_files(
+    db: AsyncSession,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    capture_id: Optional[int] = None,
+) -> List[str]:
+    """Paths of the archive files that may hold captures in a time range, or a capture id."""
+    stmt = select(CaptureArchive.path)
+    if start_time is not None:
+        stmt = stmt.where(CaptureArchive.max_created_at >= start_time)
+    if end_time is not None:
+        stmt = stmt.where(CaptureArchive.min_created_at <= end_time)
+    if capture_id is not None:
+        stmt = stmt.where(CaptureArchive.min_id <= capture_id, CaptureArchive.max_id >= capture_id)
+    return [str(archive_root / path) for path in (await db.scalars(stmt.order_by(CaptureArchive.min_created_at))).all()]
+
+
+def _timestamp(value: datetime):
+    return pa.scalar(value, pa.timestamp("us"))
+
+
+def read_archived(
+    paths: List[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    after: Optional[Tuple[datetime, int]],
+    order: str,
+    count: int,
+) -> List[ArchivedCapture]:
+    """
+    Up to count archived captures of the time range in (created_at, id) order (descending for
+    order=desc), past the key after. Files are sorted on that key and row groups outside the
+    filter are skipped on their statistics; ascending reads stop after count rows per file.
+    """
+    _require_pyarrow()
+    created_at, capture_id = ds.field("created_at"), ds.field("id")
+    condition = created_at.is_valid()
+    if start_time is not None:
+        condition &= created_at >= _timestamp(start_time)
+    if end_time is not None:
+        condition &= created_at <= _timestamp(end_time)
+    if after is not None:
+        key = _timestamp(after[0])
+        if order == "desc":
+            condition &= (created_at < key) | ((created_at == key) & (capture_id < after[1]))
+        else:
+            condition &= (created_at > key) | ((created_at == key) & (capture_id > after[1]))
+    rows = []
+    for path in paths:
+        dataset = ds.dataset(path, schema=ARCHIVE_SCHEMA, format="parquet")
+        if order == "desc":
+            table = dataset.to_table(filter=condition)
+            table = table.slice(max(0, table.num_rows - count))
+            rows.extend(reversed(table.to_pylist()))
+        else:
+            rows.extend(dataset.head(count, filter=condition).to_pylist())
+    rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=order == "desc")
+    return [ArchivedCapture(row) for row in rows[:count]]
+
+
+def read_archived_capture(paths: List[str], capture_id: int) -> Optional[ArchivedCapture]:
+    _require_pyarrow()
+    for path in paths:
+        table = ds.dataset(path, schema=ARCHIVE_SCHEMA, format="parquet").to_table(filter=ds.field("id") == capture_id)
+        if table.num_rows:
+            return ArchivedCapture(table.to_pylist()[0])
+    return None
+
+
+async def archived_capture(db: AsyncSession, capture_id: int) -> Optional[ArchivedCapture]:
+    paths = await archive_files(db, capture_id=capture_id)
+    return await run_in_threadpool(read_archived_capture, paths, capture_id) if paths else None
+
+
+def read_archived_incidents(paths: List[str], incident_ids: List[int]) -> List[ArchivedCapture]:
+    """Archived captures linked to any of incident_ids."""
+    _require_pyarrow()
+    condition = ds.field("incident_id").isin(incident_ids)
+    rows = []
+    for path in paths:
+        rows.extend(ds.dataset(path, schema=ARCHIVE_SCHEMA, format="parquet").to_table(filter=condition).to_pylist())
+    return [ArchivedCapture(row) for row in rows]
+
+
+async def archived_incident_captures(db: AsyncSession, incidents: list) -> Dict[int, List[ArchivedCapture]]:
+    """Archived captures of the incidents by incident id, from the files overlapping their first to last sighting."""
+    found: Dict[int, List[ArchivedCapture]] = {incident.id: [] for incident in incidents}
+    if not incidents:
+        return found
+    start = min(incident.first_seen_at for incident in incidents)
+    end = max(incident.last_seen_at for incident in incidents)
+    paths = await archive_files(db, start, end)
+    if paths:
+        for capture in await run_in_threadpool(read_archived_incidents, paths, list(found)):
+            found[capture.incident_id].append(capture)
+    return found
+
+
+async def keyset_page_with_archive(
+    db: AsyncSession,
+    stmt,
+    paths: List[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    limit: int,
+    cursor: Optional[str] = None,
+    order: str = "asc",
+    skip: int = 0,
+) -> Tuple[list, Optional[str]]:
+    """
+    keyset_page over the hot rows of stmt and the archived captures in paths together, in one
+    (created_at, id) order; cursors work across both, so a client pages through as before.
+    Raises ValueError for a negative skip, which would slice from the end of the merged rows.
+    """
+    if skip < 0:
+        raise ValueError("skip must not be negative")
+    after = None
+    if cursor:
+        created_at, capture_id, order = decode_cursor(cursor)
+        after, skip = (created_at, capture_id), 0
+    wanted = skip + limit + 1
+    hot, _ = await keyset_page(db, stmt, wanted, cursor, order)
+    cold = await run_in_threadpool(read_archived, paths, start_time, end_time, after, order, wanted)
+    merged = list(heapq.merge(hot, cold, key=lambda row: (row.created_at, row.id), reverse=order == "desc"))
+    merged = merged[skip:skip + limit + 1]
+    if len(merged) <= limit:
+        return merged, None
+    rows = merged[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id, order)
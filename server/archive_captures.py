@@ -0,0 +1,37 @@
+# File: archive_captures.py
+"""
+Move captures older than ARCHIVE_AFTER_DAYS out of the database into Parquet files under
+ARCHIVE_DIR, one directory per UTC day, and the image blobs only they use into zips.
+
+Meant to run daily (cron). Each day is archived in one transaction, so it can be stopped
+and rerun at any time. Archived captures stay readable through /v1/user-captures/time-range/,
+/v1/user-captures/{id} and /v1/images/{sha256}; the rollup and incident counts keep them.
+--vacuum gives the freed pages back to the file system afterwards (it rewrites the
+database file and blocks writers while it runs).
+
+Usage (from the server directory):
+    python archive_captures.py [--older-than-days 90] [--vacuum]
+"""
+import argparse
+import logging
+
+from sqlalchemy import text
+
+from archive import archive_captures
+from config import ARCHIVE_AFTER_DAYS
+from database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old captures into Parquet files.")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards")
+    args = parser.parse_args()
+    stats = archive_captures(args.older_than_days)
+    if args.vacuum and stats["captures"]:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    logger.info(f"Done: {stats}")
@@ -0,0 +1,266 @@
+# File: backends.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, List, Optional, Sequence
+
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+
+from config import (
+    LLM_HEALTH_INTERVAL_S, LLM_HEALTH_TIMEOUT_S, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_S
+)
+from metrics import LLM_BACKEND_CALLS
+from utils import percentile
+
+logger = logging.getLogger(__name__)
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"  # no requests until the cooldown has passed
+BREAKER_HALF_OPEN = "half_open"  # one trial request decides whether it closes or opens again
+
+
+def is_node_failure(error: BaseException) -> bool:
+    """Errors that say the backend itself is unwell (connection, timeout, 5xx)."""
+    return isinstance(error, APIConnectionError) or (isinstance(error, APIStatusError) and error.status_code >= 500)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Errors another attempt (preferably on another backend) may not hit: node failures and 429."""
+    return is_node_failure(error) or (isinstance(error, APIStatusError) and error.status_code == 429)
+
+
+class Backend:
+    """One OpenAI-compatible server: its client, outstanding requests, latency, errors and circuit breaker."""
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        http_client: httpx.AsyncClient,
+        sample_size: int = 1024,
+        on_release: Optional[Callable[[], None]] = None,
+    ):
+        self.url = url.rstrip("/")
+        self.on_release = on_release  # called whenever an outstanding request ends
+        # Retries are made by AsyncLLMClient, which can send them to another backend
+        self.openai = AsyncOpenAI(api_key=api_key, base_url=self.url, http_client=http_client, max_retries=0)
+        self.outstanding = 0
+        self.calls = 0
+        self.failures = 0
+        self.latency_ms = deque(maxlen=sample_size)
+        self.consecutive_failures = 0
+        self.breaker = BREAKER_CLOSED
+        self.open_until = 0.0
+        self.probing = False  # the half-open trial request is in flight
+        self.healthy = True  # until a health check says otherwise
+        self.last_error: Optional[str] = None
+
+    def available(self, now: float) -> bool:
+        if not self.healthy:
+            return False
+        if self.breaker == BREAKER_OPEN and now >= self.open_until:
+            self.breaker = BREAKER_HALF_OPEN
+        if self.breaker == BREAKER_HALF_OPEN:
+            return not self.probing
+        return self.breaker == BREAKER_CLOSED
+
+    def begin(self):
+        self.outstanding += 1
+        self.calls += 1
+        if self.breaker == BREAKER_HALF_OPEN:
+            self.probing = True
+
+    def _release(self):
+        self.outstanding -= 1
+        self.probing = False
+        if self.on_release is not None:
+            self.on_release()
+
+    def succeeded(self, latency_ms: Optional[float] = None):
+        self._release()
+        self.consecutive_failures = 0
+        if self.breaker != BREAKER_CLOSED:
+            logger.info(f"LLM backend {self.url} recovered; circuit closed")
+            self.breaker = BREAKER_CLOSED
+        if latency_ms is not None:
+            self.latency_ms.append(latency_ms)
+        LLM_BACKEND_CALLS.inc((self.url, "ok"))
+
+    def failed(self, error: BaseException, threshold: int, cooldown: float):
+        self._release()
+        self.last_error = f"{type(error).__name__}: {error}"
+        if not is_node_failure(error):
+            # The request was refused (4xx), the backend itself is fine
+            LLM_BACKEND_CALLS.inc((self.url, "rejected"))
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        LLM_BACKEND_CALLS.inc((self.url, "failed"))
+        if self.breaker == BREAKER_HALF_OPEN or self.consecutive_failures >= threshold:
+            if self.breaker != BREAKER_OPEN:
+                logger.warning(f"LLM backend {self.url} circuit opened for {cooldown:.1f}s: {self.last_error}")
+            self.breaker = BREAKER_OPEN
+            self.open_until = time.monotonic() + cooldown
+
+    def cancelled(self):
+        """The caller gave up (timeout, lost hedge, client gone); says nothing about the backend."""
+        self._release()
+
+    def snapshot(self) -> dict:
+        samples = list(self.latency_ms)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "breaker": self.breaker,
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_ms": {
+                "count": len(samples),
+                "p50": round(percentile(samples, 0.50), 2),
+                "p95": round(percentile(samples, 0.95), 2),
+                "p99": round(percentile(samples, 0.99), 2),
+            },
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """
+    OpenAI-compatible backends behind one client, routed by least outstanding requests.
+
+    A backend leaves the rotation when its circuit breaker opens (LLM_BREAKER_FAILURES
+    consecutive connection errors, timeouts or 5xx) or when an active health check
+    (GET <url>/models every LLM_HEALTH_INTERVAL_S) fails. After LLM_BREAKER_COOLDOWN_S
+    one trial request is let through; its outcome closes or re-opens the circuit.
+    If no backend is available, requests still go to the least loaded one rather than
+    failing outright.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        api_key: str,
+        http_client: httpx.AsyncClient,
+        breaker_failures: int = LLM_BREAKER_FAILURES,
+        breaker_cooldown: float = LLM_BREAKER_COOLDOWN_S,
+        health_interval: float = LLM_HEALTH_INTERVAL_S,
+        health_timeout: float = LLM_HEALTH_TIMEOUT_S,
+    ):
+        if not urls:
+            raise ValueError("At least one LLM backend URL is required")
+        self.api_key = api_key
+        self.http_client = http_client
+        self.backends = [Backend(url, api_key, http_client, on_release=self._wake_next) for url in urls]
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self._next = 0  # rotates the starting point so ties do not always land on the first backend
+        self._health_task: Optional[asyncio.Task] = None
+        self._waiters = deque()  # acquire() calls waiting for a request to end, oldest first
+
+    def pick(self, exclude: Sequence[Backend] = (), max_outstanding: Optional[int] = None) -> Optional[Backend]:
+        """
+        The available backend with the fewest outstanding requests, avoiding exclude where possible.
+        With max_outstanding, only a backend below it is returned (None if there is none).
+        """
+        now = time.monotonic()
+        self._next = (self._next + 1) % len(self.backends)
+        rotated = self.backends[self._next:] + self.backends[:self._next]
+        available = [b for b in rotated if b.available(now)]
+        if max_outstanding is not None:
+            idle = [b for b in available if b not in exclude and b.outstanding < max_outstanding]
+            return min(idle, key=lambda b: b.outstanding, default=None)
+        candidates = [b for b in available if b not in exclude] or available or rotated
+        return min(candidates, key=lambda b: b.outstanding)
+
+    def pick_free(self, limit: int, exclude: Sequence[Backend] = ()) -> Optional[Backend]:
+        """
+        Like pick, but only among backends with fewer than limit outstanding requests: None while
+        every available backend is full. Requests go to a backend that is not available only when
+        none is, as with pick.
+        """
+        now = time.monotonic()
+        self._next = (self._next + 1) % len(self.backends)
+        rotated = self.backends[self._next:] + self.backends[:self._next]
+        available = [b for b in rotated if b.available(now)]
+        free = [b for b in (available or rotated) if b.outstanding < limit]
+        candidates = [b for b in free if b not in exclude] or free
+        return min(candidates, key=lambda b: b.outstanding, default=None)
+
+    async def acquire(self, limit: int, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        The backend pick_free chooses, with the request already begun. While there is none,
+        waits (oldest caller first) for a request to end, so no backend ever has more than
+        limit requests outstanding, however many others are out of the rotation.
+        """
+        while True:
+            backend = self.pick_free(limit, exclude)
+            if backend is not None:
+                backend.begin()
+                return backend
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_next()  # woken, then gave up: the freed slot goes to the next caller
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake_next(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def start(self):
+        """Start the health check loop; called once the event loop is running."""
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(backend) for backend in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+    async def check(self, backend: Backend) -> bool:
+        """Any non-5xx answer from <url>/models counts as healthy; the breaker still tracks real calls."""
+        try:
+            response = await self.http_client.get(
+                f"{backend.url}/models",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.health_timeout,
+            )
+            healthy = response.status_code < 500
+            error = None if healthy else f"health check: HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            healthy, error = False, f"health check: {type(e).__name__}: {e}"
+        if healthy != backend.healthy:
+            log = logger.info if healthy else logger.warning
+            log(f"LLM backend {backend.url} is {'healthy' if healthy else 'unhealthy'}" + (f" ({error})" if error else ""))
+        backend.healthy = healthy
+        if error:
+            backend.last_error = error
+        return healthy
+
+    @property
+    def outstanding(self) -> int:
+        return sum(backend.outstanding for backend in self.backends)
+
+    def snapshot(self) -> List[dict]:
+        return [backend.snapshot() for backend in self.backends]
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
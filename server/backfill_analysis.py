@@ -0,0 +1,59 @@
+# File: backfill_analysis.py
+"""
+Parse ai_response of existing captures into the typed analysis columns.
+
+By default only rows without an ordnance_type are processed; --all re-parses
+every row (e.g. after changing the validation rules). Rows are processed in
+id order in batches, each committed on its own, so the job can be re-run.
+
+Usage (from the server directory):
+    python backfill_analysis.py [--batch-size 500] [--all]
+"""
+import argparse
+import logging
+
+from sqlalchemy import update
+
+from analysis import analysis_columns
+from database import SessionLocal, UserCapture
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def backfill(batch_size: int = 500, reparse_all: bool = False) -> dict:
+    stats = {"parsed": 0, "unparsed": 0}
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            query = db.query(UserCapture.id, UserCapture.ai_response).filter(UserCapture.id > last_id)
+            if not reparse_all:
+                query = query.filter(UserCapture.ordnance_type.is_(None))
+            rows = query.order_by(UserCapture.id).limit(batch_size).all()
+            if not rows:
+                break
+            params = []
+            for capture_id, ai_response in rows:
+                columns = analysis_columns(ai_response)
+                stats["parsed" if columns["ordnance_type"] else "unparsed"] += 1
+                params.append({"id": capture_id, **columns})
+            # Bulk UPDATE ... WHERE id = :id, executed as one executemany
+            db.execute(update(UserCapture), params)
+            db.commit()
+            last_id = rows[-1][0]
+            logger.info(f"Backfilled up to capture id {last_id}: {stats}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse ai_response into typed analysis columns.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="re-parse rows that already have analysis fields")
+    args = parser.parse_args()
+    logger.info(f"Done: {backfill(args.batch_size, args.all)}")
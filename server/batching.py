@@ -0,0 +1,182 @@
+# File: batching.py
+import asyncio
+import logging
+from collections import deque, Counter
+from typing import Optional
+
+from clients import llm, AsyncLLMClient
+from config import BATCH_WINDOW_MS, BATCH_MAX_SIZE
+from utils import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("kwargs", "future", "enqueued_at", "dispatch_by", "has_deadline")
+
+    def __init__(self, kwargs, future, enqueued_at, dispatch_by, has_deadline):
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.dispatch_by = dispatch_by
+        self.has_deadline = has_deadline
+
+
+class BatchStats:
+    """Batch size, queueing and service time statistics, used to tune the window."""
+
+    def __init__(self, sample_size: int = 1024):
+        self.batches = 0
+        self.requests = 0
+        self.batch_sizes = Counter()
+        self.flush_reasons = Counter()
+        self.wait_ms = deque(maxlen=sample_size)
+        self.service_ms = deque(maxlen=sample_size)
+
+    def record_batch(self, size: int, reason: str, waits_ms: list, service_ms: float):
+        self.batches += 1
+        self.requests += size
+        self.batch_sizes[size] += 1
+        self.flush_reasons[reason] += 1
+        self.wait_ms.extend(waits_ms)
+        self.service_ms.append(service_ms)
+
+    def snapshot(self) -> dict:
+        waits = list(self.wait_ms)
+        services = list(self.service_ms)
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "flush_reasons": dict(self.flush_reasons),
+            "wait_ms": {
+                "mean": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                "p50": round(percentile(waits, 0.50), 2),
+                "p95": round(percentile(waits, 0.95), 2),
+                "max": round(max(waits, default=0.0), 2),
+            },
+            "batch_service_ms": {
+                "mean": round(sum(services) / len(services), 2) if services else 0.0,
+                "p95": round(percentile(services, 0.95), 2),
+            },
+        }
+
+
+class BatchDispatcher:
+    """
+    Collects concurrent chat completions for up to `window` seconds or
+    `max_batch_size` requests and sends them to the backend as one burst, so
+    vLLM schedules them in the same step instead of trickling in one by one.
+
+    Each request may carry a deadline (seconds it is willing to wait for a batch
+    to form); the batch is flushed as soon as the earliest deadline is reached.
+    A window of 0 disables batching and calls the client directly.
+    """
+
+    def __init__(self, client: AsyncLLMClient, window: float, max_batch_size: int):
+        self.client = client
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.stats = BatchStats()
+        self._pending = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, deadline: Optional[float] = None, **kwargs):
+        """Queue one chat completion and wait for its result."""
+        if not self.enabled:
+            return await self.client.chat_completion(**kwargs)
+
+        loop = asyncio.get_running_loop()
+        self._ensure_running()
+        now = loop.time()
+        has_deadline = deadline is not None and deadline < self.window
+        hold = max(deadline, 0.0) if has_deadline else self.window
+        item = _Pending(kwargs, loop.create_future(), now, now + hold, has_deadline)
+        self._pending.append(item)
+        self._wakeup.set()
+        return await item.future
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            if len(self._pending) >= self.max_batch_size:
+                reason = "full"
+            else:
+                first = min(self._pending, key=lambda p: p.dispatch_by)
+                remaining = first.dispatch_by - loop.time()
+                if remaining > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                        continue  # new request arrived; re-evaluate size and deadlines
+                    except asyncio.TimeoutError:
+                        pass
+                reason = "deadline" if first.has_deadline else "window"
+
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.create_task(self._dispatch(batch, reason))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: list, reason: str):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        batch = [p for p in batch if not p.future.done()]  # callers that disconnected while waiting
+        if not batch:
+            return
+        waits_ms = [(started - p.enqueued_at) * 1000 for p in batch]
+        results = await asyncio.gather(
+            *(self.client.chat_completion(**p.kwargs) for p in batch),
+            return_exceptions=True,
+        )
+        self.stats.record_batch(len(batch), reason, waits_ms, (loop.time() - started) * 1000)
+        for item, result in zip(batch, results):
+            if item.future.done():
+                continue
+            if isinstance(result, BaseException):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "pending": self.pending,
+            **self.stats.snapshot(),
+        }
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+        for item in self._pending:
+            if not item.future.done():
+                item.future.cancel()
+        self._pending = []
+
+
+# Shared dispatcher for vision queries
+vision_dispatcher = BatchDispatcher(llm, BATCH_WINDOW_MS / 1000, BATCH_MAX_SIZE)
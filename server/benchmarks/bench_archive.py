@@ -0,0 +1,173 @@
+# benchmarks/bench_archive.py
+"""
+Hot/cold tiering: archiving old captures into Parquet and reading them back.
+
+Runs:
+  before                          - database file size and time-range page latency with every
+                                    capture in the database
+  archive(older_than_days=..)     - archive_captures.py over the seeded year: rows/s, Parquet
+                                    and image zip sizes, database size after VACUUM
+  read(range, order)              - GET /v1/user-captures/time-range/ (--page-size rows) before
+                                    and after archiving, for a recent (hot) week, an archived
+                                    (cold) week and a range spanning the boundary; median ms
+                                    of --repeat requests and whether the pages are identical
+  paged(range)                    - every page of the spanning range through X-Next-Cursor
+  id_reuse                        - delete the newest capture, then create one: its id must be
+                                    past every archived id, and both captures stay readable
+
+--captures rows are spread evenly over the last 365 days; every 50th has its own image
+blob, the others share one.
+
+Usage (from the server directory):
+    python benchmarks/bench_archive.py --captures 200000
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-archive-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "archive")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert, text  # noqa: E402
+
+from archive import archive_captures  # noqa: E402
+from database import UserCapture, engine  # noqa: E402
+from image_store import image_store  # noqa: E402
+from main import app  # noqa: E402
+from pagination import NEXT_CURSOR_HEADER  # noqa: E402
+
+logging.disable(logging.WARNING)
+# 1x1 PNG
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+AI_RESPONSE = json.dumps({
+    "ordnance_type": "mine_anti_tank", "subtype": "TM-62", "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present", "warcrime_assessment": "possible",
+    "needs_specialist": True, "confidence": 0.8, "short_advice": "Keep clear and mark the area.",
+})
+
+
+def seed(count: int, now: datetime):
+    shared = image_store.put(b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8)
+    step = timedelta(days=365) / count
+    for offset in range(0, count, 50000):
+        rows = []
+        for i in range(offset, min(count, offset + 50000)):
+            sha256 = image_store.put(b"\x89PNG\r\n\x1a\n" + i.to_bytes(8, "big") * 512) if i % 50 == 0 else shared
+            rows.append({
+                "user_id": f"u-{i}", "query_text": "What is this?", "image_sha256": sha256, "image_size": 4096,
+                "image_mime": "image/png", "latitude": 48.0 + (i % 1000) * 1e-3, "longitude": 35.0 + (i // 1000) * 1e-3,
+                "created_at": now - step * i, "ai_response": AI_RESPONSE, "ordnance_type": "mine_anti_tank",
+                "needs_specialist": True, "confidence": 0.8,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(UserCapture), rows)
+
+
+def db_mb() -> float:
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return round(os.path.getsize(os.environ["SQLITE_DB_PATH"]) / 2 ** 20, 1)
+
+
+def dir_mb(path: Path, pattern: str) -> float:
+    return round(sum(f.stat().st_size for f in path.rglob(pattern)) / 2 ** 20, 1)
+
+
+def read_pages(client: TestClient, ranges: dict, page_size: int, repeat: int) -> dict:
+    out = {}
+    for name, (start, end) in ranges.items():
+        for order in ("asc", "desc"):
+            params = {"start_time": start.isoformat(), "end_time": end.isoformat(), "limit": page_size, "order": order}
+            timings = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                response = client.get("/v1/user-captures/time-range/", params=params)
+                timings.append((time.perf_counter() - t) * 1000)
+            out[(name, order)] = (statistics.median(timings), response.content)
+    return out
+
+
+def paged(client: TestClient, start: datetime, end: datetime, page_size: int):
+    rows, cursor = 0, None
+    t = time.perf_counter()
+    while True:
+        params = {"start_time": start.isoformat(), "end_time": end.isoformat(), "limit": page_size}
+        response = client.get("/v1/user-captures/time-range/", params={**params, **({"cursor": cursor} if cursor else {})})
+        rows += len(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            return rows, time.perf_counter() - t
+
+
+def main(args):
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=args.older_than_days)
+    ranges = {
+        "hot": (now - timedelta(days=7), now),
+        "cold": (cutoff - timedelta(days=60), cutoff - timedelta(days=53)),
+        "spanning": (cutoff - timedelta(days=7), cutoff + timedelta(days=7)),
+    }
+    with TestClient(app) as client:
+        seed(args.captures, now)
+        print(json.dumps({"run": "before", "captures": args.captures, "db_mb": db_mb()}))
+        before = read_pages(client, ranges, args.page_size, args.repeat)
+        rows_before, _ = paged(client, *ranges["spanning"], args.page_size)
+
+        t = time.perf_counter()
+        stats = archive_captures(args.older_than_days, now=now)
+        elapsed = time.perf_counter() - t
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        archive = Path(os.environ["ARCHIVE_DIR"])
+        print(json.dumps({
+            "run": f"archive(older_than_days={args.older_than_days})", **stats,
+            "rows_per_s": round(stats["captures"] / elapsed), "seconds": round(elapsed, 1),
+            "parquet_mb": dir_mb(archive, "*.parquet"), "zip_mb": dir_mb(archive, "*.zip"), "db_mb": db_mb(),
+        }))
+
+        after = read_pages(client, ranges, args.page_size, args.repeat)
+        for key, (ms, body) in after.items():
+            print(json.dumps({
+                "run": f"read({key[0]}, {key[1]})", "before_ms": round(before[key][0], 1), "after_ms": round(ms, 1),
+                "identical": body == before[key][1],
+            }))
+        rows, seconds = paged(client, *ranges["spanning"], args.page_size)
+        print(json.dumps({"run": "paged(spanning)", "rows": rows, "rows_before": rows_before, "seconds": round(seconds, 2)}))
+        id_reuse(client)
+
+
+def id_reuse(client: TestClient):
+    with engine.connect() as conn:
+        newest = conn.scalar(text("SELECT MAX(id) FROM user_captures"))
+        archived = conn.scalar(text("SELECT MAX(max_id) FROM capture_archives"))
+    client.delete(f"/v1/user-captures/{newest}")
+    created = client.post("/v1/user-captures/", json={
+        "user_id": "u-after-archive", "query_text": "What is this?", "image": IMAGE, "latitude": 48.0, "longitude": 35.0, "ai_response": AI_RESPONSE,
+    }).json()["id"]
+    print(json.dumps({
+        "run": "id_reuse", "deleted_id": newest, "new_id": created, "max_archived_id": archived,
+        "reused": created <= max(newest, archived or 0),
+        "archived_readable": client.get(f"/v1/user-captures/{archived}").json()["id"] == archived,
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", type=int, default=200000)
+    parser.add_argument("--older-than-days", type=int, default=90)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
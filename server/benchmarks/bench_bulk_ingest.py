@@ -0,0 +1,86 @@
+# benchmarks/bench_bulk_ingest.py
+"""
+Capture ingest rate: POST /v1/user-captures/bulk vs one POST /v1/user-captures/ per item.
+
+A throwaway database receives --count captures through the bulk endpoint, once as
+a JSON array and once as streamed NDJSON, then the whole array again to time the
+all-duplicates path. --single-count captures go through the per-item endpoint for
+comparison. Captures carry a parsed-analysis ai_response but no image, so the
+numbers reflect validation, dedupe and insert cost.
+
+Usage (from the server directory):
+    python benchmarks/bench_bulk_ingest.py --count 50000
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-ingest-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app  # noqa: E402
+
+logging.disable(logging.INFO)
+AI_RESPONSE = json.dumps({
+    "ordnance_type": "mine_anti_tank", "subtype": "TM-62", "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present", "warcrime_assessment": "possible",
+    "needs_specialist": True, "confidence": 0.8, "short_advice": "Keep clear and mark the area.",
+})
+
+
+def captures(prefix: str, count: int) -> list:
+    return [{
+        "user_id": f"{prefix}-{i}", "query_text": "What is this?", "image": "",
+        "latitude": 48.0 + (i % 1000) * 1e-3, "longitude": 35.0 + (i // 1000) * 1e-3, "ai_response": AI_RESPONSE,
+    } for i in range(count)]
+
+
+def report(mode: str, count: int, elapsed: float, body: dict = None):
+    result = {"mode": mode, "captures": count, "seconds": round(elapsed, 3), "captures_per_s": round(count / elapsed)}
+    if body is not None:
+        result.update(created=body["created"], duplicates=body["duplicates"], invalid=body["invalid"])
+    print(json.dumps(result))
+
+
+def main(args):
+    with TestClient(app) as client:
+        items = captures("json", args.count)
+        start = time.perf_counter()
+        response = client.post("/v1/user-captures/bulk", json=items)
+        report("bulk_json", args.count, time.perf_counter() - start, response.json())
+
+        ndjson = "\n".join(json.dumps(item) for item in captures("ndjson", args.count)).encode()
+        start = time.perf_counter()
+        response = client.post(
+            "/v1/user-captures/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"}
+        )
+        report("bulk_ndjson", args.count, time.perf_counter() - start, response.json())
+
+        start = time.perf_counter()
+        response = client.post("/v1/user-captures/bulk", json=items)
+        report("bulk_json_all_duplicates", args.count, time.perf_counter() - start, response.json())
+
+        start = time.perf_counter()
+        for item in captures("single", args.single_count):
+            client.post("/v1/user-captures/", json=item)
+        report("single_post", args.single_count, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50_000)
+    parser.add_argument("--single-count", type=int, default=1000)
+    try:
+        main(parser.parse_args())
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
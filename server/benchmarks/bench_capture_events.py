@@ -0,0 +1,139 @@
+# benchmarks/bench_capture_events.py
+"""
+Time-to-display of new captures and load on the server for consoles that poll
+/v1/user-captures/ vs consoles subscribed to /v1/capture-events.
+
+A uvicorn server runs in this process on a throwaway database. --consoles
+clients either poll the newest 50 summary rows every --poll-interval seconds or
+hold one Server-Sent Events stream each, while a writer creates --captures
+captures at --rate per second. Time-to-display is measured from the create
+request to the moment a console first sees the capture; bytes are what the
+consoles downloaded in total.
+
+Usage (from the server directory):
+    python benchmarks/bench_capture_events.py --consoles 50 --captures 40 --rate 2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-events-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from main import app  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+
+class Console:
+    def __init__(self):
+        self.seen = {}  # user_id -> first time seen
+        self.bytes = 0
+        self.requests = 0
+
+
+async def poll_console(client: httpx.AsyncClient, console: Console, interval: float, stop: asyncio.Event):
+    while not stop.is_set():
+        response = await client.get("/v1/user-captures/", params={"order": "desc", "limit": 50, "view": "summary"})
+        now = time.perf_counter()
+        console.requests += 1
+        console.bytes += len(response.content)
+        for item in response.json():
+            console.seen.setdefault(item["user_id"], now)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def push_console(client: httpx.AsyncClient, console: Console, ready: asyncio.Event):
+    console.requests += 1
+    async with client.stream("GET", "/v1/capture-events") as response:
+        async for line in response.aiter_lines():
+            console.bytes += len(line) + 1
+            if line.startswith("data:"):
+                data = json.loads(line[6:])
+                if "user_id" in data:
+                    console.seen.setdefault(data["user_id"], time.perf_counter())
+                else:
+                    ready.set()
+
+
+async def run(mode: str, client: httpx.AsyncClient, args) -> dict:
+    consoles = [Console() for _ in range(args.consoles)]
+    stop = asyncio.Event()
+    if mode == "poll":
+        tasks = [asyncio.create_task(poll_console(client, c, args.poll_interval, stop)) for c in consoles]
+    else:
+        readies = [asyncio.Event() for _ in consoles]
+        tasks = [asyncio.create_task(push_console(client, c, r)) for c, r in zip(consoles, readies)]
+        await asyncio.gather(*(r.wait() for r in readies))
+
+    created = {}
+    for i in range(args.captures):
+        user_id = f"{mode}-{i}"
+        created[user_id] = time.perf_counter()
+        await client.post("/v1/user-captures/", json={
+            "user_id": user_id, "query_text": "What is this?", "image": "",
+            "latitude": 50.0, "longitude": 30.0, "ai_response": "{}",
+        })
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.sleep(args.poll_interval + 1)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    delays = [(c.seen[u] - t) * 1000 for c in consoles for u, t in created.items() if u in c.seen]
+    return {
+        "mode": mode,
+        "consoles": args.consoles,
+        "captures": args.captures,
+        "missed": args.consoles * args.captures - len(delays),
+        "display_p50_ms": round(percentile(delays, 0.50), 1),
+        "display_p95_ms": round(percentile(delays, 0.95), 1),
+        "console_requests": sum(c.requests for c in consoles),
+        "console_kb": round(sum(c.bytes for c in consoles) / 1024, 1),
+    }
+
+
+async def main(args):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    limits = httpx.Limits(max_connections=args.consoles + 10)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+        for mode in ("poll", "push"):
+            print(json.dumps(await run(mode, client, args)))
+    server.should_exit = True
+    await serving
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consoles", type=int, default=50)
+    parser.add_argument("--captures", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=2.0)
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
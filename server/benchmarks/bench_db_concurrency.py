@@ -0,0 +1,188 @@
+# benchmarks/bench_db_concurrency.py
+"""
+Mixed read/write throughput of the capture CRUD routes under concurrency.
+
+Three setups serve the same workload through in-process ASGI clients, each on
+its own throwaway SQLite database seeded with --rows captures:
+
+  baseline          the original engine: echo=True, rollback journal, default
+                    synchronous mode, no busy timeout, sync handlers in the threadpool
+  baseline-no-echo  the same without statement logging, to separate that cost
+  tuned             the app's async handlers on aiosqlite with the WAL/pragma
+                    settings from database.py (configure via the DB_* env vars)
+
+--concurrency workers each issue requests for --seconds: with probability
+--write-ratio a POST /v1/user-captures/, otherwise a 50-row list page.
+Statement logs of the baseline are formatted but written to /dev/null.
+
+Usage (from the server directory):
+    python benchmarks/bench_db_concurrency.py --concurrency 32 --seconds 10 --write-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+_tmp = tempfile.mkdtemp(prefix="bench-db-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "tuned.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import Depends, FastAPI, HTTPException, status  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from database import Base, UserCapture, SPATIAL_INDEX_DDL, engine, async_engine, startup_event  # noqa: E402
+from image_store import image_columns  # noqa: E402
+from analysis import analysis_columns  # noqa: E402
+from schemas import UserCaptureCreate, UserCaptureResponse  # noqa: E402
+from utils import percentile  # noqa: E402
+from main import app as tuned_app  # noqa: E402
+
+# Request logs would dominate the measurement; the baseline's echo handler is redirected separately
+logging.getLogger().setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+AI_RESPONSE = json.dumps({
+    "ordnance_type": "mine_anti_tank", "subtype": "TM-62", "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present", "warcrime_assessment": "possible",
+    "needs_specialist": True, "confidence": 0.8, "short_advice": "Keep clear and mark the area.",
+})
+
+
+def baseline_app(echo: bool, rows: int) -> FastAPI:
+    """The list/create routes as they were before the async layer, on a default-configured engine."""
+    baseline_engine = create_engine(f"sqlite:///{os.path.join(_tmp, f'baseline-{int(echo)}.db')}", echo=echo)
+    if echo:
+        echo_logger = logging.getLogger("sqlalchemy.engine.Engine")
+        echo_logger.propagate = False
+        for handler in echo_logger.handlers:
+            handler.setStream(open(os.devnull, "w"))
+    prepare_db(baseline_engine)
+    seed(baseline_engine, rows)
+    BaselineSession = sessionmaker(autocommit=False, autoflush=False, bind=baseline_engine)
+
+    def get_db():
+        db = BaselineSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/v1/user-captures/", response_model=List[UserCaptureResponse])
+    def read_user_captures(limit: int = 100, order: str = "asc", db: Session = Depends(get_db)):
+        key = (UserCapture.created_at.desc(), UserCapture.id.desc()) if order == "desc" else (UserCapture.created_at, UserCapture.id)
+        return db.query(UserCapture).order_by(*key).limit(limit).all()
+
+    @app.post("/v1/user-captures/", response_model=UserCaptureResponse, status_code=status.HTTP_201_CREATED)
+    def create_user_capture(capture_create: UserCaptureCreate, db: Session = Depends(get_db)):
+        if db.query(UserCapture).filter(UserCapture.user_id == capture_create.user_id).first():
+            raise HTTPException(status_code=409, detail="User capture for this user_id already exists")
+        capture_data = capture_create.dict()
+        capture_data.update(image_columns(capture_data.pop("image")))
+        capture_data.update(analysis_columns(capture_data["ai_response"]))
+        db_capture = UserCapture(**capture_data)
+        db.add(db_capture)
+        db.commit()
+        db.refresh(db_capture)
+        return db_capture
+
+    return app
+
+
+def prepare_db(target_engine):
+    Base.metadata.create_all(bind=target_engine)
+    with target_engine.begin() as conn:
+        for statement in SPATIAL_INDEX_DDL:
+            conn.execute(text(statement))
+
+
+def seed(target_engine, rows: int):
+    with target_engine.begin() as conn:
+        conn.execute(
+            UserCapture.__table__.insert(),
+            [{
+                "user_id": f"seed-{i}", "query_text": "What is this?", "latitude": 50.0 + i * 1e-4,
+                "longitude": 30.0, "ai_response": AI_RESPONSE, **analysis_columns(AI_RESPONSE),
+            } for i in range(rows)],
+        )
+
+
+async def drive(app, concurrency: int, seconds: float, write_ratio: float, label: str) -> dict:
+    reads, writes, errors = [], [], 0
+    counter = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop_at = time.perf_counter() + seconds
+
+        async def worker(seed_value: int):
+            nonlocal errors, counter
+            rng = random.Random(seed_value)
+            while time.perf_counter() < stop_at:
+                start = time.perf_counter()
+                if rng.random() < write_ratio:
+                    counter += 1
+                    response = await client.post("/v1/user-captures/", json={
+                        "user_id": f"{label}-{seed_value}-{counter}", "query_text": "What is this?",
+                        "image": "", "latitude": 50.0, "longitude": 30.0, "ai_response": AI_RESPONSE,
+                    })
+                    samples = writes
+                else:
+                    response = await client.get("/v1/user-captures/", params={"limit": 50, "order": "desc"})
+                    samples = reads
+                if response.status_code >= 400:
+                    errors += 1
+                else:
+                    samples.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "setup": label,
+        "ops_per_s": round((len(reads) + len(writes)) / elapsed, 1),
+        "reads": len(reads),
+        "writes": len(writes),
+        "errors": errors,
+        "read_p50_ms": round(percentile(reads, 0.50), 2),
+        "read_p95_ms": round(percentile(reads, 0.95), 2),
+        "write_p50_ms": round(percentile(writes, 0.50), 2),
+        "write_p95_ms": round(percentile(writes, 0.95), 2),
+    }
+
+
+async def main(args):
+    seed(engine, args.rows)
+    await startup_event()  # ASGITransport does not run the app's lifespan
+    setups = [
+        ("baseline", baseline_app(echo=True, rows=args.rows)),
+        ("baseline-no-echo", baseline_app(echo=False, rows=args.rows)),
+        ("tuned", tuned_app),
+    ]
+    for label, app in setups:
+        result = await drive(app, args.concurrency, args.seconds, args.write_ratio, label)
+        print(json.dumps(result))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
@@ -0,0 +1,127 @@
+# benchmarks/bench_export.py
+"""
+Bulk capture export: the streaming export versus paging through GET /v1/user-captures/.
+
+Runs:
+  export(fmt, compression, images) - export_stream over the whole table: rows/s and output size
+  memory(rows=..)                  - peak Python memory (tracemalloc) of an inline zstd export
+                                     of a tenth of the table and of all of it: it should not
+                                     grow with the row count (a one-off resize of the
+                                     interpreter's interned-string table, ~4 MB, can land
+                                     in either)
+  http_export                      - the same NDJSON export through /v1/user-captures/export/
+  paged(limit=..)                  - all captures through the list endpoint, keyset cursor
+                                     pages of --page-size rows as a client does today
+
+--captures rows carry one small stored image each (shared, so images=inline reads
+it from the store every row) and a parsed ai_response.
+
+Usage (from the server directory):
+    python benchmarks/bench_export.py --captures 200000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-export-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from database import UserCapture, engine  # noqa: E402
+from export import export_select, export_stream  # noqa: E402
+from image_store import image_store  # noqa: E402
+from main import app  # noqa: E402
+from pagination import NEXT_CURSOR_HEADER  # noqa: E402
+
+logging.disable(logging.WARNING)
+AI_RESPONSE = json.dumps({
+    "ordnance_type": "mine_anti_tank", "subtype": "TM-62", "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present", "warcrime_assessment": "possible",
+    "needs_specialist": True, "confidence": 0.8, "short_advice": "Keep clear and mark the area.",
+})
+RUNS = [
+    ("ndjson", "none", "reference"), ("ndjson", "gzip", "reference"), ("ndjson", "zstd", "reference"),
+    ("csv", "gzip", "reference"), ("ndjson", "zstd", "inline"),
+]
+
+
+def seed(count: int):
+    image = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+    sha256 = image_store.put(image)
+    now = datetime.utcnow()
+    for offset in range(0, count, 50000):
+        rows = [{
+            "user_id": f"u-{i}", "query_text": "What is this?", "image_sha256": sha256, "image_size": len(image),
+            "image_mime": "image/png", "latitude": 48.0 + (i % 1000) * 1e-3, "longitude": 35.0 + (i // 1000) * 1e-3,
+            "created_at": now - timedelta(seconds=i), "ai_response": AI_RESPONSE, "ordnance_type": "mine_anti_tank",
+            "needs_specialist": True, "confidence": 0.8,
+        } for i in range(offset, min(count, offset + 50000))]
+        with engine.begin() as conn:
+            conn.execute(insert(UserCapture), rows)
+
+
+def bench_export(count: int):
+    for fmt, compression, images in RUNS:
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in export_stream(export_select(), fmt, compression, images))
+        elapsed = time.perf_counter() - start
+        print(json.dumps({
+            "run": f"export({fmt}, {compression}, {images})", "rows": count, "rows_per_s": round(count / elapsed),
+            "mb": round(size / 2 ** 20, 1),
+        }))
+    for rows in (count // 10, count):
+        tracemalloc.start()
+        for _ in export_stream(export_select().limit(rows), "ndjson", "zstd", "inline"):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(json.dumps({"run": f"memory(rows={rows})", "peak_mb": round(peak / 2 ** 20, 2)}))
+
+
+def bench_http(client: TestClient, count: int, page_size: int):
+    start = time.perf_counter()
+    with client.stream("GET", "/v1/user-captures/export/") as response:
+        size = sum(len(chunk) for chunk in response.iter_raw())
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"run": "http_export", "rows": count, "rows_per_s": round(count / elapsed), "mb": round(size / 2 ** 20, 1)}))
+
+    rows, size, cursor = 0, 0, None
+    start = time.perf_counter()
+    while True:
+        params = {"limit": page_size, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/v1/user-captures/", params=params)
+        rows += len(response.json())
+        size += len(response.content)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "run": f"paged(limit={page_size})", "rows": rows, "rows_per_s": round(rows / elapsed), "mb": round(size / 2 ** 20, 1),
+    }))
+
+
+def main(args):
+    with TestClient(app) as client:
+        seed(args.captures)
+        count = args.captures + 1  # and the mock capture loaded at startup
+        bench_export(count)
+        bench_http(client, count, args.page_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=1000)
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+# benchmarks/bench_geo_queries.py
+"""
+Bounding-box and nearest-N query latency as the captures table grows.
+
+Synthetic captures (clustered around random hotspots in a 8 x 18 degree region)
+are inserted into a throwaway SQLite database in steps up to --rows. After
+each step, random ~2 km bounding boxes and nearest-20 queries are timed through
+geo.py (R*Tree) and compared with the same box as a plain lat/lon range scan.
+
+Usage (from the server directory):
+    python benchmarks/bench_geo_queries.py --rows 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-geo-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+
+from database import engine, async_engine, SessionLocal, AsyncSessionLocal, UserCapture  # noqa: E402
+from geo import captures_in_bbox_select, nearest_captures  # noqa: E402
+
+engine.echo = False
+REGION = (44.0, 22.0, 52.0, 40.0)  # min_lat, min_lon, max_lat, max_lon
+
+
+def insert_rows(count: int, start_id: int, hotspots: list, rng: random.Random):
+    base = datetime(2025, 11, 1)
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        batch = []
+        for i in range(count):
+            h_lat, h_lon = rng.choice(hotspots)
+            batch.append((
+                f"bench-{start_id + i}", "What is this?",
+                h_lat + rng.gauss(0, 0.05), h_lon + rng.gauss(0, 0.05),
+                "{}", (base + timedelta(seconds=start_id + i)).isoformat(" "),
+            ))
+            if len(batch) == 50_000:
+                cur.executemany(
+                    "INSERT INTO user_captures (user_id, query_text, latitude, longitude, ai_response, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            cur.executemany(
+                "INSERT INTO user_captures (user_id, query_text, latitude, longitude, ai_response, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def timed(fn, repeats: int) -> dict:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples), 3), "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3)}
+
+
+def main(args):
+    rng = random.Random(42)
+    hotspots = [(rng.uniform(REGION[0], REGION[2]), rng.uniform(REGION[1], REGION[3])) for _ in range(200)]
+    probes = [(h_lat + rng.gauss(0, 0.05), h_lon + rng.gauss(0, 0.05)) for h_lat, h_lon in rng.choices(hotspots, k=args.queries)]
+    half = 0.009  # ~1 km each way
+
+    total = 0
+    for step in args.steps:
+        if step > args.rows:
+            break
+        insert_rows(step - total, total, hotspots, rng)
+        total = step
+        db = SessionLocal()
+        loop = asyncio.new_event_loop()
+        async_db = AsyncSessionLocal()
+        probe_iter = iter(probes * 1000)
+
+        def rtree_bbox():
+            lat, lon = next(probe_iter)
+            db.execute(captures_in_bbox_select(lat - half, lon - half, lat + half, lon + half).limit(500)).scalars().all()
+
+        def scan_bbox():
+            lat, lon = next(probe_iter)
+            db.execute(select(UserCapture).where(
+                UserCapture.latitude.between(lat - half, lat + half),
+                UserCapture.longitude.between(lon - half, lon + half),
+            ).limit(500)).scalars().all()
+
+        def nearest():
+            lat, lon = next(probe_iter)
+            loop.run_until_complete(nearest_captures(async_db, lat, lon, 20))
+
+        result = {
+            "rows": total,
+            "bbox_rtree": timed(rtree_bbox, args.queries),
+            "nearest20_rtree": timed(nearest, args.queries),
+            "bbox_full_scan": timed(scan_bbox, max(3, args.queries // 10)),
+        }
+        db.close()
+        loop.run_until_complete(async_db.close())
+        # Pooled aiosqlite connections own non-daemon threads
+        loop.run_until_complete(async_engine.dispose())
+        loop.close()
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--steps", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    try:
+        main(parser.parse_args())
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
@@ -0,0 +1,113 @@
+# benchmarks/bench_image_preprocess.py
+"""
+Payload size and end-to-end latency of vision requests with and without the
+image normalization pipeline.
+
+Large fixture images are generated (phone-sized JPEGs with an EXIF orientation
+tag) unless --fixtures points at a directory of real photos. Each image is sent
+through AsyncLLMClient to an in-process mock backend that charges transfer time
+for the request body at --bandwidth-mbps plus a fixed --latency, so the numbers
+reflect bytes on the wire, not GPU time.
+
+Usage (from the server directory):
+    python benchmarks/bench_image_preprocess.py --count 8 --bandwidth-mbps 100
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from clients import AsyncLLMClient  # noqa: E402
+from image_processing import normalize_image  # noqa: E402
+
+COMPLETION = {
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "gemma3",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+}
+
+
+def make_fixture(seed: int, size=(4000, 3000)) -> bytes:
+    noise = Image.effect_noise(size, 40 + seed).convert("RGB")
+    gradient = Image.linear_gradient("L").resize(size).convert("RGB")
+    img = Image.blend(noise, gradient, 0.6)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=92, exif=exif)
+    return out.getvalue()
+
+
+def load_fixtures(args) -> list:
+    if args.fixtures:
+        paths = sorted(p for p in Path(args.fixtures).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        return [p.read_bytes() for p in paths[:args.count]]
+    return [make_fixture(i) for i in range(args.count)]
+
+
+async def send(llm: AsyncLLMClient, data: bytes, mime: str):
+    image_url = f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+    messages = [{"role": "user", "content": [
+        {"type": "text", "text": "what is this?"},
+        {"type": "image_url", "image_url": {"url": image_url}},
+    ]}]
+    await llm.chat_completion(model="gemma3", messages=messages)
+    return len(image_url)
+
+
+async def main(args):
+    bytes_per_second = args.bandwidth_mbps * 1_000_000 / 8
+
+    async def backend(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(len(request.content) / bytes_per_second + args.latency)
+        return httpx.Response(200, json=COMPLETION)
+
+    llm = AsyncLLMClient(api_key="bench", base_url="http://backend/v1",
+                         transport=httpx.MockTransport(backend))
+    fixtures = load_fixtures(args)
+    results = {"raw": {"payload": [], "latency": []}, "normalized": {"payload": [], "latency": [], "preprocess": []}}
+
+    for data in fixtures:
+        start = time.perf_counter()
+        results["raw"]["payload"].append(await send(llm, data, "image/jpeg"))
+        results["raw"]["latency"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        prepared = await asyncio.to_thread(normalize_image, data, args.max_side, args.quality)
+        preprocess = time.perf_counter() - start
+        results["normalized"]["payload"].append(await send(llm, prepared.data, prepared.mime))
+        results["normalized"]["latency"].append(time.perf_counter() - start)
+        results["normalized"]["preprocess"].append(preprocess)
+    await llm.aclose()
+
+    for label, r in results.items():
+        summary = {
+            "pipeline": label,
+            "images": len(fixtures),
+            "mean_payload_kb": round(statistics.mean(r["payload"]) / 1024, 1),
+            "mean_latency_ms": round(statistics.mean(r["latency"]) * 1000, 1),
+            "max_latency_ms": round(max(r["latency"]) * 1000, 1),
+        }
+        if "preprocess" in r:
+            summary["mean_preprocess_ms"] = round(statistics.mean(r["preprocess"]) * 1000, 1)
+        print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="directory of images to use instead of generated ones")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--max-side", type=int, default=896)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="simulated server-to-backend bandwidth")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated fixed backend latency (s)")
+    asyncio.run(main(parser.parse_args()))
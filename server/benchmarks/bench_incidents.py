@@ -0,0 +1,152 @@
+# benchmarks/bench_incidents.py
+"""
+Near-duplicate detection for incidents on generated photos.
+
+Runs:
+  hash      - perceptual_hash of a --width x --height JPEG, next to the full
+              normalize_image it accompanies on upload
+  accuracy  - --scenes distinct scenes, each re-shot as variants (rescaled,
+              recompressed, cropped, brightened, slightly rotated); per hash
+              distance threshold, the share of variants matched to their scene
+              and of distinct scene pairs wrongly matched
+  lookup    - incidents.find_duplicate with --captures hashed captures inside the
+              radius and time window (a busy spot), on a throwaway database
+
+Usage (from the server directory):
+    python benchmarks/bench_incidents.py --scenes 200 --captures 2000
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import combinations
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A throwaway database
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-incidents-"), "bench.db")
+
+from PIL import Image, ImageDraw, ImageEnhance  # noqa: E402
+
+from database import SessionLocal, AsyncSessionLocal, Incident, UserCapture, async_engine  # noqa: E402
+from image_processing import perceptual_hash, normalize_image, hash_distance  # noqa: E402
+from incidents import find_duplicate  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+THRESHOLDS = (4, 6, 8, 10, 12, 14)
+
+
+def scene(rng: random.Random, size=(640, 480)) -> Image.Image:
+    """A random 'photo': a vertical gradient with a few filled shapes on it."""
+    img = Image.new("RGB", size)
+    draw = ImageDraw.Draw(img)
+    top, bottom = [rng.randrange(256) for _ in range(3)], [rng.randrange(256) for _ in range(3)]
+    for y in range(size[1]):
+        t = y / size[1]
+        draw.line([(0, y), (size[0], y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+    for _ in range(rng.randint(3, 7)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randint(40, 260), y0 + rng.randint(40, 200)
+        shape = rng.choice((draw.ellipse, draw.rectangle))
+        shape([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+    return img
+
+
+def jpeg(img: Image.Image, quality: int = 85) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def variants(img: Image.Image, rng: random.Random):
+    """The same scene as other phones would upload it."""
+    w, h = img.size
+    dx, dy = int(w * rng.uniform(0.02, 0.06)), int(h * rng.uniform(0.02, 0.06))
+    yield jpeg(img.resize((w // 2, h // 2)), 70)
+    yield jpeg(img, 40)
+    yield jpeg(img.crop((dx, dy, w - dx, h - dy)))
+    yield jpeg(ImageEnhance.Brightness(img).enhance(rng.uniform(0.85, 1.15)))
+    yield jpeg(img.rotate(rng.uniform(-3, 3), resample=Image.BICUBIC, expand=False))
+
+
+def bench_hash(args):
+    data = jpeg(scene(random.Random(0), (args.width, args.height)), 90)
+    for label, fn in (("perceptual_hash", perceptual_hash), ("normalize_image", normalize_image)):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn(io.BytesIO(data))
+            samples.append((time.perf_counter() - start) * 1000)
+        print(json.dumps({"run": f"hash({label})", "bytes": len(data), "p50_ms": round(percentile(samples, 0.5), 2)}))
+
+
+def bench_accuracy(args):
+    rng = random.Random(args.seed)
+    bases, variant_distances = [], []
+    for _ in range(args.scenes):
+        img = scene(rng)
+        base = perceptual_hash(jpeg(img))
+        bases.append(base)
+        variant_distances.extend(hash_distance(base, perceptual_hash(v)) for v in variants(img, rng))
+    distinct = [hash_distance(a, b) for a, b in combinations(bases, 2)]
+    for threshold in THRESHOLDS:
+        print(json.dumps({
+            "run": f"accuracy(<={threshold} bits)",
+            "duplicates_matched": round(sum(d <= threshold for d in variant_distances) / len(variant_distances), 4),
+            "distinct_matched": round(sum(d <= threshold for d in distinct) / len(distinct), 6),
+        }))
+
+
+async def bench_lookup(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    lat, lon = 48.1374, 11.5755
+    db = SessionLocal()
+    try:
+        incident = Incident(latitude=lat, longitude=lon, first_seen_at=now, last_seen_at=now)
+        db.add(incident)
+        db.flush()
+        db.add_all(UserCapture(
+            user_id=f"bench-{i}", query_text="what is this?",
+            latitude=lat + rng.uniform(-0.001, 0.001), longitude=lon + rng.uniform(-0.001, 0.001),
+            created_at=now - timedelta(seconds=rng.uniform(0, 1500)),
+            phash=rng.getrandbits(64) - (1 << 63), incident_id=incident.id,
+        ) for i in range(args.captures))
+        db.commit()
+    finally:
+        db.close()
+    samples = []
+    async with AsyncSessionLocal() as session:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await find_duplicate(session, rng.getrandbits(64) - (1 << 63), lat, lon, now=now)
+            samples.append((time.perf_counter() - start) * 1000)
+    await async_engine.dispose()
+    print(json.dumps({
+        "run": "lookup", "captures_in_window": args.captures,
+        "p50_ms": round(percentile(samples, 0.5), 2), "p95_ms": round(percentile(samples, 0.95), 2),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, default=200)
+    parser.add_argument("--captures", type=int, default=2000)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parsed = parser.parse_args()
+    bench_hash(parsed)
+    bench_accuracy(parsed)
+    asyncio.run(bench_lookup(parsed))
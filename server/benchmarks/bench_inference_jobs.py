@@ -0,0 +1,140 @@
+# benchmarks/bench_inference_jobs.py
+"""
+Upload latency seen by clients with inference inline (wait=true) vs capture-first
+(wait=false, answered by background inference jobs), against a slow backend.
+
+The mocked backend takes --backend-ms per query and serves --backend-slots
+queries at a time, like a saturated GPU. Uploads arrive at --rate per second
+for --seconds; uploads slower than --client-timeout seconds are counted as
+lost (a phone that gives up would never learn the capture was saved). Each
+capture-first run uses one of --workers worker pool sizes and reports how long
+the queue took to drain plus the /v1/inference-jobs/stats snapshot (queue
+wait, service time, utilization), which is what the pool is sized from.
+
+Usage (from the server directory):
+    python benchmarks/bench_inference_jobs.py --rate 4 --seconds 15 --backend-ms 1500 --backend-slots 4
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-jobs-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+os.environ.setdefault("LLM_MAX_RETRIES", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from batching import vision_dispatcher  # noqa: E402
+from clients import AsyncLLMClient  # noqa: E402
+from database import async_engine, startup_event  # noqa: E402
+from jobs import inference_jobs, JobStats  # noqa: E402
+from main import app  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+AI_RESPONSE = json.dumps({"ordnance_type": "mine_anti_tank", "confidence": 0.8})
+
+
+def mock_backend(latency: float, slots: int):
+    gpu = asyncio.Semaphore(slots)
+
+    async def handler(request):
+        async with gpu:
+            await asyncio.sleep(latency)
+        return httpx.Response(200, json={
+            "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": "bench",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": AI_RESPONSE}}],
+        })
+
+    return httpx.MockTransport(handler)
+
+
+def image(seed: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (seed % 256, seed // 256 % 256, 0)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+async def run(label: str, wait: bool, args, offset: int) -> dict:
+    latencies, errors = [], 0
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not enforce client timeouts; slow uploads are counted against --client-timeout instead
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def upload(i: int):
+            nonlocal errors
+            start = time.perf_counter()
+            response = await client.post(
+                "/upload_image_query", data={"text": "What is this?", "wait": str(wait).lower()},
+                files={"file": ("capture.jpg", image(offset + i), "image/jpeg")},
+            )
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        count = int(args.rate * args.seconds)
+        tasks = []
+        for i in range(count):
+            tasks.append(asyncio.create_task(upload(i)))
+            await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*tasks)
+        accepted_s = time.perf_counter() - started
+
+        result = {
+            "mode": label, "uploads": count, "errors": errors,
+            "over_client_timeout": sum(latency > args.client_timeout * 1000 for latency in latencies),
+            "upload_p50_ms": round(percentile(latencies, 0.50), 1),
+            "upload_p95_ms": round(percentile(latencies, 0.95), 1),
+        }
+        if not wait:
+            while True:
+                stats = (await client.get("/v1/inference-jobs/stats")).json()
+                if stats["queued"] == 0 and stats["running"] == 0:
+                    break
+                await asyncio.sleep(0.1)
+            result["drained_s"] = round(time.perf_counter() - started, 2)
+            result["accepted_s"] = round(accepted_s, 2)
+            result["jobs"] = {key: stats[key] for key in ("workers", "utilization", "done", "failed", "retried", "wait_ms", "service_ms")}
+    return result
+
+
+async def main(args):
+    vision_dispatcher.client = AsyncLLMClient(transport=mock_backend(args.backend_ms / 1000, args.backend_slots))
+    await startup_event()  # ASGITransport does not run the app's lifespan
+    offset = 0
+    print(json.dumps(await run("inline", True, args, offset)))
+    for workers in args.workers:
+        offset += 10_000
+        inference_jobs.workers = workers
+        inference_jobs.stats = JobStats()
+        inference_jobs.start()
+        print(json.dumps(await run(f"capture_first_{workers}w", False, args, offset)))
+        await inference_jobs.aclose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=4.0)
+    parser.add_argument("--seconds", type=float, default=15.0)
+    parser.add_argument("--backend-ms", type=float, default=1500.0)
+    parser.add_argument("--backend-slots", type=int, default=4)
+    parser.add_argument("--client-timeout", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    try:
+        asyncio.run(main(parser.parse_args()))
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
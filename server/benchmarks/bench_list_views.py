@@ -0,0 +1,85 @@
+# benchmarks/bench_list_views.py
+"""
+Response size and latency of /v1/user-captures/ with view=full vs view=summary.
+
+A throwaway database is filled with --rows captures, each referencing a
+distinct --image-kb image in the image store, then 100- and 1000-row pages
+are requested in-process through the ASGI app.
+
+Usage (from the server directory):
+    python benchmarks/bench_list_views.py --rows 1000 --image-kb 64
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp = tempfile.mkdtemp(prefix="bench-views-")
+os.environ["SQLITE_DB_PATH"] = os.path.join(_tmp, "bench.db")
+os.environ["IMAGE_STORE_DIR"] = os.path.join(_tmp, "images")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from database import engine, SessionLocal, UserCapture  # noqa: E402
+from image_store import image_store  # noqa: E402
+from main import app  # noqa: E402
+
+engine.echo = False
+logging.disable(logging.INFO)
+AI_RESPONSE = json.dumps({
+    "ordnance_type": "mine_anti_tank", "subtype": "TM-62", "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present", "warcrime_assessment": "possible",
+    "needs_specialist": True, "confidence": 0.8, "short_advice": "Keep clear and mark the area.",
+})
+
+
+def populate(rows: int, image_kb: int):
+    db = SessionLocal()
+    for i in range(rows):
+        data = os.urandom(image_kb * 1024)
+        db.add(UserCapture(
+            user_id=f"bench-{i}", query_text="What is this?", image_sha256=image_store.put(data),
+            image_size=len(data), image_mime="image/jpeg", latitude=50.0, longitude=30.0,
+            ai_response=AI_RESPONSE, ordnance_type="mine_anti_tank", warcrime_assessment="possible",
+            needs_specialist=True, confidence=0.8, short_advice="Keep clear and mark the area.",
+        ))
+    db.commit()
+    db.close()
+
+
+def main(args):
+    populate(args.rows, args.image_kb)
+    with TestClient(app) as client:
+        for limit in args.limits:
+            for view in ("full", "summary"):
+                samples, size = [], 0
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    response = client.get("/v1/user-captures/", params={"limit": limit, "view": view})
+                    samples.append((time.perf_counter() - start) * 1000)
+                    size = len(response.content)
+                print(json.dumps({
+                    "limit": limit, "view": view,
+                    "response_kb": round(size / 1024, 1),
+                    "p50_ms": round(statistics.median(samples), 2),
+                    "max_ms": round(max(samples), 2),
+                }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeats", type=int, default=5)
+    try:
+        main(parser.parse_args())
+    finally:
+        shutil.rmtree(_tmp, ignore_errors=True)
@@ -0,0 +1,109 @@
+# benchmarks/bench_llm_client.py
+"""
+Compare the old blocking OpenAI client against the pooled AsyncLLMClient.
+
+The backend is simulated in-process with an httpx mock transport that takes
+`--latency` seconds per request and serves at most `--capacity` requests at a
+time, so throughput should scale with min(concurrency limit, capacity) for the
+async client and stay at 1/latency for the blocking one. Event-loop lag is
+sampled during each run to show whether other requests could still be served.
+
+Usage (from the server directory):
+    python benchmarks/bench_llm_client.py --requests 64 --latency 0.2 --capacity 8
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from openai import OpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from clients import AsyncLLMClient  # noqa: E402
+
+COMPLETION = {
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gemma3",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11},
+}
+MESSAGES = [{"role": "user", "content": "identify the weapon"}]
+
+
+async def measure_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run(label: str, call, n_requests: int):
+    stop = asyncio.Event()
+    lag = []
+    ticker = asyncio.create_task(measure_loop_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    result = {
+        "client": label,
+        "requests": n_requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(n_requests / elapsed, 1),
+        "max_loop_lag_ms": round(max(lag, default=elapsed) * 1000, 1),
+    }
+    print(json.dumps(result))
+    return result
+
+
+async def main(args):
+    backend_slots = asyncio.Semaphore(args.capacity)
+
+    async def async_backend(request: httpx.Request) -> httpx.Response:
+        async with backend_slots:
+            await asyncio.sleep(args.latency)
+        return httpx.Response(200, json=COMPLETION)
+
+    def sync_backend(request: httpx.Request) -> httpx.Response:
+        time.sleep(args.latency)
+        return httpx.Response(200, json=COMPLETION)
+
+    # Baseline: the previous synchronous client called from async handlers
+    sync_client = OpenAI(
+        api_key="bench", base_url="http://backend/v1",
+        http_client=httpx.Client(transport=httpx.MockTransport(sync_backend)),
+    )
+
+    async def blocking_call():
+        sync_client.chat.completions.create(model="gemma3", messages=MESSAGES)
+
+    await run("blocking", blocking_call, args.requests)
+
+    for limit in args.limits:
+        llm = AsyncLLMClient(
+            api_key="bench", base_url="http://backend/v1",
+            max_concurrency=limit, max_connections=limit,
+            transport=httpx.MockTransport(async_backend),
+        )
+
+        async def pooled_call():
+            await llm.chat_completion(model="gemma3", messages=MESSAGES)
+
+        await run(f"async(limit={limit})", pooled_call, args.requests)
+        await llm.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated backend seconds per request")
+    parser.add_argument("--capacity", type=int, default=8, help="simulated backend parallel slots")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 8, 16])
+    asyncio.run(main(parser.parse_args()))
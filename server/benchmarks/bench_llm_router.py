@@ -0,0 +1,147 @@
+# benchmarks/bench_llm_router.py
+"""
+LLM client throughput and tail latency across several mocked backends.
+
+Each backend serves --backend-slots calls at a time, taking --latency seconds
+per call. Runs:
+  scale   - --requests concurrent calls against 1..--backends backends;
+            throughput should grow with every backend added
+  failure - one of the backends refuses connections; the circuit breaker takes
+            it out of rotation and its calls are retried elsewhere, so nothing fails
+  degraded - all backends but one refuse connections; the healthy one must never
+            have more than max_concurrency (--backend-slots) calls in flight
+  hedging - one backend takes --tail-latency seconds on --tail-rate of its calls;
+            p99 with hedging (at --hedge-percentile) vs without
+
+Usage (from the server directory):
+    python benchmarks/bench_llm_router.py --backends 4 --requests 256
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from clients import AsyncLLMClient  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+COMPLETION = {
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+}
+MESSAGES = [{"role": "user", "content": "What is this?"}]
+
+
+def mock_backends(count: int, args, down: Sequence[int] = (), slow: int = -1, seed: int = 0, peaks: Optional[list] = None):
+    """
+    Transport serving hosts b0..b<count-1>; backends in `down` refuse connections, `slow` has a
+    latency tail. peaks, if given, receives the most calls each backend had in flight at once.
+    """
+    slots = [asyncio.Semaphore(args.backend_slots) for _ in range(count)]
+    in_flight = [0] * count
+    if peaks is not None:
+        peaks[:] = [0] * count
+    rng = random.Random(seed)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        index = int(request.url.host[1:])
+        if index in down:
+            raise httpx.ConnectError("connection refused")
+        in_flight[index] += 1
+        if peaks is not None:
+            peaks[index] = max(peaks[index], in_flight[index])
+        try:
+            async with slots[index]:
+                tail = index == slow and rng.random() < args.tail_rate
+                await asyncio.sleep(args.tail_latency if tail else args.latency)
+        finally:
+            in_flight[index] -= 1
+        return httpx.Response(200, json=COMPLETION)
+
+    return httpx.MockTransport(handler)
+
+
+def client(count: int, transport, **options) -> AsyncLLMClient:
+    options = {"max_concurrency": 64, **options}
+    llm = AsyncLLMClient(
+        api_key="bench", base_url=[f"http://b{i}/v1" for i in range(count)],
+        max_connections=256, max_retries=2, transport=transport, **options,
+    )
+    llm.pool.health_interval = 0  # only the circuit breaker reacts to failures here
+    return llm
+
+
+async def run(label: str, llm: AsyncLLMClient, requests: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in queue:
+            start = time.perf_counter()
+            try:
+                await llm.chat_completion(model="bench", messages=MESSAGES)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    snapshot = llm.snapshot()
+    await llm.aclose()
+    result = {
+        "run": label,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "calls_per_backend": [b["calls"] for b in snapshot["backends"]],
+        "hedges": snapshot["hedging"]["hedges"],
+    }
+    print(json.dumps(result))
+    return result
+
+
+async def main(args):
+    for count in range(1, args.backends + 1):
+        await run(f"scale({count})", client(count, mock_backends(count, args)), args.requests, args.requests)
+    await run("failure", client(args.backends, mock_backends(args.backends, args, down=[0])), args.requests, args.requests)
+    peaks = []
+    transport = mock_backends(args.backends, args, down=range(1, args.backends), peaks=peaks)
+    result = await run(
+        "degraded", client(args.backends, transport, max_concurrency=args.backend_slots), args.requests, args.requests
+    )
+    print(json.dumps({"run": "degraded(peak)", "healthy_peak_in_flight": peaks[0], "max_concurrency": args.backend_slots,
+                      "errors": result["errors"]}))
+    # Sequential-ish load so the tail, not queueing, dominates p99
+    for percentile_ in (0.0, args.hedge_percentile):
+        llm = client(
+            args.backends, mock_backends(args.backends, args, slow=0),
+            hedge_percentile=percentile_, hedge_min_samples=50, hedge_min_ms=args.latency * 1000,
+        )
+        await run(f"hedging(p{percentile_:g})", llm, args.requests * 4, args.backends)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--backend-slots", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per call")
+    parser.add_argument("--tail-latency", type=float, default=1.5)
+    parser.add_argument("--tail-rate", type=float, default=0.1)
+    parser.add_argument("--hedge-percentile", type=float, default=0.9)
+    asyncio.run(main(parser.parse_args()))
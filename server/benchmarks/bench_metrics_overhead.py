@@ -0,0 +1,105 @@
+# benchmarks/bench_metrics_overhead.py
+"""
+Per-request cost of the instrumentation layer.
+
+MetricsMiddleware wraps a minimal ASGI app that sets a matched route and sends
+a two-message response; both are driven directly (no server, no HTTP parsing),
+so the difference is the middleware's own overhead. Span, histogram and counter
+costs are timed in isolation, and /metrics rendering is timed with --routes
+route templates (three statuses each) recorded.
+
+Usage (from the server directory):
+    python benchmarks/bench_metrics_overhead.py --requests 200000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import registry, span, HTTP_REQUEST_SECONDS, LLM_TOKENS, SPAN_SECONDS  # noqa: E402
+from middleware import MetricsMiddleware  # noqa: E402
+
+
+class _Route:
+    path = "/v1/user-captures/{capture_id}"
+
+
+ROUTE = _Route()
+START = {"type": "http.response.start", "status": 200, "headers": []}
+BODY = {"type": "http.response.body", "body": b"{}"}
+
+
+async def app(scope, receive, send):
+    scope["route"] = ROUTE
+    await send(START)
+    await send(BODY)
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def time_app(target, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        await target({"type": "http", "method": "GET", "path": "/v1/user-captures/1", "headers": []}, receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def time_call(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def with_span():
+    with span("bench"):
+        pass
+
+
+async def main(args):
+    wrapped = MetricsMiddleware(app)
+    await time_app(app, 10_000)  # warm up
+    await time_app(wrapped, 10_000)
+    bare = min([await time_app(app, args.requests) for _ in range(3)])
+    instrumented = min([await time_app(wrapped, args.requests) for _ in range(3)])
+    print(json.dumps({
+        "requests": args.requests,
+        "bare_us": round(bare, 3),
+        "instrumented_us": round(instrumented, 3),
+        "middleware_overhead_us": round(instrumented - bare, 3),
+    }))
+    print(json.dumps({
+        "span_us": round(time_call(with_span, args.requests), 3),
+        "histogram_observe_us": round(time_call(lambda: SPAN_SECONDS.observe(0.01, ("bench",)), args.requests), 3),
+        "unlocked_observe_us": round(
+            time_call(lambda: HTTP_REQUEST_SECONDS.observe(0.01, ("GET", "/bench", 200)), args.requests), 3
+        ),
+        "counter_inc_us": round(time_call(lambda: LLM_TOKENS.inc(("bench", "prompt")), args.requests), 3),
+    }))
+    for i in range(args.routes):
+        for status in (200, 404, 500):
+            HTTP_REQUEST_SECONDS.observe(0.01, ("GET", f"/route/{i}", status))
+    start = time.perf_counter()
+    text = registry.render()
+    print(json.dumps({
+        "render_ms": round((time.perf_counter() - start) * 1000, 2),
+        "series_lines": text.count("\n"),
+        "render_kb": round(len(text) / 1024, 1),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--routes", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
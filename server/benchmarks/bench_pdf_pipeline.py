@@ -0,0 +1,180 @@
+# benchmarks/bench_pdf_pipeline.py
+"""
+PDF text extraction and summarization on a generated --pages page document.
+
+Runs:
+  extract(sequential)  - every page in this process, one after another
+  extract(N workers)   - pages split into --pages-per-task runs over a process pool
+                         of 1, 2, 4 ... --workers processes (started before timing)
+  pipeline(cold/warm)  - pdfs.extract_pages on a fresh database, then again for the
+                         same upload, served from the page cache
+  summarize(c=N)       - pdfs.summarize of the first --summary-pages pages against a
+                         mocked LLM taking --latency seconds per call, with 1
+                         (sequential) and --concurrency chunk calls in flight
+
+Usage (from the server directory):
+    python benchmarks/bench_pdf_pipeline.py --pages 500 --workers 4
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+# Only this at module level: spawned workers re-import this script
+import pdf_pages  # noqa: E402
+
+WORDS = (
+    "ordnance mine fuze detonator casing shrapnel clearance perimeter marker survey grid "
+    "sector report hazard specialist evacuation route coordinates munition warhead "
+    "tripwire pressure plate unexploded remnant battlefield cordon team handling"
+).split()
+
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0) -> int:
+    """Write a pages-page PDF with lines_per_page lines of text on each page; returns its size."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for number in range(1, pages + 1):
+        lines = [f"Page {number} section {i + 1}: " + " ".join(rng.choices(WORDS, k=12)) for i in range(lines_per_page)]
+        text = "".join(f"({line}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(out)
+    return len(out)
+
+
+def report(label: str, elapsed: float, pages: int, **extra):
+    print(json.dumps({
+        "run": label, "seconds": round(elapsed, 3), "pages_per_s": round(pages / elapsed, 1) if elapsed else None, **extra,
+    }))
+
+
+def ranges(pages: int, size: int):
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+
+async def bench_extract(path: str, args):
+    start = time.perf_counter()
+    texts = pdf_pages.extract_range(path, 0, args.pages)
+    report("extract(sequential)", time.perf_counter() - start, args.pages, chars=sum(map(len, texts)))
+
+    loop = asyncio.get_running_loop()
+    workers = 1
+    while workers <= args.workers:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            # Start every worker (spawn + import pypdf) before timing
+            await asyncio.gather(*(loop.run_in_executor(pool, pdf_pages.page_count, path) for _ in range(workers)))
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                loop.run_in_executor(pool, pdf_pages.extract_range, path, first, stop)
+                for first, stop in ranges(args.pages, args.pages_per_task)
+            ))
+            report(f"extract({workers} workers)", time.perf_counter() - start, args.pages)
+        workers *= 2
+
+
+async def bench_pipeline(path: str, size: int, args):
+    import pdfs
+    from database import AsyncSessionLocal, async_engine
+    from uploads import SpooledUpload
+
+    with open(path, "rb") as f:
+        sha256 = hashlib.sha256(f.read()).hexdigest()
+    pages = None
+    for label in ("cold", "warm"):
+        with open(path, "rb") as f:
+            upload = SpooledUpload(f, size, sha256, "application/pdf")
+            async with AsyncSessionLocal() as db:
+                start = time.perf_counter()
+                document = await pdfs.extract_pages(db, upload, pages_per_task=args.pages_per_task)
+                report(f"pipeline({label})", time.perf_counter() - start, args.pages, extracted=document.extracted)
+        pages = document.pages
+    pdfs.shutdown()
+    await async_engine.dispose()  # pooled aiosqlite connections would keep the process alive
+    return pages
+
+
+def mock_llm(args):
+    from clients import AsyncLLMClient
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(args.latency)
+        return httpx.Response(200, json={
+            "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": " ".join(random.choices(WORDS, k=150))}}],
+        })
+
+    llm = AsyncLLMClient(api_key="bench", base_url="http://llm/v1", max_concurrency=64,
+                         transport=httpx.MockTransport(handler))
+    llm.pool.health_interval = 0
+    return llm
+
+
+async def bench_summarize(pages: dict, args):
+    import pdfs
+
+    pages = {number: text for number, text in pages.items() if number <= args.summary_pages}
+    for concurrency in (1, args.concurrency):
+        llm = mock_llm(args)
+        start = time.perf_counter()
+        summary = await pdfs.summarize(pages, "kan_Knda", "bench", concurrency=concurrency, client=llm)
+        report(f"summarize(c={concurrency})", time.perf_counter() - start, len(pages),
+               chunks=summary.chunks, llm_calls=summary.llm_calls)
+        await llm.aclose()
+
+
+async def main(args):
+    path = os.environ["SQLITE_DB_PATH"] + ".pdf"
+    size = make_pdf(path, args.pages)
+    print(json.dumps({"pdf_bytes": size, "pages": args.pages, "cpus": os.cpu_count()}))
+    await bench_extract(path, args)
+    pages = await bench_pipeline(path, size, args)
+    await bench_summarize(pages, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4, help="largest process pool tried")
+    parser.add_argument("--pages-per-task", type=int, default=16)
+    parser.add_argument("--summary-pages", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per mocked LLM call")
+    parser.add_argument("--concurrency", type=int, default=8, help="chunk summaries in flight")
+    parsed = parser.parse_args()
+    # A throwaway database, and no inference cache: summaries must reach the mocked model
+    os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-pdf-"), "bench.db")
+    os.environ["INFERENCE_CACHE_SIZE"] = "0"
+    logging.disable(logging.WARNING)
+    asyncio.run(main(parsed))
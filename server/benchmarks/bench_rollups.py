@@ -0,0 +1,150 @@
+# benchmarks/bench_rollups.py
+"""
+Capture analytics from the trigger-maintained rollups versus aggregating the captures.
+
+Runs:
+  insert(triggers on/off)  - --batch captures inserted in one transaction, with the rollup
+                             triggers in place and with them dropped: the write cost of
+                             keeping the counts current
+  rebuild                  - rebuild_rollups.rebuild() of every level after --captures
+                             captures spread over --days days (it also counts the rows
+                             inserted with the triggers off)
+  query(...)               - rollups.rollup_counts for a few (precision, bucket, time range)
+                             shapes, next to the same items computed by GROUP BY over
+                             user_captures
+
+Usage (from the server directory):
+    python benchmarks/bench_rollups.py --captures 200000 --days 90
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A throwaway database
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-rollups-"), "bench.db")
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from config import ROLLUP_LEVELS  # noqa: E402
+from database import AsyncSessionLocal, UserCapture, async_engine, engine, rollup_ddl  # noqa: E402
+from geo import geohash_bits  # noqa: E402
+from rebuild_rollups import rebuild  # noqa: E402
+from rollups import BUCKETS, BUCKET_SHIFTS, choose_level, epoch, rollup_counts, _items  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+TYPES = ["mine_anti_tank", "mine_anti_personnel", "mortar_round", "artillery_shell", "grenade", "cluster_submunition", None]
+# (label, precision, bucket, look-back)
+QUERIES = [
+    ("p6 hourly, 1 day", 6, "hour", timedelta(days=1)),
+    ("p5 hourly, 7 days", 5, "hour", timedelta(days=7)),
+    ("p4 daily, 30 days", 4, "day", timedelta(days=30)),
+    ("p3 weekly, all", 3, "week", None),
+]
+
+
+def captures(rng: random.Random, count: int, now: datetime, days: int, prefix: str):
+    """Captures clustered around a few dozen hot spots in a 4 x 6 degree region."""
+    spots = [(rng.uniform(46, 50), rng.uniform(30, 36)) for _ in range(40)]
+    for i in range(count):
+        lat, lon = rng.choice(spots)
+        yield {
+            "user_id": f"{prefix}-{i}", "query_text": "what is this?",
+            "latitude": lat + rng.gauss(0, 0.05), "longitude": lon + rng.gauss(0, 0.05),
+            "created_at": now - timedelta(seconds=rng.uniform(0, days * 86400)),
+            "ordnance_type": rng.choice(TYPES),
+        }
+
+
+def insert_rows(rows: list) -> float:
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(UserCapture), rows)
+    return time.perf_counter() - start
+
+
+def bench_insert(rng: random.Random, now: datetime, args):
+    with_triggers = insert_rows(list(captures(rng, args.batch, now, args.days, "on")))
+    with engine.begin() as conn:
+        for name in ("insert", "update", "delete"):
+            conn.execute(text(f"DROP TRIGGER user_captures_rollup_{name}"))
+    without = insert_rows(list(captures(rng, args.batch, now, args.days, "off")))
+    with engine.begin() as conn:
+        for statement in rollup_ddl(ROLLUP_LEVELS):
+            conn.execute(text(statement))
+    for label, seconds in (("insert(triggers on)", with_triggers), ("insert(triggers off)", without)):
+        print(json.dumps({"run": label, "rows": args.batch, "rows_per_s": round(args.batch / seconds)}))
+
+
+def group_by_sql(precision: int, bucket: str) -> str:
+    """The same counts straight from user_captures, in the same order."""
+    seconds, shift = BUCKETS[bucket], BUCKET_SHIFTS[bucket]
+    lat_bits, lon_bits = geohash_bits(precision)
+    return f"""SELECT (CAST(strftime('%s', created_at) AS INTEGER) + {shift}) / {seconds} * {seconds} - {shift} AS bucket_start,
+               CAST((latitude + 90.0) * {1 << lat_bits} / 180.0 AS INTEGER) AS lat_cell,
+               CAST((longitude + 180.0) * {1 << lon_bits} / 360.0 AS INTEGER) AS lon_cell,
+               COALESCE(ordnance_type, 'unclassified') AS ordnance_type, COUNT(*) AS count
+        FROM user_captures
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND created_at >= :since
+        GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4"""
+
+
+async def bench_query(now: datetime, args):
+    for label, precision, bucket, back in QUERIES:
+        start_time = now - back if back else None
+        rollup_samples, scan_samples = [], []
+        async with AsyncSessionLocal() as db:
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                counts = await rollup_counts(db, precision, bucket, start_time=start_time, limit=10 ** 7)
+                rollup_samples.append((time.perf_counter() - start) * 1000)
+            seconds, shift = BUCKETS[bucket], BUCKET_SHIFTS[bucket]
+            since = (epoch(start_time) + shift) // seconds * seconds - shift if back else 0
+            params = {"since": datetime.utcfromtimestamp(since).strftime("%Y-%m-%d %H:%M:%S")}
+            for _ in range(max(1, args.repeat // 5)):
+                start = time.perf_counter()
+                rows = (await db.execute(text(group_by_sql(precision, bucket)), params)).all()
+                items = _items(rows, precision)
+                scan_samples.append((time.perf_counter() - start) * 1000)
+        print(json.dumps({
+            "run": f"query({label})", "level": "%d:%d" % choose_level(precision, bucket),
+            "rows": len(counts.items), "same_counts": counts.items == items,
+            "rollup_p50_ms": round(percentile(rollup_samples, 0.5), 2),
+            "group_by_p50_ms": round(percentile(scan_samples, 0.5), 2),
+        }))
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    bench_insert(rng, now, args)
+    remaining = args.captures - 2 * args.batch
+    while remaining > 0:
+        insert_rows(list(captures(rng, min(remaining, 50000), now, args.days, f"bulk{remaining}")))
+        remaining -= 50000
+    start = time.perf_counter()
+    stats = rebuild()
+    print(json.dumps({"run": "rebuild", "seconds": round(time.perf_counter() - start, 2), "levels": stats}))
+    await bench_query(now, args)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--batch", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,162 @@
+# benchmarks/bench_tiles.py
+"""
+Map tiles: rendering from the captures versus serving from the tile cache.
+
+Runs:
+  render(z=..)   - cold GeoJSON and MVT tiles (cache cleared before each) over the hot
+                   spots at a few zooms: one clustering query plus encoding
+  cached(z=..)   - the same tiles again from the cache, including the capture_changes
+                   check every lookup makes
+  not_modified   - a cached tile whose ETag the client already holds, through the
+                   /v1/tiles route (304, no body)
+  invalidate     - --writes single-capture inserts, each followed by a lookup of a tile
+                   containing it (drop + re-render), and the same number of writes
+                   applied in one batch (whole-cache clear when over TILE_INVALIDATE_MAX)
+
+Usage (from the server directory):
+    python benchmarks/bench_tiles.py --captures 200000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# A throwaway database
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench-tiles-"), "bench.db")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from config import TILE_INVALIDATE_MAX  # noqa: E402
+from database import AsyncSessionLocal, UserCapture, async_engine, engine  # noqa: E402
+from geo import tile_for_point  # noqa: E402
+from routers.v1 import router  # noqa: E402
+from tiles import tile_cache  # noqa: E402
+from utils import percentile  # noqa: E402
+
+logging.disable(logging.WARNING)
+
+TYPES = ["mine_anti_tank", "mine_anti_personnel", "mortar_round", "artillery_shell", "grenade", None]
+ZOOMS = [4, 8, 12, 16]
+
+
+def captures(rng: random.Random, spots: list, count: int, prefix: str):
+    now = datetime.utcnow()
+    for i in range(count):
+        lat, lon = rng.choice(spots)
+        yield {
+            "user_id": f"{prefix}-{i}", "query_text": "what is this?",
+            "latitude": lat + rng.gauss(0, 0.05), "longitude": lon + rng.gauss(0, 0.05),
+            "created_at": now - timedelta(seconds=rng.uniform(0, 90 * 86400)),
+            "ordnance_type": rng.choice(TYPES), "needs_specialist": rng.random() < 0.2,
+            "confidence": round(rng.random(), 2),
+        }
+
+
+def ms(samples: list) -> float:
+    return round(percentile(samples, 0.5) * 1000, 3)
+
+
+async def bench_render(spots: list, args):
+    async with AsyncSessionLocal() as db:
+        await tile_cache.sync(db)
+        for z in ZOOMS:
+            tiles = list(dict.fromkeys(tile_for_point(lat, lon, z) for lat, lon in spots))
+            cold = {"geojson": [], "mvt": []}
+            warm, sizes = [], {"geojson": [], "mvt": []}
+            for _ in range(args.repeat):
+                for x, y in tiles:
+                    for fmt in cold:
+                        tile_cache.clear()
+                        start = time.perf_counter()
+                        tile = await tile_cache.get(db, z, x, y, fmt)
+                        cold[fmt].append(time.perf_counter() - start)
+                        sizes[fmt].append(len(tile.body))
+                        start = time.perf_counter()
+                        await tile_cache.get(db, z, x, y, fmt)
+                        warm.append(time.perf_counter() - start)
+            for fmt, samples in cold.items():
+                print(json.dumps({
+                    "run": f"render(z={z})", "format": fmt, "tiles": len(tiles), "p50_ms": ms(samples),
+                    "p50_bytes": round(percentile(sizes[fmt], 0.5)),
+                }))
+            print(json.dumps({"run": f"cached(z={z})", "p50_ms": ms(warm)}))
+
+
+async def bench_not_modified(spots: list, args):
+    app = FastAPI()
+    app.include_router(router)
+    x, y = tile_for_point(*spots[0], 12)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        etag = (await client.get(f"/v1/tiles/12/{x}/{y}.mvt")).headers["etag"]
+        full, conditional = [], []
+        for _ in range(args.repeat * 20):
+            start = time.perf_counter()
+            response = await client.get(f"/v1/tiles/12/{x}/{y}.mvt")
+            full.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            not_modified = await client.get(f"/v1/tiles/12/{x}/{y}.mvt", headers={"If-None-Match": etag})
+            conditional.append(time.perf_counter() - start)
+    print(json.dumps({
+        "run": "not_modified", "status": not_modified.status_code, "cached_200_p50_ms": ms(full),
+        "cached_200_bytes": len(response.content), "not_modified_p50_ms": ms(conditional),
+    }))
+
+
+async def bench_invalidate(rng: random.Random, spots: list, args):
+    async with AsyncSessionLocal() as db:
+        for z in ZOOMS:  # a warm cache to invalidate
+            for lat, lon in spots:
+                await tile_cache.get(db, z, *tile_for_point(lat, lon, z), "mvt")
+        samples = []
+        for row in captures(rng, spots, args.writes, "single"):
+            with engine.begin() as conn:
+                conn.execute(insert(UserCapture), [row])
+            start = time.perf_counter()
+            await tile_cache.get(db, 16, *tile_for_point(row["latitude"], row["longitude"], 16), "mvt")
+            samples.append(time.perf_counter() - start)
+        before = dict(tile_cache.stats)
+        with engine.begin() as conn:
+            conn.execute(insert(UserCapture), list(captures(rng, spots, TILE_INVALIDATE_MAX + 1, "batch")))
+        start = time.perf_counter()
+        await tile_cache.sync(db)
+        batch = time.perf_counter() - start
+    print(json.dumps({
+        "run": "invalidate", "writes": args.writes, "lookup_after_write_p50_ms": ms(samples),
+        "invalidated": before["invalidated"], "batch_rows": TILE_INVALIDATE_MAX + 1,
+        "batch_sync_ms": round(batch * 1000, 3), "cleared": tile_cache.stats["cleared"] - before["cleared"],
+    }))
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    spots = [(rng.uniform(46, 50), rng.uniform(30, 36)) for _ in range(args.spots)]
+    remaining = args.captures
+    while remaining > 0:
+        with engine.begin() as conn:
+            conn.execute(insert(UserCapture), list(captures(rng, spots, min(remaining, 50000), f"bulk{remaining}")))
+        remaining -= 50000
+    await bench_render(spots, args)
+    await bench_not_modified(spots, args)
+    await bench_invalidate(rng, spots, args)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--captures", type=int, default=200000)
+    parser.add_argument("--spots", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
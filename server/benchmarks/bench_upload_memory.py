@@ -0,0 +1,182 @@
+# benchmarks/bench_upload_memory.py
+"""
+Server peak RSS while handling --concurrency simultaneous --size-mb uploads to
+/upload_image_query.
+
+Each handler runs in its own uvicorn child process with a throwaway database
+and image store, and the LLM backend mocked in-process:
+
+  legacy     the handler as it was before streaming uploads: the file is read
+             whole, hashed, base64-encoded into a data URL and stored from bytes
+  streaming  the app's handler: hashed and stored in chunks from the spooled
+             upload, with the data URL built into one preallocated buffer
+
+The parent sends the uploads and reads the child's peak RSS (VmHWM) from
+/proc before and after, so client-side copies of the payload are not counted.
+With --preprocess 1 (IMAGE_PREPROCESS) the payload is a noise JPEG and only the
+downscaled image is sent to the model; otherwise it is random bytes sent as-is.
+
+Usage (from the server directory):
+    python benchmarks/bench_upload_memory.py --concurrency 8 --size-mb 10
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available")
+
+
+def mock_completion(request):
+    import httpx
+    request.read()
+    return httpx.Response(200, json={
+        "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": "bench",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "{}"}}],
+    })
+
+
+def legacy_app():
+    """The pre-streaming upload handler, on the same mocked backend and image store."""
+    from fastapi import FastAPI, File, Form, UploadFile
+    from starlette.concurrency import run_in_threadpool
+
+    from batching import vision_dispatcher
+    from config import LLM_MODEL
+    from image_processing import prepare_image
+    from image_store import image_store
+
+    app = FastAPI()
+
+    @app.post("/upload_image_query")
+    async def upload_image_query(file: UploadFile = File(...), text: str = Form(...)):
+        contents = await file.read()
+        image_sha256 = hashlib.sha256(contents).hexdigest()
+        prepared = await prepare_image(contents, file.content_type)
+        base64_image = base64.b64encode(prepared.data).decode("utf-8")
+        image_url = f"data:{prepared.mime};base64,{base64_image}"
+        response = await vision_dispatcher.submit(model=LLM_MODEL, messages=[
+            {"role": "user", "content": [
+                {"type": "text", "text": text}, {"type": "image_url", "image_url": {"url": image_url}},
+            ]},
+        ])
+        await run_in_threadpool(image_store.put, contents, image_sha256)
+        return {"response": response.choices[0].message.content}
+
+    return app
+
+
+def serve(mode: str, port: int):
+    import httpx
+    import uvicorn
+
+    sys.path.insert(0, str(SERVER_DIR))
+    from batching import vision_dispatcher
+    from clients import AsyncLLMClient
+
+    logging.disable(logging.INFO)
+    vision_dispatcher.client = AsyncLLMClient(transport=httpx.MockTransport(mock_completion))
+    if mode == "legacy":
+        app = legacy_app()
+    else:
+        from main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def payload(size_mb: float, preprocess: bool, seed: int) -> bytes:
+    if not preprocess:
+        return os.urandom(int(size_mb * 1024 * 1024))
+    from PIL import Image
+    # RGB noise at quality 95 encodes to ~1.2 bytes per pixel
+    side = int((size_mb * 1024 * 1024 / 1.2) ** 0.5)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, comment=str(seed).encode())
+    return buffer.getvalue()
+
+
+async def run(mode: str, args) -> dict:
+    import httpx
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    tmp = tempfile.mkdtemp(prefix=f"bench-upload-{mode}-")
+    env = dict(
+        os.environ, SQLITE_DB_PATH=os.path.join(tmp, "bench.db"), IMAGE_STORE_DIR=os.path.join(tmp, "images"),
+        IMAGE_PREPROCESS=str(args.preprocess),
+    )
+    child = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--port", str(port)], env=env, cwd=SERVER_DIR)
+    bodies = [payload(args.size_mb, args.preprocess, i) for i in range(args.concurrency)]
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            for _ in range(300):
+                try:
+                    await client.get("/openapi.json")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            idle_mb = peak_rss_mb(child.pid)
+
+            async def upload(body: bytes):
+                return await client.post(
+                    "/upload_image_query", data={"text": "What is this?"},
+                    files={"file": ("capture.jpg", body, "image/jpeg")},
+                )
+
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(upload(body) for body in bodies))
+            elapsed = time.perf_counter() - start
+            peak_mb = peak_rss_mb(child.pid)
+    finally:
+        child.terminate()
+        child.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "mode": mode, "preprocess": args.preprocess, "concurrency": args.concurrency,
+        "upload_mb": round(len(bodies[0]) / 1024 / 1024, 1),
+        "errors": sum(r.status_code != 200 for r in responses),
+        "idle_rss_mb": round(idle_mb, 1), "peak_rss_mb": round(peak_mb, 1),
+        "mb_per_upload": round((peak_mb - idle_mb) / args.concurrency, 1),
+        "seconds": round(elapsed, 2),
+    }
+
+
+async def main(args):
+    for mode in args.modes:
+        print(json.dumps(await run(mode, args)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=10.0)
+    parser.add_argument("--preprocess", type=int, choices=(0, 1), default=0)
+    parser.add_argument("--modes", nargs="+", choices=("legacy", "streaming"), default=["legacy", "streaming"])
+    parser.add_argument("--serve", choices=("legacy", "streaming"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.serve:
+        serve(parsed.serve, parsed.port)
+    else:
+        asyncio.run(main(parsed))
@@ -0,0 +1,337 @@
+# benchmarks/load_test.py
+"""
+End-to-end load test of the server against benchmarks/mock_llm_backend.py, so
+performance can be measured without the GPU deployment.
+
+The mock backend and the server (uvicorn main:app on a throwaway database and
+image store) run as child processes. Each scenario is driven closed-loop by N
+concurrent clients for --seconds, for every N in --concurrency, and reports
+throughput, p50/p95/p99/max latency, non-2xx responses by status, the
+completions the backend served, and the server's peak RSS during that run
+(the kernel's high-water mark is reset between runs).
+
+Scenarios:
+    text_query            POST /text_query
+    upload_image_query    POST /upload_image_query (a distinct image each time, so no cache hits)
+    indic_visual_query    POST /v1/indic_visual_query
+    captures_create       POST /v1/user-captures/
+    captures_get          GET /v1/user-captures/{id}
+    captures_list         GET /v1/user-captures/?view=summary&limit=50
+    captures_update       PUT /v1/user-captures/{id}
+    captures_delete       DELETE /v1/user-captures/{id} (stops early once the seeded captures run out)
+
+Every run is printed as a JSON line. --output also writes one JSON document
+with the git commit, host and arguments; --compare reads such a document from
+an earlier commit and exits 1 if throughput drops or p95 latency rises by more
+than --threshold in any matching run. Extra server settings go through
+--server-env (e.g. --server-env BATCH_WINDOW_MS=20).
+
+Usage (from the server directory):
+    python benchmarks/load_test.py --concurrency 1 8 32 --seconds 10 --output load-$(git rev-parse --short HEAD).json
+    python benchmarks/load_test.py --scenarios text_query --backend-failure-rate 0.05 --compare load-abc1234.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+from benchmarks import mock_llm_backend  # noqa: E402
+from utils import percentile  # noqa: E402
+
+SCENARIOS = (
+    "text_query", "upload_image_query", "indic_visual_query",
+    "captures_create", "captures_get", "captures_list", "captures_update", "captures_delete",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Reset VmHWM to the current RSS (Linux 4.0+); False where that is not allowed."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def git_revision() -> dict:
+    def git(*argv):
+        return subprocess.run(["git", *argv], cwd=SERVER_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+class Images:
+    """One small JPEG with a distinct trailer per request: decoders ignore bytes after EOI, the SHA-256 differs."""
+
+    def __init__(self, side: int, seed: int):
+        image = Image.frombytes("RGB", (side, side), random.Random(seed).randbytes(side * side * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=85)
+        self.base = buffer.getvalue()
+
+    def get(self, i: int) -> bytes:
+        return self.base + f"load-test-{i}".encode()
+
+
+class Scenario:
+    def __init__(self, args, images: Images, capture_ids: list):
+        self.images = images
+        self.capture_ids = capture_ids  # seeded captures for get/update/delete
+        self.rng = random.Random(args.seed)
+        self.counter = 0
+        self.run_tag = f"{os.getpid()}-{time.time_ns()}"
+
+    def next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    async def text_query(self, client: httpx.AsyncClient):
+        return await client.post("/text_query", json={"prompt": f"RPG-7 round half buried, sample {self.next()}"})
+
+    async def upload_image_query(self, client: httpx.AsyncClient):
+        return await client.post(
+            "/upload_image_query", data={"text": "What is this?"},
+            files={"file": ("capture.jpg", self.images.get(self.next()), "image/jpeg")},
+        )
+
+    async def indic_visual_query(self, client: httpx.AsyncClient):
+        return await client.post(
+            "/v1/indic_visual_query", data={"query": "What is this?"},
+            files={"file": ("capture.jpg", self.images.get(self.next()), "image/jpeg")},
+        )
+
+    async def captures_create(self, client: httpx.AsyncClient):
+        return await client.post("/v1/user-captures/", json=capture_body(f"load-{self.run_tag}-{self.next()}", self.rng))
+
+    async def captures_get(self, client: httpx.AsyncClient):
+        if not self.capture_ids:
+            return None
+        return await client.get(f"/v1/user-captures/{self.rng.choice(self.capture_ids)}")
+
+    async def captures_list(self, client: httpx.AsyncClient):
+        return await client.get("/v1/user-captures/", params={"order": "desc", "limit": 50, "view": "summary"})
+
+    async def captures_update(self, client: httpx.AsyncClient):
+        if not self.capture_ids:
+            return None
+        capture_id = self.rng.choice(self.capture_ids)
+        return await client.put(f"/v1/user-captures/{capture_id}", json={"query_text": f"updated {self.next()}"})
+
+    async def captures_delete(self, client: httpx.AsyncClient):
+        if not self.capture_ids:
+            return None
+        return await client.delete(f"/v1/user-captures/{self.capture_ids.pop()}")
+
+
+def capture_body(user_id: str, rng: random.Random) -> dict:
+    return {
+        "user_id": user_id, "query_text": "What is this?", "image": "",
+        "latitude": rng.uniform(44.0, 52.0), "longitude": rng.uniform(22.0, 40.0), "ai_response": "{}",
+    }
+
+
+async def seed_captures(client: httpx.AsyncClient, count: int, seed: int) -> list:
+    """Bulk-insert count captures and return their ids."""
+    rng = random.Random(seed)
+    tag = time.time_ns()
+    ids = []
+    for start in range(0, count, 1000):
+        body = [capture_body(f"seed-{tag}-{i}", rng) for i in range(start, min(count, start + 1000))]
+        response = await client.post("/v1/user-captures/bulk", json=body)
+        response.raise_for_status()
+        ids.extend(item["id"] for item in response.json()["items"] if item["status"] == "created")
+    return ids
+
+
+async def drive(client: httpx.AsyncClient, call, concurrency: int, seconds: float) -> dict:
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await call(client)
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+                continue
+            if response is None:  # nothing left to operate on
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not 200 <= response.status_code < 300:
+                statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": statuses,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "max_ms": round(max(latencies, default=0.0), 1),
+    }
+
+
+async def wait_until_up(client: httpx.AsyncClient, path: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{path} server exited with code {process.returncode}")
+        try:
+            await client.get(path)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{path} server did not start within {timeout}s")
+
+
+def backend_command(args, port: int) -> list:
+    command = [sys.executable, str(SERVER_DIR / "benchmarks" / "mock_llm_backend.py"), "--port", str(port)]
+    for name, value in vars(args).items():
+        if name.startswith("backend_"):
+            command += ["--" + name[len("backend_"):].replace("_", "-"), str(value)]
+    return command
+
+
+async def main(args) -> int:
+    tmp = tempfile.mkdtemp(prefix="load-test-")
+    backend_port, server_port = free_port(), free_port()
+    env = dict(
+        os.environ,
+        DWANI_API_BASE_URL=f"http://127.0.0.1:{backend_port}/v1",
+        DWANI_API_KEY="load-test",
+        SQLITE_DB_PATH=os.path.join(tmp, "load.db"),
+        IMAGE_STORE_DIR=os.path.join(tmp, "images"),
+        INFERENCE_CACHE_DB="",
+    )
+    env.update(setting.split("=", 1) for setting in args.server_env)
+    quiet = None if args.verbose else subprocess.DEVNULL
+    backend = subprocess.Popen(backend_command(args, backend_port), cwd=SERVER_DIR, stdout=quiet, stderr=quiet)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(server_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=SERVER_DIR, env=env, stdout=quiet, stderr=quiet,
+    )
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency) + 10)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{backend_port}", timeout=10) as backend_client, \
+                httpx.AsyncClient(base_url=f"http://127.0.0.1:{server_port}", timeout=args.timeout, limits=limits) as client:
+            await wait_until_up(backend_client, "/v1/models", backend)
+            await wait_until_up(client, "/openapi.json", server)
+            capture_ids = await seed_captures(client, args.seed_captures, args.seed)
+            scenario = Scenario(args, Images(args.image_side, args.seed), capture_ids)
+
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    await asyncio.sleep(args.pause)  # let background work from the previous run settle
+                    before = (await backend_client.get("/stats")).json()
+                    peak_reset = reset_peak_rss(server.pid)
+                    result = {"scenario": name, "concurrency": concurrency}
+                    result.update(await drive(client, getattr(scenario, name), concurrency, args.seconds))
+                    after = (await backend_client.get("/stats")).json()
+                    result["backend_completions"] = after["requests"] - before["requests"]
+                    result["peak_rss_mb"] = round(peak_rss_mb(server.pid), 1)
+                    if not peak_reset:
+                        result["peak_rss_since_start"] = True
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+    finally:
+        for process in (server, backend):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    report = {
+        "git": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "args": vars(args),
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        return compare(json.loads(Path(args.compare).read_text()), report, args.threshold)
+    return 0
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """Print the change against baseline for each (scenario, concurrency) in both; 1 if any run regressed."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressed = False
+    for result in current["results"]:
+        base = previous.get((result["scenario"], result["concurrency"]))
+        if base is None:
+            continue
+        throughput = result["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        p95 = result["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        worse = throughput < -threshold or p95 > threshold
+        regressed |= worse
+        print(json.dumps({
+            "scenario": result["scenario"], "concurrency": result["concurrency"],
+            "baseline_commit": (baseline.get("git") or {}).get("commit"),
+            "throughput_change": round(throughput, 3), "p95_change": round(p95, 3),
+            "regression": worse,
+        }))
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration of each run")
+    parser.add_argument("--pause", type=float, default=1.0, help="seconds between runs")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--seed-captures", type=int, default=5000, help="captures inserted before the runs")
+    parser.add_argument("--image-side", type=int, default=640, help="side of the uploaded test image in pixels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--output", help="write all runs and run metadata to this JSON file")
+    parser.add_argument("--compare", help="JSON file written by --output on an earlier commit")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument("--verbose", action="store_true", help="show server and backend logs")
+    mock_llm_backend.add_arguments(parser, prefix="backend-")
+    sys.exit(asyncio.run(main(parser.parse_args())))
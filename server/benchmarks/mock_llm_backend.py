@@ -0,0 +1,180 @@
+# benchmarks/mock_llm_backend.py
+"""
+Stand-in for the vLLM server in deploy/vllm-qwen.yml: an OpenAI-compatible
+/v1/chat/completions (plain and streamed), /v1/models and vLLM's /tokenize,
+without a GPU.
+
+Every completion is a valid ordnance analysis JSON reported as
+--completion-tokens tokens. It starts after --latency-ms (+/- --jitter-ms) and
+is generated at --tokens-per-s; streams send one chunk per token. At most
+--slots completions run at once (0 = unlimited), like a saturated GPU batch.
+A --failure-rate fraction of requests fail with --failure-status after the
+initial latency. GET /stats reports what the backend saw.
+
+Run it on its own and point the server at it:
+    python benchmarks/mock_llm_backend.py --port 8001 --latency-ms 300 --tokens-per-s 80
+    DWANI_API_BASE_URL=http://127.0.0.1:8001/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANALYSIS = json.dumps({
+    "ordnance_type": "mine_anti_tank",
+    "subtype": "TM-62M",
+    "country_of_origin": "Eastern Bloc",
+    "production_period": "1962-present",
+    "warcrime_assessment": "possible",
+    "needs_specialist": True,
+    "confidence": 0.82,
+    "short_advice": "Do not approach; mark the area and call EOD.",
+})
+IMAGE_TOKENS = 256  # counted per image part when estimating prompt tokens
+
+
+def prompt_tokens(messages: list) -> int:
+    """Rough prompt size: ~4 characters per text token plus a fixed cost per image."""
+    chars, images = 0, 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // 4 + images * IMAGE_TOKENS
+
+
+def split_tokens(text: str, count: int) -> list:
+    """text cut into count roughly equal pieces, standing in for tokens."""
+    count = max(1, min(count, len(text)))
+    step = len(text) / count
+    return [text[round(i * step):round((i + 1) * step)] for i in range(count)]
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(args.seed)
+    slots = asyncio.Semaphore(args.slots) if args.slots > 0 else None
+    stats = {"requests": 0, "streams": 0, "failures": 0, "in_flight": 0, "max_in_flight": 0}
+    token_delay = 1 / args.tokens_per_s if args.tokens_per_s > 0 else 0.0
+
+    def completion_id() -> str:
+        return f"chatcmpl-mock-{stats['requests']}"
+
+    def usage(body: dict) -> dict:
+        prompt = prompt_tokens(body.get("messages", []))
+        return {"prompt_tokens": prompt, "completion_tokens": args.completion_tokens,
+                "total_tokens": prompt + args.completion_tokens}
+
+    async def first_token():
+        jitter = rng.uniform(-args.jitter_ms, args.jitter_ms) if args.jitter_ms else 0.0
+        await asyncio.sleep(max(0.0, args.latency_ms + jitter) / 1000)
+
+    def failure() -> JSONResponse:
+        stats["failures"] += 1
+        return JSONResponse(
+            status_code=args.failure_status,
+            content={"error": {"message": "injected failure", "type": "server_error", "code": args.failure_status}},
+        )
+
+    async def acquire():
+        if slots is not None:
+            await slots.acquire()
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+    def release():
+        stats["in_flight"] -= 1
+        if slots is not None:
+            slots.release()
+
+    async def stream(body: dict, created: int):
+        chunk = {"id": completion_id(), "object": "chat.completion.chunk", "created": created, "model": body.get("model")}
+        try:
+            for piece in split_tokens(ANALYSIS, args.completion_tokens):
+                chunk["choices"] = [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_delay)
+            chunk["choices"] = [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+            if (body.get("stream_options") or {}).get("include_usage"):
+                chunk["usage"] = usage(body)
+            yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            release()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        await acquire()
+        try:
+            await first_token()
+            if rng.random() < args.failure_rate:
+                release()
+                return failure()
+        except BaseException:
+            release()
+            raise
+        created = int(time.time())
+        if body.get("stream"):
+            stats["streams"] += 1
+            return StreamingResponse(stream(body, created), media_type="text/event-stream")
+        try:
+            await asyncio.sleep(token_delay * args.completion_tokens)
+        finally:
+            release()
+        return {
+            "id": completion_id(), "object": "chat.completion", "created": created, "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": ANALYSIS}}],
+            "usage": usage(body),
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": args.model, "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/tokenize")
+    async def tokenize(request: Request):
+        # vLLM's (non-OpenAI) endpoint, used by the server to count system prompt tokens
+        body = await request.json()
+        return {"count": prompt_tokens(body.get("messages") or [{"content": body.get("prompt", "")}])}
+
+    @app.get("/stats")
+    async def backend_stats():
+        return stats
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    """Backend options; load_test.py registers them with prefix="backend-"."""
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=200.0, help="time to first token")
+    parser.add_argument(f"--{prefix}jitter-ms", type=float, default=50.0, help="uniform +/- jitter on the latency")
+    parser.add_argument(f"--{prefix}tokens-per-s", type=float, default=100.0, help="generation rate (0 = instant)")
+    parser.add_argument(f"--{prefix}completion-tokens", type=int, default=60)
+    parser.add_argument(f"--{prefix}slots", type=int, default=16, help="concurrent completions (0 = unlimited)")
+    parser.add_argument(f"--{prefix}failure-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument(f"--{prefix}failure-status", type=int, default=503)
+    parser.add_argument(f"--{prefix}seed", type=int, default=0)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--model", default="gemma3")
+    add_arguments(parser)
+    parsed = parser.parse_args()
+    uvicorn.run(create_app(parsed), host=parsed.host, port=parsed.port, log_level="warning")
@@ -1,9 +1,296 @@
 # clients.py
-from openai import OpenAI
-from config import API_KEY, BASE_URL
-
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=API_KEY,
-    base_url=BASE_URL
-)
\ No newline at end of file
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Optional, Sequence, Union
+
+import httpx
+from openai import APITimeoutError
+
+from config import (
+    API_KEY, LLM_BACKENDS, LLM_MAX_CONCURRENCY, LLM_MAX_CONNECTIONS,
+    LLM_TIMEOUT, LLM_CONNECT_TIMEOUT, LLM_MAX_RETRIES, LLM_STREAM_USAGE,
+    LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_MIN_MS, LLM_HEDGE_BUDGET
+)
+from backends import Backend, BackendPool, is_retryable
+from metrics import SPAN_SECONDS, LLM_HEDGES, span, record_usage
+from utils import percentile
+
+
+class LLMTimeoutError(Exception):
+    """Raised when an LLM call does not finish within its timeout."""
+
+
+def retry_delay(attempt: int) -> float:
+    """Backoff before retrying on a backend that has already failed this call."""
+    return min(0.5 * 2 ** attempt, 8.0)
+
+
+class AsyncLLMClient:
+    """
+    Async OpenAI-compatible client shared by all routers.
+
+    All calls go through one pooled httpx.AsyncClient to a BackendPool, which sends
+    each call to the least loaded healthy backend. No backend gets more than
+    max_concurrency requests in flight (hedges included): a burst of uploads queues
+    here instead of overloading the GPU servers, or the healthy ones while others
+    are out of the rotation. Failed calls are retried (up to max_retries) on
+    another backend where there is one. With hedge_percentile set, a call still
+    running after that percentile of recent latencies is also sent to an idle second
+    backend, and whichever answers first wins.
+    """
+
+    def __init__(
+        self,
+        api_key: str = API_KEY,
+        base_url: Union[str, Sequence[str]] = LLM_BACKENDS,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout: float = LLM_TIMEOUT,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        hedge_min_ms: float = LLM_HEDGE_MIN_MS,
+        hedge_budget: float = LLM_HEDGE_BUDGET,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            transport=transport,
+        )
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        self.pool = BackendPool(urls, api_key, self.http_client)
+        self.max_concurrency = max_concurrency  # per backend
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_ms = hedge_min_ms
+        self.hedge_budget = hedge_budget
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Rolling latency samples (ms); time-to-first-token is kept apart from total stream time
+        self.latency_ms = deque(maxlen=1024)
+        self.service_ms = deque(maxlen=1024)  # single backend calls, without queueing or retries; sets the hedge delay
+        self.ttft_ms = deque(maxlen=1024)
+        self.stream_total_ms = deque(maxlen=1024)
+
+    @property
+    def in_flight(self) -> int:
+        """Requests outstanding on all backends, hedges included."""
+        return self.pool.outstanding
+
+    def start(self):
+        self.pool.start()
+
+    async def _call(self, backend: Backend, kwargs: dict):
+        """One request on a backend whose begin() the caller made."""
+        start = time.perf_counter()
+        try:
+            response = await backend.openai.chat.completions.create(**kwargs)
+        except asyncio.CancelledError:
+            backend.cancelled()
+            raise
+        except Exception as e:
+            backend.failed(e, self.pool.breaker_failures, self.pool.breaker_cooldown)
+            raise
+        service_ms = (time.perf_counter() - start) * 1000
+        backend.succeeded(service_ms)
+        self.service_ms.append(service_ms)
+        return response
+
+    def _spawn(self, backend: Backend, kwargs: dict) -> asyncio.Future:
+        """_call as a task; a task cancelled before it ran still releases the backend."""
+        started = False
+
+        async def run():
+            nonlocal started
+            started = True
+            return await self._call(backend, kwargs)
+
+        task = asyncio.ensure_future(run())
+        task.add_done_callback(lambda t: t.cancelled() and not started and backend.cancelled())
+        return task
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds before hedging a call, or None while hedging is off or there is too little history."""
+        if self.hedge_percentile <= 0 or len(self.pool.backends) < 2 or len(self.service_ms) < self.hedge_min_samples:
+            return None
+        return max(percentile(self.service_ms, self.hedge_percentile), self.hedge_min_ms) / 1000
+
+    async def _hedged(self, backend: Backend, kwargs: dict):
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._call(backend, kwargs)
+        first = self._spawn(backend, kwargs)
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            # Hedge only onto an idle backend and within budget, so a slow cluster is not sent twice the load
+            second = self.pool.pick(exclude=[backend], max_outstanding=self.max_concurrency)
+            if second is None or self.hedges >= self.hedge_budget * self.calls:
+                return await first
+            self.hedges += 1
+            LLM_HEDGES.inc(("launched",))
+            second.begin()
+            hedge = self._spawn(second, kwargs)
+            tasks.add(hedge)
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                            LLM_HEDGES.inc(("won",))
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _create(self, kwargs: dict):
+        self.calls += 1
+        tried = []
+        for attempt in range(self.max_retries + 1):
+            backend = await self.pool.acquire(self.max_concurrency, exclude=tried)
+            try:
+                return await self._hedged(backend, kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if backend in tried or len(self.pool.backends) == 1:
+                    await asyncio.sleep(retry_delay(attempt))
+                tried.append(backend)
+
+    async def chat_completion(self, timeout: Optional[float] = None, **kwargs):
+        """
+        Run chat.completions.create on the least loaded backend.
+        The timeout covers waiting for a free slot, retries, hedges and the request itself.
+        """
+        timeout = timeout or self.timeout
+        kwargs.setdefault("timeout", timeout)
+        start = time.perf_counter()
+        try:
+            with span("llm_call"):
+                response = await asyncio.wait_for(self._create(kwargs), timeout=timeout)
+        except (asyncio.TimeoutError, APITimeoutError) as e:
+            raise LLMTimeoutError(f"LLM call timed out after {timeout:.1f}s") from e
+        self.latency_ms.append((time.perf_counter() - start) * 1000)
+        record_usage(kwargs.get("model", ""), response.usage)
+        return response
+
+    async def _open_stream(self, kwargs: dict):
+        """Start a stream on the least loaded backend, retrying elsewhere until it is open (never mid-stream)."""
+        tried = []
+        for attempt in range(self.max_retries + 1):
+            backend = await self.pool.acquire(self.max_concurrency, exclude=tried)
+            try:
+                return backend, await backend.openai.chat.completions.create(stream=True, **kwargs)
+            except asyncio.CancelledError:
+                backend.cancelled()
+                raise
+            except Exception as e:
+                backend.failed(e, self.pool.breaker_failures, self.pool.breaker_cooldown)
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if backend in tried or len(self.pool.backends) == 1:
+                    await asyncio.sleep(retry_delay(attempt))
+                tried.append(backend)
+
+    async def stream_chat_completion(self, timeout: Optional[float] = None, **kwargs) -> AsyncIterator[str]:
+        """
+        Run chat.completions.create with stream=True and yield content deltas as they arrive.
+        The timeout applies to each read from the backend, not to the whole stream.
+        Streams are neither hedged nor retried once the first chunk has been requested.
+        """
+        kwargs.setdefault("timeout", timeout or self.timeout)
+        if LLM_STREAM_USAGE:
+            # The backend then sends token usage in a final chunk without choices
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        start = time.perf_counter()
+        first_token_at = None
+        try:
+            self.calls += 1
+            backend, stream = await self._open_stream(kwargs)
+            try:
+                async for chunk in stream:
+                    record_usage(kwargs.get("model", ""), getattr(chunk, "usage", None))
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            self.ttft_ms.append((first_token_at - start) * 1000)
+                        yield delta
+            except (asyncio.CancelledError, GeneratorExit):
+                backend.cancelled()
+                raise
+            except Exception as e:
+                backend.failed(e, self.pool.breaker_failures, self.pool.breaker_cooldown)
+                raise
+            backend.succeeded()
+        except APITimeoutError as e:
+            raise LLMTimeoutError(f"LLM stream timed out after {kwargs['timeout']:.1f}s") from e
+        elapsed = time.perf_counter() - start
+        self.stream_total_ms.append(elapsed * 1000)
+        SPAN_SECONDS.observe(elapsed, ("llm_stream",))
+
+    async def count_tokens(self, model: str, text: str, timeout: Optional[float] = None) -> int:
+        """
+        Token count of text from a backend's /tokenize endpoint (vLLM; not part of the OpenAI API,
+        so it lives at the server root rather than under /v1).
+        """
+        root = self.pool.pick().url.removesuffix("/v1")
+        response = await self.http_client.post(
+            f"{root}/tokenize",
+            json={"model": model, "prompt": text},
+            headers={"Authorization": f"Bearer {self.pool.api_key}"},
+            timeout=timeout or self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()["count"]
+
+    def snapshot(self) -> dict:
+        def summary(samples):
+            values = list(samples)
+            return {
+                "count": len(values),
+                "p50": round(percentile(values, 0.50), 2),
+                "p95": round(percentile(values, 0.95), 2),
+            }
+
+        hedge_delay = self._hedge_delay()
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "latency_ms": summary(self.latency_ms),
+            "stream_ttft_ms": summary(self.ttft_ms),
+            "stream_total_ms": summary(self.stream_total_ms),
+            "hedging": {
+                "percentile": self.hedge_percentile,
+                "delay_ms": round(hedge_delay * 1000, 2) if hedge_delay is not None else None,
+                "calls": self.calls,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            },
+            "backends": self.pool.snapshot(),
+        }
+
+    async def aclose(self):
+        await self.pool.aclose()
+        await self.http_client.aclose()
+
+
+# Shared client used by all routers
+llm = AsyncLLMClient()
@@ -1,39 +1,129 @@
 # config.py
 import os
 
-# Constants
-DEFAULT_SYSTEM_PROMPT = """
-You are WeaponWatchAI, a military-grade ordnance identification assistant used by soldiers in the field.
-
-You MUST output a STRICT JSON OBJECT with NO extra text, NO comments, NO markdown, NO surrounding quotes, and NO explanations.
-
-JSON SCHEMA (MANDATORY):
-
-{
-  "ordnance_type": "mine_anti_personnel | mine_anti_tank | bomb_air_dropped | bomb_improvised | artillery_155mm | artillery_122mm | mortar_60mm | mortar_82mm | grenade_frag | grenade_rgd5 | drone_quadcopter | drone_fixedwing | drone_loitering_munition | vehicle_tank | vehicle_apc | vehicle_truck_military | unknown",
-  "subtype": "string",
-  "country_of_origin": "Eastern Bloc | NATO | Soviet WW2 | German WW2 | Western | Middle Eastern | Asian | Unknown",
-  "production_period": "string",
-  "warcrime_assessment": "likely | possible | unlikely | unknown",
-  "needs_specialist": true,
-  "confidence": 0.0,
-  "short_advice": "string"
-}
-
-RULES:
-- Output ONLY JSON.
-- If unsure about any field, use "unknown".
-- ordnance_type must be chosen exactly from the list above.
-- subtype is free-form: choose the most likely subtype.
-- production_period must reflect realistic manufacturing era (e.g., "1942–1945", "1970–present").
-- country_of_origin must be broad (NATO, Eastern Bloc, etc).
-- warcrime_assessment uses: likely, possible, unlikely, unknown.
-- needs_specialist = true if EOD handling recommended.
-- If object is not ordnance: set type=unknown and set fields accordingly.
-
-Return EXACT JSON with NO additional text.
-"""
-
 # Environment configuration
 API_KEY = os.getenv("DWANI_API_KEY", "your-api-key-here")
-BASE_URL = os.getenv("DWANI_API_BASE_URL", "https://your-custom-endpoint.com/v1")
\ No newline at end of file
+BASE_URL = os.getenv("DWANI_API_BASE_URL", "https://your-custom-endpoint.com/v1")
+
+# LLM client configuration
+LLM_MODEL = os.getenv("LLM_MODEL", "gemma3")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # in-flight requests per backend
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))  # shared HTTP connection pool size
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))  # seconds, per call (queueing + request)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_STREAM_USAGE = os.getenv("LLM_STREAM_USAGE", "0") == "1"  # request token usage on streams (stream_options)
+
+# LLM backends (comma-separated OpenAI-compatible base URLs; requests go to the least loaded healthy one)
+LLM_BACKENDS = [url.strip() for url in os.getenv("LLM_BACKENDS", BASE_URL).split(",") if url.strip()]
+LLM_HEALTH_INTERVAL_S = float(os.getenv("LLM_HEALTH_INTERVAL_S", "10"))  # GET <backend>/models; 0 disables checks
+LLM_HEALTH_TIMEOUT_S = float(os.getenv("LLM_HEALTH_TIMEOUT_S", "2"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # consecutive failures that open a backend's circuit
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))  # then one trial request may close it again
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))  # e.g. 0.95: resend calls slower than p95; 0 disables
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "50"))  # latencies needed before hedging starts
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", "200"))  # never hedge sooner than this
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))  # hedges as a fraction of calls, caps the extra load
+
+# System prompt registry (<name>.v<version>.txt files, loaded once at startup)
+PROMPTS_DIR = os.getenv("PROMPTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+DEFAULT_PROMPT_ID = os.getenv("DEFAULT_PROMPT_ID", "ordnance")  # a bare name means its latest version
+PROMPT_TOKENIZE_TIMEOUT = float(os.getenv("PROMPT_TOKENIZE_TIMEOUT", "5"))  # seconds to count tokens at startup
+
+# Content-addressed image store (sharded by SHA-256)
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "image_store")
+
+# Inference result cache (size 0 disables it; empty DB path keeps it in memory only)
+INFERENCE_CACHE_SIZE = int(os.getenv("INFERENCE_CACHE_SIZE", "1024"))
+INFERENCE_CACHE_TTL = float(os.getenv("INFERENCE_CACHE_TTL", "86400"))  # seconds
+INFERENCE_CACHE_DB = os.getenv("INFERENCE_CACHE_DB", "")
+INFERENCE_CACHE_DB_ROWS = int(os.getenv("INFERENCE_CACHE_DB_ROWS", "100000"))  # oldest-expiring rows beyond this are deleted
+INFERENCE_CACHE_PURGE_EVERY = int(os.getenv("INFERENCE_CACHE_PURGE_EVERY", "1000"))  # writes between purges of the SQLite tier
+
+# Micro-batching of vision queries (window 0 disables it)
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "0"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+
+# Image normalization before inference
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "1") == "1"
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "896"))  # gemma3 vision encoder resolution
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", "64000000"))  # larger uploads are rejected (400) before decoding
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "4"))
+IMAGE_STORE_ORIGINAL = os.getenv("IMAGE_STORE_ORIGINAL", "1") == "1"  # otherwise store the normalized image
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "96"))  # longest side of list-view thumbnails
+
+# SQLite engine (pragmas are applied to every new connection, sync and async)
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"  # log every SQL statement
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a pooled connection
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))  # wait on a locked database instead of failing
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")  # readers no longer block the writer (and vice versa)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # with WAL, only fsyncs at checkpoints
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))  # page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes; 0 disables memory-mapped I/O
+
+# Bulk capture ingest
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  # NDJSON lines committed per transaction
+
+# Bulk capture export (/v1/user-captures/export/, export_captures.py)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # rows fetched per round-trip of the server-side cursor
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(256 * 1024)))  # encoded rows buffered before compressing
+
+# Hot/cold tiering: captures older than ARCHIVE_AFTER_DAYS move to Parquet files (archive_captures.py)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")  # Parquet files and image zips: the only copy of archived captures, keep it with the database
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))  # rows per Parquet row group
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd")  # Parquet codec: zstd, snappy, gzip or none
+
+# Uploads
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))  # largest accepted file; 413 above
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # read/hash/encode granularity
+UPLOAD_FORM_OVERHEAD = int(os.getenv("UPLOAD_FORM_OVERHEAD", str(256 * 1024)))  # multipart framing and text fields
+
+# Background inference jobs (uploads with wait=false are saved first and answered by these workers)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))  # jobs in progress; LLM_MAX_CONCURRENCY still caps backend calls
+INFERENCE_JOB_MAX_ATTEMPTS = int(os.getenv("INFERENCE_JOB_MAX_ATTEMPTS", "5"))
+INFERENCE_JOB_BACKOFF_S = float(os.getenv("INFERENCE_JOB_BACKOFF_S", "2"))  # first retry delay, doubled per attempt
+INFERENCE_JOB_BACKOFF_MAX_S = float(os.getenv("INFERENCE_JOB_BACKOFF_MAX_S", "300"))
+INFERENCE_JOB_LEASE_S = float(os.getenv("INFERENCE_JOB_LEASE_S", "600"))  # running jobs older than this were lost; retried
+INFERENCE_JOB_POLL_S = float(os.getenv("INFERENCE_JOB_POLL_S", "1"))  # idle workers recheck for due retries
+
+# Capture event push (/v1/capture-events)
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))  # events buffered per console before drops
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "500"))
+EVENTS_HEARTBEAT_S = float(os.getenv("EVENTS_HEARTBEAT_S", "15"))  # keep-alive comment on idle streams
+EVENTS_BULK_LIMIT = int(os.getenv("EVENTS_BULK_LIMIT", "1000"))  # larger bulk ingests send one resync event instead
+
+# PDF text extraction and summarization (/v1/extract-text, /v1/indic-summarize-pdf-all)
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(200 * 1024 * 1024)))  # largest accepted PDF; 413 above
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))  # extraction processes (pypdf holds the GIL)
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))  # pages one worker extracts per task
+PDF_TEMP_DIR = os.getenv("PDF_TEMP_DIR", "") or None  # where uploads are written for the workers; default: system temp
+SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "4000"))  # text per summary call (~1k tokens; deploy/ caps context at 2048)
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "384"))  # per chunk summary and for the final summary
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))  # chunk summaries in flight per document
+
+# Incidents: uploads of the same object (near-identical perceptual hash, close in place and time) are linked
+INCIDENT_RADIUS_M = float(os.getenv("INCIDENT_RADIUS_M", "150"))  # earlier captures this close ...
+INCIDENT_WINDOW_S = float(os.getenv("INCIDENT_WINDOW_S", "1800"))  # ... and this recent are candidates
+INCIDENT_MAX_DISTANCE = int(os.getenv("INCIDENT_MAX_DISTANCE", "10"))  # bits that may differ of the 64-bit hashes
+INCIDENT_REUSE_MAX_DISTANCE = int(os.getenv("INCIDENT_REUSE_MAX_DISTANCE", "4"))  # answer from a duplicate this close; -1 disables
+INCIDENT_REUSE_MIN_CONFIDENCE = float(os.getenv("INCIDENT_REUSE_MIN_CONFIDENCE", "0.8"))  # only confident analyses are reused
+
+# Analytics: capture counts per (geohash cell, time bucket, ordnance type), kept by triggers.
+# Each level is <geohash precision>:<bucket seconds>; queries use the coarsest level that can answer.
+ROLLUP_LEVELS = [
+    tuple(int(part) for part in level.split(":"))
+    for level in os.getenv("ROLLUP_LEVELS", "6:3600,4:86400").split(",") if level.strip()
+]
+ROLLUP_MAX_ROWS = int(os.getenv("ROLLUP_MAX_ROWS", "20000"))  # largest analytics response
+
+# Map tiles: captures clustered on a grid per web-mercator tile, cached until a capture inside changes
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "20"))
+TILE_CLUSTER_GRID = int(os.getenv("TILE_CLUSTER_GRID", "8"))  # cells per tile side; 32 px clusters on 256 px tiles
+TILE_EXTENT = int(os.getenv("TILE_EXTENT", "4096"))  # vector tile coordinate range
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", "4096"))  # rendered tiles kept per process; 0 disables
+TILE_INVALIDATE_MAX = int(os.getenv("TILE_INVALIDATE_MAX", "500"))  # more changes at once clear the whole cache
+TILE_CHANGES_KEEP = int(os.getenv("TILE_CHANGES_KEEP", "100000"))  # capture_changes rows kept for invalidation
@@ -2,19 +2,70 @@
 import os
 import json
 from pathlib import Path
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float
+from sqlalchemy import (
+    create_engine, event, inspect, text, Column, Integer, String, DateTime, Text, Float, Boolean, Index, MetaData, Table
+)
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import logging
 from datetime import datetime
+from typing import List
 from constants import MOCK_DATA_JSON
+from config import (
+    DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_BUSY_TIMEOUT_MS,
+    DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, ROLLUP_LEVELS, TILE_CHANGES_KEEP
+)
+from image_store import image_store
+from metrics import span
 logger = logging.getLogger(__name__)
 
 SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "app.db")
 db_dir = Path(SQLITE_DB_PATH).parent
 db_dir.mkdir(parents=True, exist_ok=True)
-engine = create_engine(f"sqlite:///{SQLITE_DB_PATH}", echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ENGINE_OPTIONS = {
+    "echo": DB_ECHO,
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection; pragmas other than journal_mode are per-connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+class TimedSession(Session):
+    """Session whose commits are recorded as the db_commit span (async sessions commit through it too)."""
+
+    def commit(self):
+        with span("db_commit"):
+            super().commit()
+
+# Sync engine: schema management, startup seeding and the maintenance scripts
+engine = create_engine(f"sqlite:///{SQLITE_DB_PATH}", **ENGINE_OPTIONS)
+event.listen(engine, "connect", _apply_pragmas)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=TimedSession)
+
+# Async engine (aiosqlite): request handlers, so queries never block the event loop
+# (aiosqlite defaults to NullPool, i.e. a new connection and pragma round-trip per session)
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{SQLITE_DB_PATH}", poolclass=AsyncAdaptedQueuePool, **ENGINE_OPTIONS
+)
+event.listen(async_engine.sync_engine, "connect", _apply_pragmas)
+# expire_on_commit=False keeps committed rows readable without another (implicit, sync) load
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False, sync_session_class=TimedSession
+)
 Base = declarative_base()
 
 class UserCapture(Base):
@@ -23,13 +74,395 @@ class UserCapture(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, index=True)
     query_text = Column(Text)
-    image = Column(Text)  # Base64 encoded string
+    image_legacy = Column("image", Text, nullable=True)  # Inline data URL from before the image store; see migrate_images.py
+    image_sha256 = Column(String(64), index=True)  # Key into image_store
+    image_size = Column(Integer)
+    image_mime = Column(String)
     latitude = Column(Float)
     longitude = Column(Float)
-    ai_response = Column(Text)
+    ai_response = Column(Text)  # NULL until a background inference job has answered
+    inference_status = Column(String)  # queued | done | failed for captures answered by a job (see jobs.py)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-Base.metadata.create_all(bind=engine)
+    # Typed fields parsed from ai_response at write time (see analysis.py); NULL if it did not parse
+    ordnance_type = Column(String, index=True)
+    ordnance_subtype = Column(String)
+    country_of_origin = Column(String)
+    production_period = Column(String)
+    warcrime_assessment = Column(String, index=True)
+    needs_specialist = Column(Boolean, index=True)
+    confidence = Column(Float, index=True)
+    short_advice = Column(Text)
+
+    # Near-duplicate linking (see incidents.py); only set for uploads
+    phash = Column(Integer)  # 64-bit difference hash of the image, stored signed
+    incident_id = Column(Integer, index=True)
+
+    __table_args__ = (
+        # Serves the common BMS filter: ordnance type + specialist flag + minimum confidence
+        Index("ix_user_captures_ordnance_specialist_confidence", "ordnance_type", "needs_specialist", "confidence"),
+        # Keyset pagination and time-range scans in (created_at, id) order
+        Index("ix_user_captures_created_at_id", "created_at", "id"),
+        # Never reuse an id: archived captures (archive.py) keep theirs outside this table
+        {"sqlite_autoincrement": True},
+    )
+
+    @property
+    def image(self) -> str:
+        """Image as a data URL, read from the image store (or the legacy inline column)."""
+        if self.image_legacy:
+            return self.image_legacy
+        if self.image_sha256:
+            return image_store.data_url(self.image_sha256, self.image_mime)
+        return ""
+
+class InferenceJob(Base):
+    """A vision query for a capture that was saved before it was answered; run by jobs.py workers."""
+    __tablename__ = "inference_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    capture_id = Column(Integer, index=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    system_prompt = Column(Text)
+    cache_key = Column(String(64))  # inference cache entry to fill with the response
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)  # not claimed before this (retry backoff)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # Workers claim the oldest due job of a status
+        Index("ix_inference_jobs_status_available_at", "status", "available_at"),
+    )
+
+class Incident(Base):
+    """Captures of one object reported by several people; capture_count is kept by triggers."""
+    __tablename__ = "incidents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    latitude = Column(Float)  # of the first capture
+    longitude = Column(Float)
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+    capture_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Newest activity first, for the incident listing
+        Index("ix_incidents_last_seen_at_id", "last_seen_at", "id"),
+    )
+
+class PdfDocument(Base):
+    """A PDF whose pages have been read (see pdfs.py), keyed by the SHA-256 of its bytes."""
+    __tablename__ = "pdf_documents"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer)
+    page_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PdfPage(Base):
+    """Extracted text of one page; repeated uploads of a document are served from here."""
+    __tablename__ = "pdf_pages"
+
+    document_sha256 = Column(String(64), primary_key=True)
+    page_number = Column(Integer, primary_key=True)  # 1-based
+    text = Column(Text, nullable=False)
+
+class CaptureRollup(Base):
+    """
+    Captures per geohash cell, time bucket and ordnance type at one level of ROLLUP_LEVELS
+    (see rollups.py), kept by triggers. A cell is the geohash of that precision as its
+    latitude and longitude bit indices, so coarser cells are a shift away.
+    """
+    __tablename__ = "capture_rollups"
+
+    precision = Column(Integer, primary_key=True)  # geohash characters
+    bucket_seconds = Column(Integer, primary_key=True)
+    bucket_start = Column(Integer, primary_key=True)  # unix time (UTC)
+    lat_cell = Column(Integer, primary_key=True)
+    lon_cell = Column(Integer, primary_key=True)
+    ordnance_type = Column(String, primary_key=True)  # ROLLUP_UNCLASSIFIED until analyzed
+    count = Column(Integer, nullable=False)
+
+    # Clustered on the key: a time range of one level is one contiguous read
+    __table_args__ = {"sqlite_with_rowid": False}
+
+class CaptureChange(Base):
+    """
+    Positions where a capture appeared, changed or disappeared, written by triggers; the
+    map tile cache (tiles.py) reads the rows past the last seq it saw to drop stale tiles.
+    Only the newest TILE_CHANGES_KEEP rows are kept.
+    """
+    __tablename__ = "capture_changes"
+
+    seq = Column(Integer, primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+
+    # Never reuse a seq, even of pruned rows
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class CaptureArchive(Base):
+    """
+    A Parquet file of captures moved out of user_captures by archive.py, one per day and
+    archive run. Written in the transaction that deletes its rows, so only listed files are read.
+    """
+    __tablename__ = "capture_archives"
+
+    path = Column(String, primary_key=True)  # relative to ARCHIVE_DIR
+    day = Column(String, nullable=False, index=True)  # UTC date of created_at, YYYY-MM-DD
+    row_count = Column(Integer, nullable=False)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    min_created_at = Column(DateTime, nullable=False)
+    max_created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedImage(Base):
+    """An image blob moved from the image store into a zip archive with the captures using it."""
+    __tablename__ = "archived_images"
+
+    sha256 = Column(String(64), primary_key=True)
+    archive = Column(String, nullable=False)  # zip file relative to ARCHIVE_DIR; the member is named sha256
+    size = Column(Integer)
+    mime = Column(String)
+
+class CaptureArchiveGuard(Base):
+    """
+    Holds a row only inside an archive transaction, so the delete triggers of rollups and
+    incidents keep counting archived captures; other connections never see it.
+    """
+    __tablename__ = "capture_archive_guard"
+
+    id = Column(Integer, primary_key=True)
+
+# R*Tree spatial index over user_captures coordinates, kept in sync by triggers.
+# Declared on its own MetaData because create_all cannot create virtual tables.
+capture_rtree = Table(
+    "user_captures_rtree", MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("min_lat", Float),
+    Column("max_lat", Float),
+    Column("min_lon", Float),
+    Column("max_lon", Float),
+)
+
+SPATIAL_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_captures_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_rtree_insert AFTER INSERT ON user_captures
+       WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+       BEGIN
+           INSERT OR REPLACE INTO user_captures_rtree
+           VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_rtree_update AFTER UPDATE OF latitude, longitude ON user_captures
+       BEGIN
+           DELETE FROM user_captures_rtree WHERE id = OLD.id;
+           INSERT INTO user_captures_rtree
+           SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+           WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_rtree_delete AFTER DELETE ON user_captures
+       BEGIN
+           DELETE FROM user_captures_rtree WHERE id = OLD.id;
+       END""",
+    # Index rows written before the spatial index existed
+    """INSERT INTO user_captures_rtree
+       SELECT id, latitude, latitude, longitude, longitude FROM user_captures
+       WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+         AND id NOT IN (SELECT id FROM user_captures_rtree)""",
+]
+
+# Deletes that are archiving (see CaptureArchiveGuard) leave history counts alone
+NOT_ARCHIVING = "NOT EXISTS (SELECT 1 FROM capture_archive_guard)"
+
+# incidents.capture_count and last_seen_at follow the captures linked to them
+INCIDENT_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS user_captures_incident_insert AFTER INSERT ON user_captures
+       WHEN NEW.incident_id IS NOT NULL
+       BEGIN
+           UPDATE incidents SET capture_count = capture_count + 1, last_seen_at = MAX(last_seen_at, NEW.created_at)
+           WHERE id = NEW.incident_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_incident_update AFTER UPDATE OF incident_id ON user_captures
+       WHEN OLD.incident_id IS NOT NEW.incident_id
+       BEGIN
+           UPDATE incidents SET capture_count = capture_count - 1 WHERE id = OLD.incident_id;
+           UPDATE incidents SET capture_count = capture_count + 1, last_seen_at = MAX(last_seen_at, NEW.created_at)
+           WHERE id = NEW.incident_id;
+       END""",
+    "DROP TRIGGER IF EXISTS user_captures_incident_delete",
+    f"""CREATE TRIGGER user_captures_incident_delete AFTER DELETE ON user_captures
+       WHEN OLD.incident_id IS NOT NULL AND {NOT_ARCHIVING}
+       BEGIN
+           UPDATE incidents SET capture_count = capture_count - 1 WHERE id = OLD.incident_id;
+       END""",
+]
+
+# Changes to what map tiles show (position and the properties of single captures) are logged
+TILE_CHANGES_DDL = [
+    "DROP TRIGGER IF EXISTS capture_changes_prune",
+    f"""CREATE TRIGGER capture_changes_prune AFTER INSERT ON capture_changes
+       BEGIN
+           DELETE FROM capture_changes WHERE seq <= NEW.seq - {max(TILE_CHANGES_KEEP, 1)};
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_change_insert AFTER INSERT ON user_captures
+       WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+       BEGIN
+           INSERT INTO capture_changes (latitude, longitude) VALUES (NEW.latitude, NEW.longitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_change_update
+       AFTER UPDATE OF latitude, longitude, created_at, ordnance_type, needs_specialist, confidence ON user_captures
+       WHEN OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+         OR OLD.created_at IS NOT NEW.created_at OR OLD.ordnance_type IS NOT NEW.ordnance_type
+         OR OLD.needs_specialist IS NOT NEW.needs_specialist OR OLD.confidence IS NOT NEW.confidence
+       BEGIN
+           INSERT INTO capture_changes (latitude, longitude)
+           SELECT OLD.latitude, OLD.longitude WHERE OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL
+           AND (OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude);
+           INSERT INTO capture_changes (latitude, longitude)
+           SELECT NEW.latitude, NEW.longitude WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_captures_change_delete AFTER DELETE ON user_captures
+       WHEN OLD.latitude IS NOT NULL AND OLD.longitude IS NOT NULL
+       BEGIN
+           INSERT INTO capture_changes (latitude, longitude) VALUES (OLD.latitude, OLD.longitude);
+       END""",
+]
+
+ROLLUP_UNCLASSIFIED = "unclassified"
+
+def _rollup_key(row: str, precision: int, bucket_seconds: int) -> str:
+    """SQL for the capture_rollups key of a user_captures row (NEW, OLD or a table name) at one level."""
+    lat_bits = 5 * precision // 2  # geohash alternates bits starting with longitude
+    lon_bits = 5 * precision - lat_bits
+    return (
+        f"{precision}, {bucket_seconds}, "
+        f"CAST(strftime('%s', {row}.created_at) AS INTEGER) / {bucket_seconds} * {bucket_seconds}, "
+        f"MAX(0, MIN(CAST(({row}.latitude + 90.0) * {1 << lat_bits} / 180.0 AS INTEGER), {(1 << lat_bits) - 1})), "
+        f"MAX(0, MIN(CAST(({row}.longitude + 180.0) * {1 << lon_bits} / 360.0 AS INTEGER), {(1 << lon_bits) - 1})), "
+        f"COALESCE({row}.ordnance_type, '{ROLLUP_UNCLASSIFIED}')"
+    )
+
+def _rolled_up(row: str) -> str:
+    return f"{row}.latitude IS NOT NULL AND {row}.longitude IS NOT NULL AND {row}.created_at IS NOT NULL"
+
+ROLLUP_KEY = "precision, bucket_seconds, bucket_start, lat_cell, lon_cell, ordnance_type"
+
+def _rollup_add(row: str, level) -> str:
+    return f"""INSERT INTO capture_rollups ({ROLLUP_KEY}, count)
+           SELECT {_rollup_key(row, *level)}, 1 WHERE {_rolled_up(row)}
+           ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET count = count + 1;"""
+
+def _rollup_remove(row: str, level) -> str:
+    match = f"{_rolled_up(row)} AND ({ROLLUP_KEY}) = ({_rollup_key(row, *level)})"
+    return f"""UPDATE capture_rollups SET count = count - 1 WHERE {match};
+           DELETE FROM capture_rollups WHERE count <= 0 AND {match};"""
+
+def rollup_backfill_sql(level, since: bool = False, if_empty: bool = False) -> str:
+    """
+    INSERT ... SELECT counting existing captures into one level: only those created at or
+    after :since with since, and only while the level has no rows with if_empty.
+    """
+    conditions = [_rolled_up("user_captures")]
+    if since:
+        conditions.append("user_captures.created_at >= :since")
+    if if_empty:
+        conditions.append(
+            f"NOT EXISTS (SELECT 1 FROM capture_rollups WHERE precision = {level[0]} AND bucket_seconds = {level[1]})"
+        )
+    return f"""INSERT INTO capture_rollups ({ROLLUP_KEY}, count)
+       SELECT {_rollup_key("user_captures", *level)}, COUNT(*) FROM user_captures
+       WHERE {" AND ".join(conditions)} GROUP BY 3, 4, 5, 6"""
+
+def rollup_ddl(levels) -> List[str]:
+    """
+    Triggers keeping capture_rollups at the given levels, replacing those of earlier starts
+    so they follow ROLLUP_LEVELS; rows of levels no longer configured are dropped and a
+    new level is filled from the existing captures.
+    """
+    levels = list(dict.fromkeys(levels))
+    statements = [
+        "DROP TRIGGER IF EXISTS user_captures_rollup_insert",
+        "DROP TRIGGER IF EXISTS user_captures_rollup_update",
+        "DROP TRIGGER IF EXISTS user_captures_rollup_delete",
+    ]
+    if not levels:
+        return statements + ["DELETE FROM capture_rollups"]
+    changed = " OR ".join(
+        f"OLD.{column} IS NOT NEW.{column}" for column in ("latitude", "longitude", "created_at", "ordnance_type")
+    )
+    return statements + [
+        f"""DELETE FROM capture_rollups WHERE (precision, bucket_seconds) NOT IN
+           (VALUES {", ".join(f"({precision}, {bucket_seconds})" for precision, bucket_seconds in levels)})""",
+        f"""CREATE TRIGGER user_captures_rollup_insert AFTER INSERT ON user_captures
+       WHEN {_rolled_up("NEW")}
+       BEGIN
+           {" ".join(_rollup_add("NEW", level) for level in levels)}
+       END""",
+        f"""CREATE TRIGGER user_captures_rollup_update
+       AFTER UPDATE OF latitude, longitude, created_at, ordnance_type ON user_captures
+       WHEN {changed}
+       BEGIN
+           {" ".join(_rollup_remove("OLD", level) + " " + _rollup_add("NEW", level) for level in levels)}
+       END""",
+        f"""CREATE TRIGGER user_captures_rollup_delete AFTER DELETE ON user_captures
+       WHEN {_rolled_up("OLD")} AND {NOT_ARCHIVING}
+       BEGIN
+           {" ".join(_rollup_remove("OLD", level) for level in levels)}
+       END""",
+    ] + [rollup_backfill_sql(level, if_empty=True) for level in levels]  # captures written before a level existed
+
+def autoincrement_user_captures():
+    """
+    Rebuild a user_captures table created without AUTOINCREMENT, which hands out the id of
+    a deleted newest row again, and start its sequence past every archived id. Indexes and
+    triggers go with the old table; ensure_schema creates them again right after.
+    """
+    with engine.begin() as conn:
+        sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'user_captures'"))
+        if "AUTOINCREMENT" in sql.upper():
+            return
+        rebuilt = UserCapture.__table__.to_metadata(MetaData(), name="user_captures_rebuild")
+        columns = ", ".join(f'"{column.name}"' for column in rebuilt.columns)
+        conn.execute(text("DROP TABLE IF EXISTS user_captures_rebuild"))
+        conn.execute(CreateTable(rebuilt))
+        conn.execute(text(f"INSERT INTO user_captures_rebuild ({columns}) SELECT {columns} FROM user_captures"))
+        conn.execute(text("DROP TABLE user_captures"))
+        conn.execute(text("ALTER TABLE user_captures_rebuild RENAME TO user_captures"))
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'user_captures'"))
+        conn.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'user_captures', MAX("
+            "(SELECT COALESCE(MAX(id), 0) FROM user_captures), (SELECT COALESCE(MAX(max_id), 0) FROM capture_archives))"
+        ))
+    logger.info("Rebuilt user_captures with AUTOINCREMENT ids")
+
+def ensure_schema():
+    """
+    Create missing tables, then add columns and indexes that were introduced
+    after a table was first created (create_all never alters existing tables).
+    """
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    col_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+                    logger.info(f"Added column {table.name}.{column.name}")
+    autoincrement_user_captures()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        for statement in SPATIAL_INDEX_DDL + INCIDENT_DDL + TILE_CHANGES_DDL + rollup_ddl(ROLLUP_LEVELS):
+            conn.execute(text(statement))
+
+ensure_schema()
 
 def get_db():
     db = SessionLocal()
@@ -38,7 +471,24 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def fetch_all(db: AsyncSession, stmt) -> list:
+    """Rows of a select(): mapped objects for select(UserCapture), plain rows for column selects."""
+    result = await db.execute(stmt)
+    descriptions = stmt.column_descriptions
+    if len(descriptions) == 1 and isinstance(descriptions[0]["type"], type):
+        return list(result.scalars().all())
+    return list(result.all())
+
 async def startup_event():
+    # Open the first async connection before any request can: SQLAlchemy runs its first-connect
+    # hooks under a thread lock, which concurrent checkouts on the event loop would deadlock on
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
     db = SessionLocal()
     try:
         # Handle UserCapture mock data insertion
@@ -62,17 +512,13 @@ async def startup_event():
                     logger.error(f"Failed to load mock data JSON: {str(e)}. Skipping mock data insertion.")
                     mock_data = []
 
-                for data in mock_data:
-                    # Check for duplicates before adding (based on user_id)
-                    if db.query(UserCapture).filter(UserCapture.user_id == data["user_id"]).first():
-                        logger.info(f"Skipping existing user capture for {data['user_id']}.")
-                        continue
-                    
-                    # No need to parse created_at as it's auto-generated
-                    user_capture = UserCapture(**data)
-                    db.add(user_capture)
-                db.commit()
-                logger.info("Mock data inserted successfully.")
+                # Same set-based dedupe and batched insert as POST /v1/user-captures/bulk
+                from ingest import ingest_captures  # ingest imports this module
+                results = ingest_captures(db, mock_data)
+                skipped = [r for r in results if r["status"] != "created"]
+                for result in skipped:
+                    logger.info(f"Skipping {result['status']} user capture {result['user_id']}: {result.get('detail', '')}")
+                logger.info(f"Mock data inserted successfully ({len(results) - len(skipped)} captures).")
         else:
             logger.info("UserCapture table already populated. Skipping mock data insertion.")
     finally:
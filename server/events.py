@@ -0,0 +1,176 @@
+# File: events.py
+import asyncio
+import itertools
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, NamedTuple, Optional, Tuple
+
+from config import EVENTS_QUEUE_SIZE, EVENTS_MAX_SUBSCRIBERS, EVENTS_HEARTBEAT_S
+from geo import in_bbox
+from schemas import UserCaptureSummary
+from utils import sse_event
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_CREATED = "created"
+CAPTURE_UPDATED = "updated"
+CAPTURE_DELETED = "deleted"
+
+
+class SubscriberLimitError(Exception):
+    """Raised when EVENTS_MAX_SUBSCRIBERS consoles are already subscribed."""
+
+
+class CaptureEvent(NamedTuple):
+    latitude: Optional[float]
+    longitude: Optional[float]
+    created_at: Optional[datetime]
+    message: str  # framed once as a Server-Sent Event and shared by every subscriber
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_at is stored as naive UTC; bring aware query times onto the same footing."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class Subscription:
+    """One console's filters and its bounded queue of pending events."""
+
+    __slots__ = ("queue", "bbox", "start_time", "end_time", "dropped", "reported")
+
+    def __init__(self, queue_size: int, bbox: Optional[Tuple[float, float, float, float]],
+                 start_time: Optional[datetime], end_time: Optional[datetime]):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.bbox = bbox
+        self.start_time = _naive_utc(start_time)
+        self.end_time = _naive_utc(end_time)
+        self.dropped = 0  # events discarded because the queue was full
+        self.reported = 0  # drops already announced to the console with a "gap" event
+
+    def matches(self, event: CaptureEvent) -> bool:
+        if self.bbox is not None:
+            if event.latitude is None or event.longitude is None or not in_bbox(event.latitude, event.longitude, *self.bbox):
+                return False
+        if self.start_time is not None and (event.created_at is None or event.created_at < self.start_time):
+            return False
+        if self.end_time is not None and (event.created_at is None or event.created_at > self.end_time):
+            return False
+        return True
+
+
+class CaptureEventBroker:
+    """
+    In-process fan-out of capture create/update/delete events to subscribed consoles.
+
+    Each event is serialized once and offered to every subscription whose bounding
+    box and time range match. Publishing never blocks a write path: a console that
+    falls EVENTS_QUEUE_SIZE events behind has further events dropped, and once it
+    has caught up it receives a "gap" event telling it to backfill over REST.
+    Subscribers only see events published by the process they are connected to.
+    """
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS):
+        self.queue_size = max(1, queue_size)
+        self.max_subscribers = max_subscribers
+        self._subscriptions = set()
+        self._ids = itertools.count(1)
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    @property
+    def active(self) -> bool:
+        """Whether anyone is subscribed; lets publishers skip loading rows nobody will see."""
+        return bool(self._subscriptions)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscriptions)
+
+    def check_capacity(self):
+        if self.subscribers >= self.max_subscribers:
+            raise SubscriberLimitError(f"Too many event subscribers (max {self.max_subscribers})")
+
+    def subscribe(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> Subscription:
+        self.check_capacity()
+        subscription = Subscription(self.queue_size, bbox, start_time, end_time)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
+
+    def publish(self, kind: str, capture):
+        """Offer a capture event to matching subscribers; capture is a UserCapture or a summary row."""
+        if not self.active:
+            return
+        summary = UserCaptureSummary.model_validate(capture, from_attributes=True)
+        data = summary.model_dump(mode="json", by_alias=True, exclude={"thumbnail"})
+        self._offer(CaptureEvent(
+            summary.latitude, summary.longitude, summary.createdAt,
+            sse_event(data, event=kind, id=next(self._ids)),
+        ))
+
+    def publish_resync(self, reason: str, count: int):
+        """Tell every subscriber to backfill over REST instead of sending count individual events."""
+        if not self.active:
+            return
+        message = sse_event({"reason": reason, "count": count}, event="resync", id=next(self._ids))
+        self._offer(CaptureEvent(None, None, None, message), everyone=True)
+
+    def _offer(self, event: CaptureEvent, everyone: bool = False):
+        self.stats["published"] += 1
+        for subscription in self._subscriptions:
+            if not everyone and not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event.message)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                subscription.dropped += 1
+                self.stats["dropped"] += 1
+
+    async def stream(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        heartbeat: float = EVENTS_HEARTBEAT_S,
+    ) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for a new subscription, with comment heartbeats while idle.
+        It is registered when iteration starts and removed when the stream is closed.
+        """
+        subscription = self.subscribe(bbox, start_time, end_time)
+        try:
+            yield sse_event({"subscribed": True}, event="ready")
+            while True:
+                if subscription.queue.empty() and subscription.dropped > subscription.reported:
+                    yield sse_event({"dropped": subscription.dropped - subscription.reported}, event="gap")
+                    subscription.reported = subscription.dropped
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def snapshot(self) -> dict:
+        depths = [subscription.queue.qsize() for subscription in self._subscriptions]
+        return {
+            "subscribers": self.subscribers,
+            "max_subscribers": self.max_subscribers,
+            "queue_size": self.queue_size,
+            "max_queue_depth": max(depths, default=0),
+            "lagging": sum(subscription.dropped > subscription.reported for subscription in self._subscriptions),
+            **self.stats,
+        }
+
+
+# Shared broker for capture events
+capture_events = CaptureEventBroker()
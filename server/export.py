@@ -0,0 +1,194 @@
+# File: export.py
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from config import EXPORT_BATCH_SIZE, EXPORT_CHUNK_BYTES
+from database import UserCapture, engine
+from geo import captures_in_bbox_select
+from image_store import DATA_URL_RE, image_store
+from metrics import EXPORT_ROWS
+
+try:
+    import zstandard
+except ImportError:  # optional: only zstd exports need it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# name -> (media type of the compressed file, file suffix)
+COMPRESSIONS = {"none": (None, ""), "gzip": ("application/gzip", ".gz"), "zstd": ("application/zstd", ".zst")}
+IMAGE_MODES = ("reference", "inline", "none")
+
+# Exported fields, named like the bulk ingest input so an inline NDJSON export loads back through it
+FIELDS = (
+    "id", "user_id", "query_text", "image", "image_sha256", "image_size", "image_mime", "latitude", "longitude",
+    "ai_response", "inference_status", "created_at", "ordnance_type", "ordnance_subtype", "country_of_origin",
+    "production_period", "warcrime_assessment", "needs_specialist", "confidence", "short_advice", "incident_id",
+)
+EXPORT_COLUMNS = tuple(getattr(UserCapture, name) for name in FIELDS if name != "image") + (
+    UserCapture.image_legacy.label("image_legacy"),  # the column itself is named image
+)
+
+
+class _Uncompressed:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def compressor(name: str):
+    """A streaming compressor (compress() / flush()) for one of COMPRESSIONS."""
+    if name == "none":
+        return _Uncompressed()
+    if name == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    if name == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f"Unknown compression: {name}")
+
+
+def export_filename(fmt: str, compression: str) -> str:
+    return f"captures.{fmt}{COMPRESSIONS[compression][1]}"
+
+
+def export_select(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    ordnance_types: Optional[List[str]] = None,
+):
+    """
+    Select of the exported columns for the whole table or a time / area subset, in id order
+    ((created_at, id) order for a time range, read off its index). A bbox goes through the R*Tree
+    and may wrap across the antimeridian like the bbox endpoint.
+    """
+    if bbox:
+        stmt = captures_in_bbox_select(*bbox, start_time, end_time, columns=EXPORT_COLUMNS)
+    else:
+        stmt = select(*EXPORT_COLUMNS)
+        if start_time is not None:
+            stmt = stmt.where(UserCapture.created_at >= start_time)
+        if end_time is not None:
+            stmt = stmt.where(UserCapture.created_at <= end_time)
+    if ordnance_types:
+        stmt = stmt.where(UserCapture.ordnance_type.in_(ordnance_types))
+    if start_time is not None or end_time is not None:
+        return stmt.order_by(UserCapture.created_at, UserCapture.id)
+    return stmt.order_by(UserCapture.id)
+
+
+def _image(row, images: str) -> Optional[str]:
+    if images == "none":
+        return None
+    if row.image_sha256:
+        if images == "reference":
+            return f"/v1/images/{row.image_sha256}"
+        try:
+            return image_store.data_url(row.image_sha256, row.image_mime)
+        except FileNotFoundError:
+            logger.warning(f"Image {row.image_sha256} of capture {row.id} is missing from the store")
+            return None
+    legacy = row.image_legacy
+    # Inline data URLs not yet moved to the image store (migrate_images.py) have nothing to reference
+    if images == "reference" and legacy and DATA_URL_RE.match(legacy):
+        return None
+    return legacy or None
+
+
+def _values(row, images: str) -> list:
+    values = []
+    for name in FIELDS:
+        value = _image(row, images) if name == "image" else getattr(row, name)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    return values
+
+
+def _ndjson_encoder():
+    def encode(row, images: str) -> bytes:
+        return (json.dumps(dict(zip(FIELDS, _values(row, images))), separators=(",", ":")) + "\n").encode("utf-8")
+    return None, encode
+
+
+def _csv_encoder():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def line(values) -> bytes:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue().encode("utf-8")
+
+    def encode(row, images: str) -> bytes:
+        return line(
+            "" if value is None else ("true" if value else "false") if isinstance(value, bool) else value
+            for value in _values(row, images)
+        )
+    return line(FIELDS), encode
+
+
+def export_stream(
+    stmt,
+    fmt: str = "ndjson",
+    compression: str = "none",
+    images: str = "reference",
+    chunk_bytes: int = EXPORT_CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """
+    Stream the rows of stmt (see export_select) as NDJSON or CSV, compressed on the fly.
+
+    Rows come from one server-side cursor, EXPORT_BATCH_SIZE at a time, and are encoded
+    and compressed one by one; at most about chunk_bytes of output is held, so memory stays
+    flat however many rows are exported. The export reads one snapshot of the table. A
+    blocking iterator: StreamingResponse runs it in the threadpool. Arguments are checked
+    here, before the first chunk is asked for.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if images not in IMAGE_MODES:
+        raise ValueError(f"Unknown image mode: {images}")
+    packer = compressor(compression)
+    header, encode = _csv_encoder() if fmt == "csv" else _ndjson_encoder()
+
+    def chunks() -> Iterator[bytes]:
+        count = 0
+        try:
+            pending, size = [header] if header else [], len(header or b"")
+            with engine.connect() as conn:
+                result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(stmt)
+                for row in result:
+                    line = encode(row, images)
+                    pending.append(line)
+                    size += len(line)
+                    count += 1
+                    if size >= chunk_bytes:
+                        out = packer.compress(b"".join(pending))
+                        pending, size = [], 0
+                        if out:
+                            yield out
+            out = packer.compress(b"".join(pending)) + packer.flush()
+            if out:
+                yield out
+            logger.info(f"Exported {count} user captures as {fmt} ({compression}, images {images}).")
+        except GeneratorExit:
+            logger.info(f"Export stopped by the client after {count} user captures.")
+            raise
+        except Exception as e:
+            logger.error(f"Error exporting user captures after {count} rows: {str(e)}")
+            raise
+        finally:
+            EXPORT_ROWS.inc((fmt,), count)
+
+    return chunks()
@@ -0,0 +1,70 @@
+# File: export_captures.py
+"""
+Export user captures to an NDJSON or CSV file, as /v1/user-captures/export/ does, without
+going through the API.
+
+The format and compression default to what the output name ends in (.csv, .gz, .zst);
+"-" writes to stdout. Rows are streamed from a server-side cursor, so memory use stays
+flat however large the table is.
+
+Usage (from the server directory):
+    python export_captures.py captures.ndjson.gz [--images inline] [--start-time 2025-11-01T00:00:00]
+        [--end-time ...] [--bbox 47.0,30.0,50.0,36.0] [--ordnance-type mine_anti_tank ...]
+"""
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+
+from export import COMPRESSIONS, FORMATS, IMAGE_MODES, export_select, export_stream
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def bbox(value: str) -> tuple:
+    parts = tuple(float(v) for v in value.split(","))
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("expected min_lat,min_lon,max_lat,max_lon")
+    return parts
+
+
+def guess(output: str) -> tuple:
+    """(format, compression) suggested by an output file name."""
+    name = output.lower()
+    compression = next((c for c, (_, suffix) in COMPRESSIONS.items() if suffix and name.endswith(suffix)), "none")
+    name = name[:len(name) - len(COMPRESSIONS[compression][1])]
+    return ("csv" if name.endswith(".csv") else "ndjson"), compression
+
+
+def export(args) -> int:
+    fmt, compression = guess(args.output)
+    stmt = export_select(args.start_time, args.end_time, args.bbox, args.ordnance_type)
+    chunks = export_stream(stmt, args.format or fmt, args.compression or compression, args.images)
+    written = 0
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export user captures to NDJSON or CSV.")
+    parser.add_argument("output", help='output file, or "-" for stdout')
+    parser.add_argument("--format", choices=list(FORMATS), help="default: from the output name, else ndjson")
+    parser.add_argument("--compression", choices=list(COMPRESSIONS), help="default: from the output name, else none")
+    parser.add_argument("--images", choices=IMAGE_MODES, default="reference")
+    parser.add_argument("--start-time", type=datetime.fromisoformat)
+    parser.add_argument("--end-time", type=datetime.fromisoformat)
+    parser.add_argument("--bbox", type=bbox, help="min_lat,min_lon,max_lat,max_lon")
+    parser.add_argument("--ordnance-type", nargs="+")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    written = export(args)
+    logger.info(f"Wrote {written} bytes to {args.output} in {time.perf_counter() - start:.1f}s")
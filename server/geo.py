@@ -0,0 +1,195 @@
+# File: geo.py
+import math
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import UserCapture, capture_rtree
+
+EARTH_RADIUS_M = 6371008.8
+MAX_SEARCH_RADIUS_M = math.pi * EARTH_RADIUS_M  # half the circumference covers the whole globe
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_for_radius(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle; min_lon > max_lon when it crosses the antimeridian."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * math.cos(math.radians(lat))))
+    if dlon >= 180:
+        return min_lat, -180.0, max_lat, 180.0
+    min_lon = (lon - dlon + 540) % 360 - 180
+    max_lon = (lon + dlon + 540) % 360 - 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_bits(precision: int) -> Tuple[int, int]:
+    """(latitude bits, longitude bits) of a geohash of precision characters; longitude takes the odd bit."""
+    lat_bits = 5 * precision // 2
+    return lat_bits, 5 * precision - lat_bits
+
+
+def geohash_cell(lat: float, lon: float, precision: int) -> Tuple[int, int]:
+    """(lat_cell, lon_cell) bit indices of the geohash containing a point, as stored in capture_rollups."""
+    lat_bits, lon_bits = geohash_bits(precision)
+    lat_cell = int((lat + 90.0) * (1 << lat_bits) / 180.0)
+    lon_cell = int((lon + 180.0) * (1 << lon_bits) / 360.0)
+    return max(0, min(lat_cell, (1 << lat_bits) - 1)), max(0, min(lon_cell, (1 << lon_bits) - 1))
+
+
+def _spread(value: int) -> int:
+    """The bits of a 32-bit value moved to the even positions of a 64-bit one."""
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+
+def geohash_encode(lat_cell: int, lon_cell: int, precision: int) -> str:
+    """The geohash string of a cell given by its bit indices (precision up to 12)."""
+    if precision % 2:  # odd bit count: longitude has the first and the last bit
+        value = _spread(lon_cell) | (_spread(lat_cell) << 1)
+    else:
+        value = (_spread(lon_cell) << 1) | _spread(lat_cell)
+    return "".join(GEOHASH_ALPHABET[(value >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+
+def geohash_center(lat_cell: int, lon_cell: int, precision: int) -> Tuple[float, float]:
+    lat_bits, lon_bits = geohash_bits(precision)
+    return (lat_cell + 0.5) * 180.0 / (1 << lat_bits) - 90.0, (lon_cell + 0.5) * 360.0 / (1 << lon_bits) - 180.0
+
+
+MAX_MERCATOR_LAT = 85.0511287798066  # web-mercator tiles are square between these latitudes
+
+
+def mercator(lat: float, lon: float) -> Tuple[float, float]:
+    """Web-mercator position of a point as fractions (0..1) of the world, x east and y south."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    siny = math.sin(math.radians(lat))
+    return (lon + 180.0) / 360.0, 0.5 - math.log((1 + siny) / (1 - siny)) / (4 * math.pi)
+
+
+def tile_for_point(lat: float, lon: float, z: int) -> Tuple[int, int]:
+    """(x, y) of the zoom z tile containing a point; points beyond the mercator range go to the edge rows."""
+    n = 1 << z
+    fx, fy = mercator(lat, lon)
+    return min(int(fx * n), n - 1), min(int(fy * n), n - 1)
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, min_lon, max_lat, max_lon) of tile z/x/y. The top and bottom rows reach the
+    poles so captures beyond the mercator range still show (at the tile edge).
+    """
+    n = 1 << z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    max_lat = 90.0 if y == 0 else lat(y)
+    min_lat = -90.0 if y == n - 1 else lat(y + 1)
+    return min_lat, x / n * 360.0 - 180.0, max_lat, (x + 1) / n * 360.0 - 180.0
+
+
+def _bbox_condition(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """R*Tree overlap condition; a box with min_lon > max_lon wraps across the antimeridian."""
+    lat_cond = and_(capture_rtree.c.max_lat >= min_lat, capture_rtree.c.min_lat <= max_lat)
+    if min_lon <= max_lon:
+        lon_cond = and_(capture_rtree.c.max_lon >= min_lon, capture_rtree.c.min_lon <= max_lon)
+    else:
+        lon_cond = or_(capture_rtree.c.max_lon >= min_lon, capture_rtree.c.min_lon <= max_lon)
+    return and_(lat_cond, lon_cond)
+
+
+def in_bbox(lat: float, lon: float, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> bool:
+    """Point-in-box test with the same antimeridian wrap as _bbox_condition."""
+    if not min_lat <= lat <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= lon <= max_lon
+    return lon >= min_lon or lon <= max_lon
+
+
+def _time_conditions(start_time: Optional[datetime], end_time: Optional[datetime]) -> list:
+    conditions = []
+    if start_time is not None:
+        conditions.append(UserCapture.created_at >= start_time)
+    if end_time is not None:
+        conditions.append(UserCapture.created_at <= end_time)
+    return conditions
+
+
+def captures_in_bbox_select(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    columns: Optional[tuple] = None,
+):
+    """
+    Select of captures inside a bounding box (and optional time range), driven by the R*Tree.
+    Pass columns to select only those instead of full UserCapture rows.
+    """
+    return (
+        (select(*columns) if columns else select(UserCapture))
+        .join(capture_rtree, capture_rtree.c.id == UserCapture.id)
+        .where(_bbox_condition(min_lat, min_lon, max_lat, max_lon), *_time_conditions(start_time, end_time))
+    )
+
+
+async def nearest_captures(
+    db: AsyncSession,
+    lat: float,
+    lon: float,
+    limit: int,
+    radius_m: Optional[float] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    initial_radius_m: float = 1000.0,
+) -> List[Tuple[UserCapture, float]]:
+    """
+    Up to `limit` captures nearest to (lat, lon), as (capture, distance_m) sorted by distance.
+    Without radius_m the search box starts at initial_radius_m and grows until enough
+    captures fall inside the circle. Only ids and coordinates are read until the
+    final rows are known.
+    """
+    search_radius = min(radius_m, initial_radius_m) if radius_m else initial_radius_m
+    while True:
+        candidates = (await db.execute(
+            select(UserCapture.id, UserCapture.latitude, UserCapture.longitude)
+            .join(capture_rtree, capture_rtree.c.id == UserCapture.id)
+            .where(_bbox_condition(*bbox_for_radius(lat, lon, search_radius)), *_time_conditions(start_time, end_time))
+        )).all()
+        within = sorted(
+            (d, capture_id)
+            for capture_id, c_lat, c_lon in candidates
+            if (d := haversine_m(lat, lon, c_lat, c_lon)) <= search_radius
+        )
+        limit_radius = radius_m or MAX_SEARCH_RADIUS_M
+        if len(within) >= limit or search_radius >= limit_radius:
+            break
+        search_radius = min(search_radius * 4, limit_radius)
+
+    within = within[:limit]
+    result = await db.execute(select(UserCapture).where(UserCapture.id.in_([i for _, i in within])))
+    rows = {c.id: c for c in result.scalars()}
+    return [(rows[capture_id], d) for d, capture_id in within if capture_id in rows]
@@ -0,0 +1,151 @@
+# File: image_processing.py
+import asyncio
+import base64
+import io
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, NamedTuple, Optional, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import (
+    IMAGE_PREPROCESS, IMAGE_MAX_SIDE, IMAGE_JPEG_QUALITY, IMAGE_MAX_PIXELS, IMAGE_PREPROCESS_WORKERS, THUMBNAIL_SIZE
+)
+from image_store import image_store
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads scale across cores
+_executor = ThreadPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess")
+
+# Image.open checks the declared size against this, before any pixel is decoded; above it (rather
+# than only above twice it, Pillow's default) a small file claiming huge dimensions is an error
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+warnings.simplefilter("error", Image.DecompressionBombWarning)
+_DECODE_ERRORS = (UnidentifiedImageError, OSError, Image.DecompressionBombError, Image.DecompressionBombWarning)
+
+
+class ImageDecodeError(ValueError):
+    """The data is not an image Pillow can decode."""
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime: str
+
+
+def preprocess_signature() -> str:
+    """Identifies the current pipeline settings, so cached responses are not shared across them."""
+    if not IMAGE_PREPROCESS:
+        return "raw"
+    return f"jpeg-{IMAGE_MAX_SIDE}-q{IMAGE_JPEG_QUALITY}"
+
+
+def normalize_image(
+    data: Union[bytes, BinaryIO], max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_JPEG_QUALITY
+) -> PreparedImage:
+    """
+    Decode, apply EXIF orientation, fit within max_side x max_side and re-encode
+    as a baseline JPEG. Metadata (EXIF, GPS, ICC, comments) is not carried over.
+    data may be a seekable file, which Pillow then reads incrementally.
+    Raises ImageDecodeError if the data is not a decodable image or has more than IMAGE_MAX_PIXELS pixels.
+    """
+    try:
+        if hasattr(data, "read"):
+            data.seek(0)
+            img = Image.open(data)
+        else:
+            img = Image.open(io.BytesIO(data))
+        # For JPEGs this decodes at a reduced DCT scale, which is much cheaper than a full decode
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel("A"))
+                img = background
+            else:
+                img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    except _DECODE_ERRORS as e:
+        raise ImageDecodeError(f"Could not decode image: {e}") from e
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return PreparedImage(out.getvalue(), "image/jpeg")
+
+
+def perceptual_hash(data: Union[bytes, BinaryIO]) -> int:
+    """
+    64-bit difference hash (dHash): the image, upright and in grayscale, shrunk to 9x8 and
+    each pixel compared with its right neighbour. Re-encoded, rescaled or slightly
+    reframed copies of a photo differ in a few bits. Returned as a signed 64-bit integer,
+    the range SQLite can store. Raises ImageDecodeError as normalize_image does.
+    """
+    try:
+        if hasattr(data, "read"):
+            data.seek(0)
+            img = Image.open(data)
+        else:
+            img = Image.open(io.BytesIO(data))
+        img.draft("L", (64, 64))
+        img = ImageOps.exif_transpose(img).convert("L").resize((9, 8), Image.LANCZOS)
+    except _DECODE_ERRORS as e:
+        raise ImageDecodeError(f"Could not decode image: {e}") from e
+    finally:
+        if hasattr(data, "seek"):
+            data.seek(0)
+    pixels = img.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits - (1 << 64) if bits >= 1 << 63 else bits
+
+
+def hash_distance(a: int, b: int) -> int:
+    """Number of differing bits between two perceptual hashes."""
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+async def image_phash(data: Union[bytes, BinaryIO]) -> Optional[int]:
+    """perceptual_hash off the event loop; None for data that is not a decodable image."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, perceptual_hash, data)
+    except ImageDecodeError:
+        return None
+
+
+def _read_all(f: BinaryIO) -> bytes:
+    f.seek(0)
+    try:
+        return f.read()
+    finally:
+        f.seek(0)
+
+
+async def prepare_image(data: Union[bytes, BinaryIO], mime: str) -> PreparedImage:
+    """Normalize an uploaded image off the event loop, or pass it through if preprocessing is disabled."""
+    loop = asyncio.get_running_loop()
+    if not IMAGE_PREPROCESS:
+        if hasattr(data, "read"):
+            data = await loop.run_in_executor(_executor, _read_all, data)
+        return PreparedImage(data, mime)
+    return await loop.run_in_executor(_executor, normalize_image, data)
+
+
+def thumbnail_data_url(sha256: str, size: int = THUMBNAIL_SIZE) -> Optional[str]:
+    """
+    Small JPEG data URL for a stored image. Thumbnails are generated on first use and
+    kept next to the blob, so later list requests only read a few KB from disk.
+    Returns None if the image is missing or cannot be decoded.
+    """
+    name = f"thumb{size}.jpg"
+    data = image_store.get_derived(sha256, name)
+    if data is None:
+        try:
+            data = normalize_image(image_store.read(sha256), max_side=size, quality=70).data
+        except (FileNotFoundError, ValueError):
+            return None
+        image_store.put_derived(sha256, name, data)
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode('ascii')}"
@@ -0,0 +1,178 @@
+# File: image_store.py
+import base64
+import binascii
+import hashlib
+import io
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Tuple, Union
+
+from config import IMAGE_STORE_DIR, UPLOAD_CHUNK_SIZE
+
+DATA_URL_RE = re.compile(r"^data:(?P<mime>[^;,]*)(?P<params>(;[^;,]*)*),", re.IGNORECASE)
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ImageStore:
+    """
+    Write-once blob store keyed by SHA-256.
+
+    Blobs live at <root>/<h[0:2]>/<h[2:4]>/<h>, so identical uploads share one
+    file and no directory grows past 65536 entries. Files are never rewritten
+    once they exist, and reads go through mmap so the page cache is shared
+    instead of copying each image into the process.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        # Where read() and data_url() look for blobs missing from root (archived images, see archive.py)
+        self.fallback: Optional[Callable[[str], Optional[bytes]]] = None
+
+    def path_for(self, sha256: str) -> Path:
+        if not SHA256_RE.match(sha256):
+            raise ValueError(f"Invalid SHA-256 digest: {sha256!r}")
+        return self.root / sha256[0:2] / sha256[2:4] / sha256
+
+    def exists(self, sha256: str) -> bool:
+        return self.path_for(sha256).exists()
+
+    def put(self, data: bytes, sha256: Optional[str] = None) -> str:
+        """
+        Store data and return its SHA-256 hex digest. Existing blobs are left untouched.
+        Pass sha256 when the caller has already hashed data.
+        """
+        digest = sha256 or hashlib.sha256(data).hexdigest()
+        self._write_once(self.path_for(digest), data)
+        return digest
+
+    def put_file(self, src: BinaryIO, sha256: str) -> str:
+        """Store the contents of a readable file, already hashed by the caller, copying it in chunks."""
+        self._write_once(self.path_for(sha256), src)
+        return sha256
+
+    def derived_path(self, sha256: str, name: str) -> Path:
+        """Location of a file derived from a blob (e.g. a thumbnail), kept under <root>/derived."""
+        source = self.path_for(sha256)
+        return self.root / "derived" / source.parent.relative_to(self.root) / f"{sha256}.{name}"
+
+    def get_derived(self, sha256: str, name: str) -> Optional[bytes]:
+        path = self.derived_path(sha256, name)
+        return path.read_bytes() if path.exists() else None
+
+    def put_derived(self, sha256: str, name: str, data: bytes):
+        self._write_once(self.derived_path(sha256, name), data)
+
+    def _write_once(self, path: Path, data: Union[bytes, BinaryIO]):
+        """Write bytes, or copy a file object from its start, unless path already exists."""
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if hasattr(data, "read"):
+                    data.seek(0)
+                    shutil.copyfileobj(data, f, UPLOAD_CHUNK_SIZE)
+                    data.seek(0)
+                else:
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o444)
+            try:
+                # link() never replaces an existing file, so concurrent writers of the same blob are safe
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+        finally:
+            os.unlink(tmp_path)
+
+    @contextmanager
+    def open(self, sha256: str):
+        """Yield a read-only buffer over the blob (an mmap, or b"" for empty blobs)."""
+        with open(self.path_for(sha256), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    def read(self, sha256: str) -> bytes:
+        try:
+            with self.open(sha256) as buf:
+                return bytes(buf)
+        except FileNotFoundError:
+            return self._read_fallback(sha256)
+
+    def data_url(self, sha256: str, mime: Optional[str]) -> str:
+        try:
+            with open(self.path_for(sha256), "rb") as f:
+                return encode_data_url(f, mime, os.fstat(f.fileno()).st_size)
+        except FileNotFoundError:
+            data = self._read_fallback(sha256)
+            return encode_data_url(io.BytesIO(data), mime, len(data))
+
+    def _read_fallback(self, sha256: str) -> bytes:
+        data = self.fallback(sha256) if self.fallback else None
+        if data is None:
+            raise FileNotFoundError(f"Image {sha256} is not in the image store")
+        return data
+
+
+def encode_data_url(src: BinaryIO, mime: Optional[str], size: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """
+    Base64 data URL of a file's contents. Chunks are encoded straight into one buffer
+    sized for the result, so the only full-size copy besides it is the returned str.
+    """
+    prefix = f"data:{mime or 'application/octet-stream'};base64,".encode("ascii")
+    out = bytearray(len(prefix) + 4 * ((size + 2) // 3))
+    out[:len(prefix)] = prefix
+    pos = len(prefix)
+    # Whole 3-byte groups encode without padding, so chunk outputs can be concatenated
+    chunk_size -= chunk_size % 3
+    src.seek(0)
+    while chunk := src.read(chunk_size):
+        encoded = binascii.b2a_base64(chunk, newline=False)
+        out[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+    src.seek(0)
+    if pos != len(out):
+        raise ValueError(f"Source is not {size} bytes long")
+    return out.decode("ascii")
+
+
+def parse_data_url(url: str) -> Optional[Tuple[str, bytes]]:
+    """Split a base64 data URL into (mime, bytes). Returns None if url is not a base64 data URL."""
+    match = DATA_URL_RE.match(url)
+    if not match or ";base64" not in match.group("params").lower():
+        return None
+    try:
+        data = base64.b64decode(url[match.end():], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return match.group("mime") or "application/octet-stream", data
+
+
+def image_columns(image: Optional[str]) -> dict:
+    """
+    Map an incoming image string onto UserCapture columns.
+    Data URLs go to the blob store; anything else (e.g. an HTTP URL) stays inline.
+    """
+    columns = {"image_legacy": None, "image_sha256": None, "image_size": None, "image_mime": None}
+    if not image:
+        return columns
+    parsed = parse_data_url(image)
+    if parsed is None:
+        columns["image_legacy"] = image
+        return columns
+    mime, data = parsed
+    columns.update(image_sha256=image_store.put(data), image_size=len(data), image_mime=mime)
+    return columns
+
+
+image_store = ImageStore(IMAGE_STORE_DIR)
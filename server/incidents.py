@@ -0,0 +1,160 @@
+# File: incidents.py
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from analysis import parse_analysis
+from archive import archived_incident_captures
+from config import (
+    LLM_MODEL, INCIDENT_RADIUS_M, INCIDENT_WINDOW_S, INCIDENT_MAX_DISTANCE,
+    INCIDENT_REUSE_MAX_DISTANCE, INCIDENT_REUSE_MIN_CONFIDENCE
+)
+from database import Incident, UserCapture
+from geo import bbox_for_radius, haversine_m, captures_in_bbox_select
+from image_processing import hash_distance, preprocess_signature
+from inference_cache import inference_cache, make_key
+from metrics import INCIDENT_LINKS
+
+logger = logging.getLogger(__name__)
+
+
+class IncidentMatch(NamedTuple):
+    """The earlier capture an upload duplicates."""
+    capture_id: int
+    incident_id: int
+    image_sha256: Optional[str]
+    distance: int  # differing hash bits
+    distance_m: float
+
+
+async def find_duplicate(
+    db: AsyncSession,
+    phash: int,
+    lat: float,
+    lon: float,
+    now: Optional[datetime] = None,
+    radius_m: float = INCIDENT_RADIUS_M,
+    window_s: float = INCIDENT_WINDOW_S,
+    max_distance: int = INCIDENT_MAX_DISTANCE,
+) -> Optional[IncidentMatch]:
+    """
+    The most similar capture uploaded within radius_m of (lat, lon) in the last window_s
+    seconds whose perceptual hash is at most max_distance bits from phash, if any.
+    The R*Tree and the created_at bound narrow the candidates to the few captures around
+    the spot, so their hashes are simply compared; no index over all hashes is needed.
+    """
+    now = now or datetime.utcnow()
+    columns = (
+        UserCapture.id, UserCapture.incident_id, UserCapture.image_sha256, UserCapture.phash,
+        UserCapture.latitude, UserCapture.longitude,
+    )
+    stmt = captures_in_bbox_select(
+        *bbox_for_radius(lat, lon, radius_m), start_time=now - timedelta(seconds=window_s), columns=columns
+    ).where(UserCapture.phash.isnot(None), UserCapture.incident_id.isnot(None))
+    candidates = (await db.execute(stmt)).all()
+    best = None
+    for capture_id, incident_id, image_sha256, other, c_lat, c_lon in candidates:
+        distance = hash_distance(phash, other)
+        if distance > max_distance:
+            continue
+        distance_m = haversine_m(lat, lon, c_lat, c_lon)
+        if distance_m > radius_m:
+            continue
+        if best is None or (distance, distance_m) < (best.distance, best.distance_m):
+            best = IncidentMatch(capture_id, incident_id, image_sha256, distance, distance_m)
+    return best
+
+
+async def reusable_answer(
+    match: Optional[IncidentMatch],
+    system_prompt: str,
+    text: str,
+    max_distance: int = INCIDENT_REUSE_MAX_DISTANCE,
+    min_confidence: float = INCIDENT_REUSE_MIN_CONFIDENCE,
+) -> Optional[str]:
+    """
+    The cached answer to the same question (model, prompt, text) about a near-identical
+    earlier photo, if the match is within max_distance bits and the answer is an analysis
+    with at least min_confidence; such an upload then needs no model call.
+    """
+    if match is None or match.distance > max_distance or not match.image_sha256:
+        return None
+    cache_key = make_key(LLM_MODEL, system_prompt, text, match.image_sha256, preprocess_signature())
+    answer = await run_in_threadpool(inference_cache.get, cache_key)
+    analysis = parse_analysis(answer)
+    if analysis is None or analysis.confidence is None or analysis.confidence < min_confidence:
+        return None
+    return answer
+
+
+async def link_capture(db: AsyncSession, capture: UserCapture, phash: int, match: Optional[IncidentMatch]):
+    """
+    Put a new (not yet flushed) capture into its duplicate's incident, or open an incident
+    for it. The capture_count and last_seen_at of the incident are kept by triggers.
+    """
+    capture.phash = phash
+    if match is not None:
+        capture.incident_id = match.incident_id
+        INCIDENT_LINKS.inc(("joined",))
+        return
+    now = datetime.utcnow()
+    incident = Incident(latitude=capture.latitude, longitude=capture.longitude, first_seen_at=now, last_seen_at=now)
+    db.add(incident)
+    await db.flush()
+    capture.incident_id = incident.id
+    INCIDENT_LINKS.inc(("opened",))
+
+
+def _representative(captures: list):
+    """The most confident answered capture of an incident, else its first."""
+    answered = [c for c in captures if c.confidence is not None]
+    if answered:
+        return max(answered, key=lambda c: c.confidence)
+    return captures[0] if captures else None
+
+
+async def incident_items(db: AsyncSession, incidents: List[Incident], columns: tuple, with_captures: bool = False) -> List[dict]:
+    """
+    Incidents as IncidentResponse dicts with their capture ids (or summaries, with_captures)
+    and representative capture, from one query for all of their captures. Incidents with
+    archived captures (archive.py) also read those back from the archive files.
+    """
+    by_incident: Dict[int, list] = {incident.id: [] for incident in incidents}
+    if by_incident:
+        rows = (await db.execute(
+            select(*columns, UserCapture.incident_id.label("linked_incident"))
+            .where(UserCapture.incident_id.in_(list(by_incident)))
+            .order_by(UserCapture.created_at, UserCapture.id)
+        )).all()
+        for row in rows:
+            by_incident[row.linked_incident].append(row)
+        # Archived captures still count in capture_count; read back those of incidents that have some
+        short = [incident for incident in incidents if len(by_incident[incident.id]) < incident.capture_count]
+        if short:
+            archived = await archived_incident_captures(db, short)
+            for incident_id, captures in archived.items():
+                if captures:
+                    by_incident[incident_id] = sorted(
+                        by_incident[incident_id] + captures, key=lambda c: (c.created_at, c.id)
+                    )
+    items = []
+    for incident in incidents:
+        captures = by_incident[incident.id]
+        item = {
+            "id": incident.id,
+            "latitude": incident.latitude,
+            "longitude": incident.longitude,
+            "first_seen_at": incident.first_seen_at,
+            "last_seen_at": incident.last_seen_at,
+            "capture_count": incident.capture_count,
+            "representative": _representative(captures),
+            "capture_ids": [c.id for c in captures],
+        }
+        if with_captures:
+            item["captures"] = captures
+        items.append(item)
+    return items
@@ -0,0 +1,153 @@
+# File: inference_cache.py
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from config import (
+    INFERENCE_CACHE_DB,
+    INFERENCE_CACHE_DB_ROWS,
+    INFERENCE_CACHE_PURGE_EVERY,
+    INFERENCE_CACHE_SIZE,
+    INFERENCE_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(model: str, system_prompt: str, text: str, image_sha256: str, variant: str = "") -> str:
+    """
+    Cache key for one vision query: (model, system prompt digest, user text, image digest).
+    variant distinguishes image preprocessing settings applied to the same upload.
+    """
+    prompt_digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    parts = "\x1f".join((model, prompt_digest, text, image_sha256, variant))
+    return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+
+class InferenceCache:
+    """
+    LRU + TTL cache of model responses with an optional SQLite tier.
+
+    The in-memory tier holds at most max_entries responses. When db_path is
+    set, every response is also written to a small SQLite file so repeated
+    uploads are still served from cache after a restart; disk hits are
+    promoted back into memory. Every purge_every writes the file drops expired
+    rows and, beyond max_db_rows, the rows expiring soonest.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        db_path: Optional[str] = None,
+        max_db_rows: int = INFERENCE_CACHE_DB_ROWS,
+        purge_every: int = INFERENCE_CACHE_PURGE_EVERY,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_db_rows = max_db_rows
+        self.purge_every = max(1, purge_every)
+        self._writes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expired": 0, "purged": 0}
+        self._db = None
+        if db_path and self.enabled:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS inference_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_inference_cache_expires_at ON inference_cache (expires_at)")
+            self._purge()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return response
+                del self._entries[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, expires_at FROM inference_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[0], row[1])
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                    return row[0]
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, response: str):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, expires_at),
+                )
+                self._writes += 1
+                if self._writes % self.purge_every == 0:
+                    self._purge()
+                else:
+                    self._db.commit()
+
+    def _purge(self):
+        """Delete expired rows of the SQLite tier, then the soonest-expiring ones beyond max_db_rows."""
+        purged = self._db.execute("DELETE FROM inference_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = self._db.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0] - self.max_db_rows
+        if excess > 0:
+            purged += self._db.execute(
+                "DELETE FROM inference_cache WHERE key IN "
+                "(SELECT key FROM inference_cache ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            ).rowcount
+        self._db.commit()
+        self.stats["purged"] += purged
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+inference_cache = InferenceCache(INFERENCE_CACHE_SIZE, INFERENCE_CACHE_TTL, INFERENCE_CACHE_DB)
@@ -0,0 +1,134 @@
+# File: ingest.py
+import json
+import logging
+from typing import AsyncIterator, Iterable, List, NamedTuple
+
+from pydantic import ValidationError
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+from database import UserCapture
+from image_store import image_columns
+from analysis import analysis_columns
+from schemas import UserCaptureCreate
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/json-lines")
+
+# Core inserts are keyed by column name, which differs from the attribute name for image_legacy
+_COLUMN_NAMES = {attr.key: attr.columns[0].name for attr in inspect(UserCapture).column_attrs}
+
+# json_each binds the whole id list as one parameter, so batches are not capped by SQLITE_MAX_VARIABLE_NUMBER
+_EXISTING_USER_IDS = text(
+    "SELECT user_id, id FROM user_captures WHERE user_id IN (SELECT value FROM json_each(:user_ids))"
+)
+
+
+class InvalidLine(NamedTuple):
+    """Placeholder for an NDJSON line that is not valid JSON, so it still gets a status."""
+    detail: str
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'item'}: {e['msg']}" for e in error.errors())
+
+
+def _user_ids(db: Session, user_ids: List[str]) -> dict:
+    """user_id -> id for the given user_ids that are already stored, in one indexed query."""
+    if not user_ids:
+        return {}
+    return dict(db.execute(_EXISTING_USER_IDS, {"user_ids": json.dumps(user_ids)}).all())
+
+
+def ingest_captures(db: Session, items: Iterable, start_index: int = 0) -> List[dict]:
+    """
+    Validate, dedupe and insert a batch of captures in a single transaction.
+    Items whose user_id is already stored (or repeated earlier in the batch) are skipped.
+    Returns one status dict per item, in order: index, user_id, status
+    (created | duplicate | invalid) and the new id or an error detail.
+    """
+    results = []
+    valid = []  # (result, UserCaptureCreate)
+    for index, item in enumerate(items, start_index):
+        if isinstance(item, InvalidLine):
+            results.append({"index": index, "user_id": None, "status": "invalid", "detail": item.detail})
+            continue
+        try:
+            capture = UserCaptureCreate.model_validate(item)
+        except ValidationError as e:
+            user_id = item.get("user_id") if isinstance(item, dict) else None
+            results.append({
+                "index": index, "user_id": user_id if isinstance(user_id, str) else None,
+                "status": "invalid", "detail": _validation_detail(e),
+            })
+            continue
+        result = {"index": index, "user_id": capture.user_id, "status": "created"}
+        results.append(result)
+        valid.append((result, capture))
+
+    existing = _user_ids(db, list({capture.user_id for _, capture in valid}))
+    rows, created, repeated, seen = [], [], [], set()
+    for result, capture in valid:
+        if capture.user_id in existing or capture.user_id in seen:
+            result["status"] = "duplicate"
+            result["id"] = existing.get(capture.user_id)
+            repeated.append(result)
+            continue
+        seen.add(capture.user_id)
+        capture_data = capture.model_dump()
+        capture_data.update(image_columns(capture_data.pop("image")))
+        capture_data.update(analysis_columns(capture_data["ai_response"]))
+        rows.append({_COLUMN_NAMES[key]: value for key, value in capture_data.items()})
+        created.append(result)
+
+    if rows:
+        try:
+            # One executemany for the whole batch (a Core insert skips per-row ORM bookkeeping);
+            # created_at defaults are filled in per row
+            db.execute(UserCapture.__table__.insert(), rows)
+            ids = _user_ids(db, [result["user_id"] for result in created])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        for result in created + repeated:
+            result["id"] = result.get("id") or ids.get(result["user_id"])
+    logger.info(f"Ingested {len(rows)} of {len(results)} user captures.")
+    return results
+
+
+def parse_ndjson_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return InvalidLine(f"Invalid JSON: {e}")
+
+
+async def ndjson_batches(chunks: AsyncIterator[bytes], batch_size: int):
+    """Group a streamed NDJSON body into lists of parsed items without buffering the whole body."""
+    buffer = b""
+    batch = []
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                batch.append(parse_ndjson_line(line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if buffer.strip():
+        batch.append(parse_ndjson_line(buffer))
+    if batch:
+        yield batch
+
+
+def ingest_summary(results: List[dict]) -> dict:
+    counts = {"created": 0, "duplicate": 0, "invalid": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    return {
+        "created": counts["created"], "duplicates": counts["duplicate"], "invalid": counts["invalid"],
+        "items": results,
+    }
@@ -0,0 +1,290 @@
+# File: jobs.py
+import asyncio
+import base64
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    INFERENCE_WORKERS, INFERENCE_JOB_MAX_ATTEMPTS, INFERENCE_JOB_BACKOFF_S, INFERENCE_JOB_BACKOFF_MAX_S,
+    INFERENCE_JOB_LEASE_S, INFERENCE_JOB_POLL_S, LLM_MODEL, IMAGE_PREPROCESS
+)
+from database import AsyncSessionLocal, InferenceJob, UserCapture
+from batching import vision_dispatcher
+from image_store import image_store, encode_data_url
+from image_processing import prepare_image
+from inference_cache import inference_cache
+from analysis import analysis_columns
+from events import capture_events, CAPTURE_UPDATED
+from utils import percentile, vision_messages
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Retrying cannot help: the capture is gone, or its image is missing or cannot be decoded
+_PERMANENT_ERRORS = (LookupError, FileNotFoundError, ValueError)
+
+
+def backoff_delay(attempts: int, base: float = INFERENCE_JOB_BACKOFF_S, cap: float = INFERENCE_JOB_BACKOFF_MAX_S) -> float:
+    """Seconds before the next attempt after `attempts` failures: exponential, capped, with jitter."""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class JobStats:
+    """Queue wait, service time and worker busy time, used to size the worker pool."""
+
+    def __init__(self, sample_size: int = 1024):
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.busy_s = 0.0
+        self.wait_ms = deque(maxlen=sample_size)
+        self.service_ms = deque(maxlen=sample_size)
+
+    def snapshot(self) -> dict:
+        def summary(samples):
+            values = list(samples)
+            return {
+                "count": len(values),
+                "p50": round(percentile(values, 0.50), 2),
+                "p95": round(percentile(values, 0.95), 2),
+                "max": round(max(values, default=0.0), 2),
+            }
+
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "wait_ms": summary(self.wait_ms),
+            "service_ms": summary(self.service_ms),
+        }
+
+
+class InferenceJobQueue:
+    """
+    Bounded pool of workers answering captures that were saved before inference.
+
+    Jobs live in the inference_jobs table, so they survive restarts. A worker
+    claims the oldest due job with a single UPDATE ... RETURNING, runs the vision
+    query through the shared dispatcher and writes the response into the capture.
+    Failed attempts are retried with exponential backoff up to max_attempts; jobs
+    left running longer than the lease (a crashed process) are claimed again.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        max_attempts: int = INFERENCE_JOB_MAX_ATTEMPTS,
+        lease: float = INFERENCE_JOB_LEASE_S,
+        poll_interval: float = INFERENCE_JOB_POLL_S,
+    ):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.stats = JobStats()
+        self.busy = 0
+        self._tasks = []
+        self._running = {}  # worker index -> claimed job id
+        self._wakeup: Optional[asyncio.Event] = None
+        self._started_at: Optional[float] = None
+
+    async def enqueue(self, db: AsyncSession, capture: UserCapture, system_prompt: str, cache_key: str) -> InferenceJob:
+        """Add a job for a new capture and commit both in one transaction."""
+        capture.inference_status = JOB_QUEUED
+        await db.flush()  # assigns capture.id
+        job = InferenceJob(capture_id=capture.id, system_prompt=system_prompt, cache_key=cache_key, status=JOB_QUEUED)
+        db.add(job)
+        await db.commit()
+        self.notify()
+        return job
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._started_at = time.perf_counter()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def _worker(self, index: int):
+        while True:
+            # Cleared before looking, so a job enqueued after the claim still wakes this worker
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Claiming an inference job failed: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[index] = job.id
+            self.busy += 1
+            started = time.perf_counter()
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Recording the outcome failed; the job stays running until its lease expires
+                logger.error(f"Inference job {job.id} could not be recorded: {str(e)}")
+            finally:
+                self.busy -= 1
+                self.stats.busy_s += time.perf_counter() - started
+                self._running.pop(index, None)
+
+    async def _claim(self) -> Optional[InferenceJob]:
+        now = datetime.utcnow()
+        due = or_(
+            and_(InferenceJob.status == JOB_QUEUED, InferenceJob.available_at <= now),
+            and_(InferenceJob.status == JOB_RUNNING, InferenceJob.started_at < now - timedelta(seconds=self.lease)),
+        )
+        next_id = (
+            select(InferenceJob.id).where(due)
+            .order_by(InferenceJob.available_at, InferenceJob.id).limit(1).scalar_subquery()
+        )
+        async with AsyncSessionLocal() as db:
+            job = await db.scalar(
+                update(InferenceJob)
+                .where(InferenceJob.id == next_id)
+                .values(status=JOB_RUNNING, attempts=InferenceJob.attempts + 1, started_at=now)
+                .returning(InferenceJob)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        if job is not None:
+            self.stats.wait_ms.append(max(0.0, (now - job.available_at).total_seconds() * 1000))
+        return job
+
+    async def _run(self, job: InferenceJob):
+        started = time.perf_counter()
+        try:
+            response = await self._infer(job)
+        except Exception as e:
+            await self._record_failure(job, e)
+            return
+        self.stats.service_ms.append((time.perf_counter() - started) * 1000)
+        if job.cache_key:
+            await run_in_threadpool(inference_cache.set, job.cache_key, response)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(UserCapture).where(UserCapture.id == job.capture_id)
+                .values(ai_response=response, inference_status=JOB_DONE, **analysis_columns(response))
+            )
+            await db.execute(
+                update(InferenceJob).where(InferenceJob.id == job.id)
+                .values(status=JOB_DONE, finished_at=datetime.utcnow(), last_error=None)
+            )
+            await db.commit()
+            await self._publish_update(db, job.capture_id)
+        self.stats.completed += 1
+
+    async def _infer(self, job: InferenceJob) -> str:
+        async with AsyncSessionLocal() as db:
+            capture = (await db.execute(
+                select(UserCapture.query_text, UserCapture.image_sha256, UserCapture.image_mime)
+                .where(UserCapture.id == job.capture_id)
+            )).first()
+        if capture is None:
+            raise LookupError(f"Capture {job.capture_id} no longer exists")
+
+        with open(image_store.path_for(capture.image_sha256), "rb") as f, span("image_encode"):
+            if IMAGE_PREPROCESS:
+                prepared = await prepare_image(f, capture.image_mime)
+                image_url = f"data:{prepared.mime};base64,{base64.b64encode(prepared.data).decode('ascii')}"
+            else:
+                image_url = await run_in_threadpool(encode_data_url, f, capture.image_mime, os.fstat(f.fileno()).st_size)
+
+        messages = vision_messages(job.system_prompt, capture.query_text, image_url)
+        response = await vision_dispatcher.submit(model=LLM_MODEL, messages=messages)
+        return response.choices[0].message.content
+
+    async def _record_failure(self, job: InferenceJob, error: Exception):
+        now = datetime.utcnow()
+        final = isinstance(error, _PERMANENT_ERRORS) or job.attempts >= self.max_attempts
+        values = {"last_error": str(error)[:1000] or type(error).__name__}
+        if final:
+            values.update(status=JOB_FAILED, finished_at=now)
+            self.stats.failed += 1
+            logger.error(f"Inference job {job.id} for capture {job.capture_id} failed after {job.attempts} attempts: {str(error)}")
+        else:
+            values.update(status=JOB_QUEUED, available_at=now + timedelta(seconds=backoff_delay(job.attempts)))
+            self.stats.retried += 1
+            logger.warning(f"Inference job {job.id} attempt {job.attempts} failed, retrying: {str(error)}")
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(InferenceJob).where(InferenceJob.id == job.id).values(**values))
+            if final:
+                await db.execute(
+                    update(UserCapture).where(UserCapture.id == job.capture_id).values(inference_status=JOB_FAILED)
+                )
+            await db.commit()
+            if final:
+                await self._publish_update(db, job.capture_id)
+
+    async def _publish_update(self, db: AsyncSession, capture_id: int):
+        if capture_events.active:
+            capture = await db.get(UserCapture, capture_id)
+            if capture is not None:
+                capture_events.publish(CAPTURE_UPDATED, capture)
+
+    async def snapshot(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            counts = dict((await db.execute(
+                select(InferenceJob.status, func.count()).group_by(InferenceJob.status)
+            )).all())
+            oldest = await db.scalar(
+                select(func.min(InferenceJob.available_at)).where(InferenceJob.status == JOB_QUEUED)
+            )
+        uptime = time.perf_counter() - self._started_at if self._started_at is not None else 0.0
+        return {
+            "workers": len(self._tasks),
+            "busy": self.busy,
+            # Share of worker time spent on jobs since start; near 1.0 with a growing queue means add workers
+            "utilization": round(self.stats.busy_s / (uptime * len(self._tasks)), 3) if uptime and self._tasks else 0.0,
+            "queued": counts.get(JOB_QUEUED, 0),
+            "running": counts.get(JOB_RUNNING, 0),
+            "done": counts.get(JOB_DONE, 0),
+            "failed": counts.get(JOB_FAILED, 0),
+            "oldest_queued_s": round(max(0.0, (datetime.utcnow() - oldest).total_seconds()), 2) if oldest else 0.0,
+            **self.stats.snapshot(),
+        }
+
+    async def aclose(self):
+        interrupted = list(self._running.values())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Interrupted jobs go back to the queue instead of waiting out their lease
+        if interrupted:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(InferenceJob)
+                    .where(InferenceJob.id.in_(interrupted), InferenceJob.status == JOB_RUNNING)
+                    .values(status=JOB_QUEUED, attempts=InferenceJob.attempts - 1)
+                )
+                await db.commit()
+
+
+# Shared queue; workers are started with the app
+inference_jobs = InferenceJobQueue()
@@ -1,10 +1,22 @@
 # File: main.py (updated - added startup event call)
 from fastapi import FastAPI
 import uvicorn
+import logging_config  # noqa: F401  (configures logging at import)
 from fastapi.middleware.cors import CORSMiddleware
-from middleware import TimingMiddleware
-from database import startup_event
-from fastapi.responses import RedirectResponse
+from middleware import MetricsMiddleware, BodySizeLimitMiddleware
+from metrics import registry
+from config import UPLOAD_MAX_BYTES, UPLOAD_FORM_OVERHEAD, PDF_MAX_BYTES
+from database import startup_event, async_engine
+from pagination import NEXT_CURSOR_HEADER
+from clients import llm
+from backends import BREAKER_OPEN
+from batching import vision_dispatcher
+from jobs import inference_jobs
+from inference_cache import inference_cache
+from events import capture_events
+from prompts import prompt_registry
+import pdfs
+from fastapi.responses import PlainTextResponse, RedirectResponse
 
 from routers.core import router as core_router
 from routers.v1 import router as v1_router
@@ -17,8 +29,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Bound multipart bodies before they are parsed; the file itself is checked exactly in the handler
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD,
+    path_limits={
+        path: PDF_MAX_BYTES + UPLOAD_FORM_OVERHEAD for path in ("/v1/extract-text", "/v1/indic-summarize-pdf-all")
+    },
+)
+
+# Outermost, so recorded latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(core_router)
 app.include_router(v1_router)
 
@@ -30,9 +55,53 @@ app.include_router(v1_router)
 async def home():
     return RedirectResponse(url="/docs")
 
+# Gauges read from existing component state at scrape time
+registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being served (including open streams).",
+    callback=lambda: {(): MetricsMiddleware.in_flight},
+)
+registry.gauge("llm_requests_in_flight", "Requests in flight to the LLM backends.", callback=lambda: {(): llm.in_flight})
+registry.gauge(
+    "llm_backend_outstanding", "Requests outstanding on each LLM backend.", ("backend",),
+    callback=lambda: {(b.url,): b.outstanding for b in llm.pool.backends},
+)
+registry.gauge(
+    "llm_backend_up", "1 while an LLM backend passes health checks and its circuit is not open.", ("backend",),
+    callback=lambda: {(b.url,): int(b.healthy and b.breaker != BREAKER_OPEN) for b in llm.pool.backends},
+)
+registry.gauge("batch_pending_requests", "Vision queries waiting for a micro-batch.", callback=lambda: {(): vision_dispatcher.pending})
+registry.gauge("inference_job_workers_busy", "Inference job workers running a job.", callback=lambda: {(): inference_jobs.busy})
+registry.gauge("capture_event_subscribers", "Consoles subscribed to capture events.", callback=lambda: {(): capture_events.subscribers})
+registry.gauge(
+    "inference_cache_events", "Inference cache hits, misses, evictions and expirations since start.", ("event",),
+    callback=lambda: {(event,): count for event, count in inference_cache.stats.items()},
+)
+registry.gauge(
+    "prompt_tokens", "Tokens in each registered system prompt (estimated until counted by the backend).",
+    ("prompt",), callback=lambda: {(prompt.id,): prompt.tokens for prompt in prompt_registry.prompts()},
+)
+
+@app.get("/metrics",
+         summary="Prometheus Metrics",
+         description="Request latency by route, hot-path spans, in-flight gauges and LLM token usage in Prometheus text format.",
+         tags=["Utility"])
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.on_event("startup")
 async def on_startup():
     await startup_event()
+    llm.start()
+    await prompt_registry.count_tokens(llm)
+    inference_jobs.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await inference_jobs.aclose()
+    await vision_dispatcher.aclose()
+    pdfs.shutdown()
+    await llm.aclose()
+    await async_engine.dispose()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
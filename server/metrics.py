@@ -0,0 +1,239 @@
+# File: metrics.py
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Seconds; spans from sub-millisecond (JSON parsing) up to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _NoLock:
+    """Stand-in for metrics only updated from the event loop thread."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), threadsafe: bool = True):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Spans are also recorded from threadpool work (ingest commits, image encoding)
+        self._lock = threading.Lock() if threadsafe else _NoLock()
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), threadsafe: bool = True):
+        super().__init__(name, help, labelnames, threadsafe)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A settable gauge, or one read from `callback` (labels tuple -> value) at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), callback: Optional[Callable[[], dict]] = None):
+        super().__init__(name, help, labelnames, threadsafe=True)
+        self._values: Dict[tuple, float] = {}
+        self._callback = callback
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, value: float, labels: tuple = ()):
+        self._values[labels] = value
+
+    def render(self) -> list:
+        lines = self.header()
+        values = self._callback() if self._callback is not None else self._values
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        threadsafe: bool = True,
+    ):
+        super().__init__(name, help, labelnames, threadsafe)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = self.header()
+        bounds = self.buckets + (math.inf,)
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = (), threadsafe: bool = True) -> Counter:
+        return self.register(Counter(name, help, labelnames, threadsafe))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = (), callback: Optional[Callable[[], dict]] = None) -> Gauge:
+        return self.register(Gauge(name, help, labelnames, callback))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        threadsafe: bool = True,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets, threadsafe))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Request counts are the histogram's _count series, split by status
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body, by route template.",
+    ("method", "route", "status"), threadsafe=False,
+)
+SPAN_SECONDS = registry.histogram(
+    "hot_path_duration_seconds",
+    "Wall time of hot-path steps: upload_read, image_encode, llm_call, llm_stream, json_parse, db_commit, pdf_extract, pdf_summarize, image_hash, tile_render.",
+    ("span",),
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Tokens reported in LLM response usage.", ("model", "kind"))
+LLM_BACKEND_CALLS = registry.counter(
+    "llm_backend_calls_total", "Calls to each LLM backend: ok, failed (connection, timeout or 5xx) or rejected (4xx).",
+    ("backend", "outcome"),
+)
+LLM_HEDGES = registry.counter("llm_hedges_total", "Hedged LLM calls: launched, and won by the hedge.", ("outcome",))
+PROMPT_REQUESTS = registry.counter(
+    "prompt_requests_total",
+    "LLM requests by system prompt and how it was chosen: id, default, matched (posted text equal to a "
+    "registered prompt) or custom (unregistered text; prompt=\"custom\", no shared prefix).",
+    ("prompt", "source"),
+)
+PDF_PAGES = registry.counter(
+    "pdf_pages_total", "PDF pages whose text was served, by source: extracted (worker processes) or cache.", ("source",)
+)
+INCIDENT_LINKS = registry.counter(
+    "incident_links_total", "Uploads linked to incidents: joined an earlier duplicate's incident, or opened one.",
+    ("outcome",),
+)
+DUPLICATE_ANSWERS = registry.counter(
+    "duplicate_answers_total", "Uploads answered with the cached analysis of a near-identical earlier capture."
+)
+EXPORT_ROWS = registry.counter("export_rows_total", "Captures written by bulk exports, by format.", ("format",))
+TILE_REQUESTS = registry.counter(
+    "tile_requests_total",
+    "Map tile lookups: hit (cached) or rendered; not_modified counts those of them answered 304 (If-None-Match).",
+    ("outcome",),
+)
+
+
+class span:
+    """Time a block into hot_path_duration_seconds{span=name}: `with span("db_commit"): ...`."""
+
+    __slots__ = ("labels", "start")
+
+    def __init__(self, name: str):
+        self.labels = (name,)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        SPAN_SECONDS.observe(time.perf_counter() - self.start, self.labels)
+        return False
+
+
+def record_usage(model: str, usage):
+    """Count prompt/completion tokens from an OpenAI-style usage object (None is ignored)."""
+    if usage is None:
+        return
+    if usage.prompt_tokens:
+        LLM_TOKENS.inc((model, "prompt"), usage.prompt_tokens)
+    if usage.completion_tokens:
+        LLM_TOKENS.inc((model, "completion"), usage.completion_tokens)
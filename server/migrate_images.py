@@ -0,0 +1,76 @@
+# File: migrate_images.py
+"""
+Move inline base64 images out of user_captures into the image store.
+
+Rows are processed in id order in small batches, each committed on its own, so
+the job can be interrupted and re-run safely. Values that are not base64 data
+URLs (e.g. HTTP links) are left in place.
+
+Usage (from the server directory):
+    python migrate_images.py [--batch-size 200] [--vacuum]
+"""
+import argparse
+import logging
+
+from sqlalchemy import text
+
+from database import SessionLocal, UserCapture, engine
+from image_store import image_store, parse_data_url
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate(batch_size: int = 200) -> dict:
+    stats = {"migrated": 0, "skipped": 0, "bytes": 0}
+    last_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            rows = (
+                db.query(UserCapture)
+                .filter(UserCapture.id > last_id, UserCapture.image_legacy.isnot(None))
+                .order_by(UserCapture.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            for row in rows:
+                last_id = row.id
+                if row.image_legacy == "":
+                    row.image_legacy = None
+                    continue
+                parsed = parse_data_url(row.image_legacy)
+                if parsed is None:
+                    stats["skipped"] += 1
+                    continue
+                mime, data = parsed
+                row.image_sha256 = image_store.put(data)
+                row.image_size = len(data)
+                row.image_mime = mime
+                row.image_legacy = None
+                stats["migrated"] += 1
+                stats["bytes"] += len(data)
+            db.commit()
+            logger.info(f"Migrated up to capture id {last_id}: {stats}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline capture images into the image store.")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards to reclaim space")
+    args = parser.parse_args()
+
+    result = migrate(args.batch_size)
+    logger.info(f"Done: {result}")
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        logger.info("Database vacuumed.")
@@ -1,16 +1,18 @@
 # models.py
 from pydantic import BaseModel
 from typing import Optional
-from config import DEFAULT_SYSTEM_PROMPT
 
 class TextQueryRequest(BaseModel):
     prompt: str
-    system_prompt: str = DEFAULT_SYSTEM_PROMPT
+    prompt_id: Optional[str] = None  # registered system prompt, e.g. "ordnance" or "ordnance.v1"
+    system_prompt: Optional[str] = None  # custom text; neither means the default prompt, "" means none
+    stream: bool = False  # relay tokens as Server-Sent Events
 
 class ImageQueryRequest(BaseModel):
     text: str
     image_url: str  # HTTP URL or base64 data URL
     max_tokens: Optional[int] = None
+    stream: bool = False  # relay tokens as Server-Sent Events
 
 class ChatRequest(BaseModel):
     message: str
@@ -29,8 +31,11 @@ class ExtractTextResponse(BaseModel):
     extracted_text: str
     page_number: int
     language: str
+    page_count: Optional[int] = None
 
 class PdfSummaryResponse(BaseModel):
     summary: str
     tgt_lang: str
-    model: str
\ No newline at end of file
+    model: str
+    page_count: Optional[int] = None
+    chunks: Optional[int] = None  # page chunks summarized before combining
\ No newline at end of file
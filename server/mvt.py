@@ -0,0 +1,90 @@
+# File: mvt.py
+"""
+Minimal Mapbox Vector Tile (v2) encoder for point layers.
+
+Only what the capture tiles need: one layer of POINT features with properties, written
+as protobuf by hand (https://github.com/mapbox/vector-tile-spec/tree/master/2.1).
+"""
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_VARINT, _FIXED64, _BYTES = 0, 1, 2
+_POINT = 1
+_MOVE_TO = 1
+
+
+def _varint(value: int) -> bytes:
+    value &= (1 << 64) - 1  # negative int64 values take ten bytes, as protobuf does
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field: int, payload: bytes) -> bytes:
+    return _key(field, _BYTES) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _value(value) -> bytes:
+    """A Tile.Value message: string, double, int or bool."""
+    if isinstance(value, bool):
+        return _key(7, _VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(4, _VARINT) + _varint(value)
+    if isinstance(value, float):
+        return _key(3, _FIXED64) + struct.pack("<d", value)
+    return _bytes_field(1, str(value).encode("utf-8"))
+
+
+class PointFeature:
+    __slots__ = ("x", "y", "properties", "id")
+
+    def __init__(self, x: int, y: int, properties: Dict[str, object], id: Optional[int] = None):
+        self.x = x  # tile coordinates, 0..extent
+        self.y = y
+        self.properties = properties  # None values are left out
+        self.id = id
+
+
+def encode_layer(name: str, features: List[PointFeature], extent: int = 4096) -> bytes:
+    """A tile with one layer of point features (empty bytes for no features, a valid empty tile)."""
+    if not features:
+        return b""
+    keys: Dict[str, int] = {}
+    values: Dict[Tuple[type, object], int] = {}
+    encoded = []
+    for feature in features:
+        tags = []
+        for key, value in feature.properties.items():
+            if value is None:
+                continue
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        body = b""
+        if feature.id is not None and feature.id >= 0:
+            body += _key(1, _VARINT) + _varint(feature.id)
+        body += _packed(2, tags)
+        body += _key(3, _VARINT) + _varint(_POINT)
+        body += _packed(4, (_MOVE_TO | (1 << 3), _zigzag(feature.x), _zigzag(feature.y)))
+        encoded.append(_bytes_field(2, body))
+
+    layer = _key(15, _VARINT) + _varint(2) + _bytes_field(1, name.encode("utf-8"))
+    layer += b"".join(encoded)
+    layer += b"".join(_bytes_field(3, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_bytes_field(4, _value(value)) for _, value in values)
+    layer += _key(5, _VARINT) + _varint(extent)
+    return _bytes_field(3, layer)
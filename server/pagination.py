@@ -0,0 +1,61 @@
+# File: pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import UserCapture, fetch_all
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, capture_id: int, order: str) -> str:
+    """Opaque cursor pointing just past (created_at, id) in the given order."""
+    raw = json.dumps([created_at.isoformat(), capture_id, order], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, str]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, capture_id, order = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if order not in ("asc", "desc"):
+            raise ValueError(order)
+        return datetime.fromisoformat(created_at), int(capture_id), order
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def order_by_created(stmt, order: str = "asc"):
+    """Deterministic (created_at, id) ordering, served by ix_user_captures_created_at_id."""
+    if order == "desc":
+        return stmt.order_by(UserCapture.created_at.desc(), UserCapture.id.desc())
+    return stmt.order_by(UserCapture.created_at, UserCapture.id)
+
+
+async def keyset_page(
+    db: AsyncSession, stmt, limit: int, cursor: Optional[str] = None, order: str = "asc", skip: int = 0
+) -> Tuple[List[UserCapture], Optional[str]]:
+    """
+    One page of the select `stmt` in (created_at, id) order, starting after `cursor`.
+    The cursor's own order wins over `order`, so a client cannot flip direction mid-scan.
+    skip is only honoured without a cursor (legacy offset pagination).
+    Returns the rows and the cursor for the next page (None on the last page).
+    """
+    if cursor:
+        created_at, capture_id, order = decode_cursor(cursor)
+        key = tuple_(UserCapture.created_at, UserCapture.id)
+        stmt = stmt.where(key < (created_at, capture_id) if order == "desc" else key > (created_at, capture_id))
+        stmt = order_by_created(stmt, order)
+    else:
+        stmt = order_by_created(stmt, order).offset(skip)
+    # Fetch one extra row to know whether another page exists
+    rows = await fetch_all(db, stmt.limit(limit + 1))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id, order)
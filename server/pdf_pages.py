@@ -0,0 +1,48 @@
+# File: pdf_pages.py
+"""
+Page text extraction run inside the PDF worker processes (see pdfs.py).
+
+Kept free of application imports (config, database, metrics), so spawning a
+worker only loads pypdf.
+"""
+import mmap
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+
+@contextmanager
+def _open(path: str) -> Iterator[PdfReader]:
+    """
+    A reader over the memory-mapped file: pages are parsed straight from the page
+    cache, and workers extracting different ranges of one document share its memory.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        try:
+            reader = PdfReader(data)
+            if reader.is_encrypted:
+                raise ValueError("Encrypted PDFs are not supported")
+            yield reader
+        except PyPdfError as e:
+            # pypdf's errors are re-raised in the server process, which only knows ValueError
+            raise ValueError(f"Could not read PDF: {e}") from None
+
+
+def page_count(path: str) -> int:
+    with _open(path) as reader:
+        return len(reader.pages)
+
+
+def extract_range(path: str, start: int, stop: int) -> List[str]:
+    """Text of pages [start, stop) (0-based); a page that fails to extract gives ""."""
+    texts = []
+    with _open(path) as reader:
+        for index in range(start, stop):
+            try:
+                text = reader.pages[index].extract_text() or ""
+            except Exception:  # malformed content streams fail in many ways; skip the page
+                text = ""
+            texts.append(text.replace("\x00", "").strip())
+    return texts
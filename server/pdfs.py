@@ -0,0 +1,299 @@
+# File: pdfs.py
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+import pdf_pages
+from config import (
+    PDF_WORKERS, PDF_PAGES_PER_TASK, PDF_TEMP_DIR, UPLOAD_CHUNK_SIZE,
+    SUMMARY_CHUNK_CHARS, SUMMARY_MAX_TOKENS, SUMMARY_CONCURRENCY
+)
+from clients import llm
+from database import PdfDocument, PdfPage
+from inference_cache import inference_cache, make_key
+from metrics import PDF_PAGES, span
+from prompts import prompt_registry
+from uploads import SpooledUpload
+
+logger = logging.getLogger(__name__)
+
+PDF_MAGIC = b"%PDF-"
+MAP_PROMPT_ID = "pdf_chunk"
+REDUCE_PROMPT_ID = "pdf_combine"
+
+# FLORES-200 codes used by the indic_* endpoints; other codes are passed to the model as given
+LANGUAGES = {
+    "eng_Latn": "English", "hin_Deva": "Hindi", "kan_Knda": "Kannada", "tam_Taml": "Tamil",
+    "tel_Telu": "Telugu", "mal_Mlym": "Malayalam", "mar_Deva": "Marathi", "ben_Beng": "Bengali",
+    "guj_Gujr": "Gujarati", "pan_Guru": "Punjabi", "ory_Orya": "Odia", "urd_Arab": "Urdu",
+    "ukr_Cyrl": "Ukrainian", "rus_Cyrl": "Russian", "deu_Latn": "German", "fra_Latn": "French",
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _workers() -> ProcessPoolExecutor:
+    """
+    The extraction processes, started on first use. pypdf is pure Python and holds the GIL,
+    so pages are extracted in processes rather than threads. spawn, because forking a
+    process that runs an event loop and thread pools can leave locks held in the child.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class PdfText(NamedTuple):
+    sha256: str
+    page_count: int
+    pages: Dict[int, str]  # 1-based page number -> text, in page order
+    extracted: int  # pages extracted for this request; the rest came from the cache
+
+
+def _is_pdf(f: BinaryIO) -> bool:
+    f.seek(0)
+    head = f.read(1024)
+    f.seek(0)
+    return PDF_MAGIC in head
+
+
+def _shared_path(f: BinaryIO) -> Optional[str]:
+    """
+    A path the worker processes can open the spooled upload by, without copying it:
+    /proc/<pid>/fd/<fd> on Linux. fileno() moves an upload still held in memory to disk.
+    """
+    try:
+        path = f"/proc/{os.getpid()}/fd/{f.fileno()}"
+        f.flush()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return path if os.path.exists(path) else None
+
+
+def _copy_to_temp(f: BinaryIO) -> str:
+    f.seek(0)
+    with tempfile.NamedTemporaryFile(dir=PDF_TEMP_DIR, suffix=".pdf", delete=False) as out:
+        shutil.copyfileobj(f, out, UPLOAD_CHUNK_SIZE)
+    f.seek(0)
+    return out.name
+
+
+def _task_ranges(numbers: Sequence[int], size: int) -> List[Tuple[int, int]]:
+    """Sorted 1-based page numbers as 0-based [start, stop) runs of consecutive pages, at most size long."""
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1 and ranges[-1][1] - ranges[-1][0] < size:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number - 1, number])
+    return [(start, stop) for start, stop in ranges]
+
+
+async def extract_pages(
+    db: AsyncSession, upload: SpooledUpload, pages: Optional[Sequence[int]] = None,
+    pages_per_task: int = PDF_PAGES_PER_TASK,
+) -> PdfText:
+    """
+    Text of the given 1-based pages (all pages if None) of an uploaded PDF.
+
+    Pages already extracted from the same document (same SHA-256) are read from the
+    pdf_pages table. The rest are split into runs of pages_per_task pages, extracted in
+    parallel by the worker processes straight from the spooled upload (memory-mapped,
+    never read into this process), and cached.
+    Raises ValueError if the file is not a readable PDF or a page is out of range.
+    """
+    loop = asyncio.get_running_loop()
+    path = None
+    copied = False
+
+    async def worker_path() -> str:
+        nonlocal path, copied
+        if path is None:
+            path = await run_in_threadpool(_shared_path, upload.file)
+            if path is None:
+                path, copied = await run_in_threadpool(_copy_to_temp, upload.file), True
+        return path
+
+    try:
+        document = await db.get(PdfDocument, upload.sha256)
+        if document is not None:
+            page_count = document.page_count
+        else:
+            if not await run_in_threadpool(_is_pdf, upload.file):
+                raise ValueError("File is not a PDF")
+            page_count = await loop.run_in_executor(_workers(), pdf_pages.page_count, await worker_path())
+
+        wanted = range(1, page_count + 1) if pages is None else sorted(set(pages))
+        for number in wanted:
+            if not 1 <= number <= page_count:
+                raise ValueError(f"Page {number} is out of range; the document has {page_count} pages")
+
+        stmt = select(PdfPage.page_number, PdfPage.text).where(PdfPage.document_sha256 == upload.sha256)
+        if pages is not None:
+            stmt = stmt.where(PdfPage.page_number.in_(wanted))
+        texts = dict((await db.execute(stmt)).all())
+        missing = [number for number in wanted if number not in texts]
+
+        if missing:
+            path = await worker_path()
+            ranges = _task_ranges(missing, pages_per_task)
+            with span("pdf_extract"):
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(_workers(), pdf_pages.extract_range, path, start, stop)
+                    for start, stop in ranges
+                ))
+            rows = []
+            for (start, _), extracted in zip(ranges, results):
+                for offset, text in enumerate(extracted):
+                    texts[start + offset + 1] = text
+                    rows.append({"document_sha256": upload.sha256, "page_number": start + offset + 1, "text": text})
+            if document is None:
+                await db.execute(insert(PdfDocument).values(
+                    sha256=upload.sha256, size=upload.size, page_count=page_count
+                ).on_conflict_do_nothing())
+            # Another request may have extracted the same pages meanwhile
+            await db.execute(insert(PdfPage).on_conflict_do_nothing(), rows)
+            await db.commit()
+            PDF_PAGES.inc(("extracted",), len(missing))
+        PDF_PAGES.inc(("cache",), len(wanted) - len(missing))
+        return PdfText(upload.sha256, page_count, {n: texts[n] for n in wanted}, len(missing))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory on a huge document); the next request starts a new pool
+        shutdown()
+        raise
+    finally:
+        if copied:
+            os.unlink(path)
+
+
+def language_name(code: str) -> str:
+    return LANGUAGES.get(code, code)
+
+
+def _split(text: str, limit: int) -> List[str]:
+    """text in pieces of at most limit characters, cut at whitespace where possible."""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind(" ", limit // 2, limit)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def chunk_pages(pages: Dict[int, str], max_chars: int = SUMMARY_CHUNK_CHARS) -> List[str]:
+    """
+    Consecutive pages packed into chunks of at most about max_chars, each page headed
+    by a [Page N] marker; a longer page is split across chunks. Empty pages are skipped.
+    """
+    chunks, current, size = [], [], 0
+    for number, text in pages.items():
+        marker = f"[Page {number}]\n"
+        for piece in _split(text, max(max_chars - len(marker), 1)):
+            part = marker + piece
+            if current and size + len(part) > max_chars:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += len(part) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _groups(summaries: List[str], max_chars: int) -> List[List[str]]:
+    """Consecutive summaries grouped up to max_chars, at least two to a group so every level halves."""
+    groups, size = [], 0
+    for summary in summaries:
+        if groups and (len(groups[-1]) < 2 or size + len(summary) <= max_chars):
+            groups[-1].append(summary)
+            size += len(summary)
+        else:
+            groups.append([summary])
+            size = len(summary)
+    return groups
+
+
+class Summary(NamedTuple):
+    text: str
+    chunks: int
+    llm_calls: int  # chunk and combine summaries served by the inference cache are not counted
+
+
+async def summarize(
+    pages: Dict[int, str], tgt_lang: str, model: str,
+    max_chars: int = SUMMARY_CHUNK_CHARS, concurrency: int = SUMMARY_CONCURRENCY, client=llm,
+) -> Summary:
+    """
+    Map-reduce summary of a document's pages in the language tgt_lang.
+
+    The pages are cut into chunks of about max_chars, which are summarized concurrently
+    (at most concurrency calls in flight; the LLM client's own limit still applies).
+    The chunk summaries are then combined, in groups that fit max_chars and again
+    concurrently, until one call can combine what is left. Intermediate summaries are
+    written in English; only the final call uses the target language. Every call's
+    result goes through the inference cache, so a document summarized again is not
+    sent to the model twice. Raises ValueError if the pages hold no text.
+    """
+    chunks = chunk_pages(pages, max_chars)
+    if not chunks:
+        raise ValueError("The PDF has no extractable text (scanned pages are not OCR'd)")
+    semaphore = asyncio.Semaphore(concurrency)
+    calls = 0
+
+    async def complete(prompt, text: str, language: str) -> str:
+        nonlocal calls
+        content = f"{text}\n\nWrite the summary in {language}."
+        cache_key = make_key(model, prompt.text, content, "", f"summary-{SUMMARY_MAX_TOKENS}")
+        cached = await run_in_threadpool(inference_cache.get, cache_key)
+        if cached is not None:
+            return cached
+        async with semaphore:
+            response = await client.chat_completion(
+                model=model,
+                messages=[{"role": "system", "content": prompt.text}, {"role": "user", "content": content}],
+                max_tokens=SUMMARY_MAX_TOKENS,
+            )
+        calls += 1
+        summary = (response.choices[0].message.content or "").strip()
+        await run_in_threadpool(inference_cache.set, cache_key, summary)
+        return summary
+
+    target = language_name(tgt_lang)
+    with span("pdf_summarize"):
+        chunk_prompt = prompt_registry.resolve(prompt_id=MAP_PROMPT_ID)
+        if len(chunks) == 1:
+            return Summary(await complete(chunk_prompt, chunks[0], target), 1, calls)
+        summaries = await asyncio.gather(*(complete(chunk_prompt, chunk, "English") for chunk in chunks))
+        combine_prompt = prompt_registry.resolve(prompt_id=REDUCE_PROMPT_ID)
+        while True:
+            groups = _groups(list(summaries), max_chars)
+            if len(groups) == 1:
+                text = await complete(combine_prompt, "\n\n".join(groups[0]), target)
+                return Summary(text, len(chunks), calls)
+            summaries = await asyncio.gather(*(
+                complete(combine_prompt, "\n\n".join(group), "English") for group in groups
+            ))
@@ -0,0 +1,143 @@
+# File: prompts.py
+import asyncio
+import hashlib
+import logging
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from config import PROMPTS_DIR, DEFAULT_PROMPT_ID, LLM_MODEL, PROMPT_TOKENIZE_TIMEOUT
+from metrics import PROMPT_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# <name>.v<version>.txt, e.g. ordnance.v1.txt
+PROMPT_FILE = re.compile(r"^(?P<name>[a-z0-9_-]+)\.v(?P<version>[0-9]+)\.txt$")
+
+# How the system prompt of a request was chosen (label of prompt_requests_total)
+SOURCE_ID = "id"  # by prompt_id
+SOURCE_DEFAULT = "default"  # neither prompt_id nor system_prompt was sent
+SOURCE_MATCHED = "matched"  # system_prompt text identical to a registered prompt once canonicalized
+SOURCE_CUSTOM = "custom"  # unregistered text; no shared prefix with other requests
+
+
+class UnknownPromptError(LookupError):
+    """Raised for a prompt_id that is not in the registry."""
+
+
+class Prompt(NamedTuple):
+    id: str  # <name>.v<version>; custom prompts use "custom"
+    name: str
+    version: int
+    text: str  # canonical form, sent byte-for-byte as the system message
+    sha256: str
+    tokens: int
+    tokens_exact: bool  # counted by the backend's tokenizer rather than estimated
+
+
+def canonicalize(text: str) -> str:
+    """
+    The form a system prompt is sent in: NFC-normalized, \\n line endings, no trailing
+    whitespace on any line and no leading or trailing blank lines. Texts differing only
+    in those respects produce the same bytes, so the backend's prefix cache is shared.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip("\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough count (~4 characters per token) until the backend's tokenizer has been asked."""
+    return (len(text) + 3) // 4
+
+
+def _prompt(id: str, name: str, version: int, text: str) -> Prompt:
+    text = canonicalize(text)
+    return Prompt(id, name, version, text, hashlib.sha256(text.encode("utf-8")).hexdigest(), estimate_tokens(text), False)
+
+
+class PromptRegistry:
+    """
+    Versioned system prompts, loaded once from PROMPTS_DIR.
+
+    Clients refer to a prompt by id ("ordnance.v1") or by name ("ordnance", its latest
+    version) instead of posting the text. Registered prompts are canonicalized once, so
+    every request using one sends a byte-identical system message and the backend can
+    reuse its cached prefix. Posted system_prompt text that canonicalizes to a registered
+    prompt is served as that prompt.
+    """
+
+    def __init__(self, prompts: Dict[str, Prompt], default_id: str):
+        self._prompts = prompts
+        self._latest = {}
+        for prompt in sorted(prompts.values(), key=lambda p: p.version):
+            self._latest[prompt.name] = prompt.id
+        self._by_sha256 = {prompt.sha256: prompt.id for prompt in prompts.values()}
+        self.default_id = self.get(default_id).id
+
+    @classmethod
+    def load(cls, directory: str = PROMPTS_DIR, default_id: str = DEFAULT_PROMPT_ID) -> "PromptRegistry":
+        prompts = {}
+        for path in sorted(Path(directory).glob("*.txt")):
+            match = PROMPT_FILE.match(path.name)
+            if match is None:
+                raise ValueError(f"Prompt file {path.name} is not named <name>.v<version>.txt")
+            name, version = match["name"], int(match["version"])
+            prompt_id = f"{name}.v{version}"
+            prompts[prompt_id] = _prompt(prompt_id, name, version, path.read_text(encoding="utf-8"))
+        logger.info(f"Loaded {len(prompts)} system prompts from {directory}")
+        return cls(prompts, default_id)
+
+    def get(self, prompt_id: str) -> Prompt:
+        """A prompt by id, or the latest version of a prompt by name."""
+        prompt_id = self._latest.get(prompt_id, prompt_id)
+        try:
+            return self._prompts[prompt_id]
+        except KeyError:
+            raise UnknownPromptError(f"Unknown prompt_id {prompt_id!r}") from None
+
+    @property
+    def default(self) -> Prompt:
+        return self._prompts[self.default_id]
+
+    def resolve(self, prompt_id: Optional[str] = None, system_prompt: Optional[str] = None) -> Prompt:
+        """
+        The system prompt for a request: prompt_id if given, else the posted text (served as
+        the registered prompt it canonicalizes to, if any), else the default prompt.
+        """
+        if prompt_id:
+            prompt, source = self.get(prompt_id), SOURCE_ID
+        elif system_prompt is None:
+            prompt, source = self.default, SOURCE_DEFAULT
+        else:
+            text = canonicalize(system_prompt)
+            registered = self._by_sha256.get(hashlib.sha256(text.encode("utf-8")).hexdigest())
+            if registered is not None:
+                prompt, source = self._prompts[registered], SOURCE_MATCHED
+            else:
+                prompt, source = _prompt(SOURCE_CUSTOM, SOURCE_CUSTOM, 0, text), SOURCE_CUSTOM
+        PROMPT_REQUESTS.inc((prompt.id, source))
+        return prompt
+
+    async def count_tokens(self, llm, model: str = LLM_MODEL, timeout: float = PROMPT_TOKENIZE_TIMEOUT):
+        """
+        Replace the estimated token counts with the backend tokenizer's. Gives up (keeping
+        the estimates) on the first failure, so an unreachable backend delays startup once.
+        """
+        for prompt in list(self._prompts.values()):
+            try:
+                tokens = await asyncio.wait_for(llm.count_tokens(model, prompt.text, timeout=timeout), timeout)
+            except Exception as e:
+                logger.warning(f"Could not count prompt tokens with the backend tokenizer, keeping estimates: {e!r}")
+                return
+            self._prompts[prompt.id] = prompt._replace(tokens=tokens, tokens_exact=True)
+
+    def prompts(self) -> list:
+        return sorted(self._prompts.values(), key=lambda p: (p.name, p.version))
+
+    def latest_id(self, name: str) -> str:
+        return self._latest[name]
+
+
+# Shared registry; fails loudly at import if the prompt files are missing or misnamed
+prompt_registry = PromptRegistry.load()
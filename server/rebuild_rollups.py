@@ -0,0 +1,56 @@
+# File: rebuild_rollups.py
+"""
+Recount capture_rollups (the analytics counts) from user_captures.
+
+The triggers keep the counts current, and a level added to ROLLUP_LEVELS is filled on
+the next start; run this after writing captures with the triggers dropped (e.g. a bulk
+restore), or to check the counts. Each level's buckets from --since on (all of them by
+default) are deleted and recounted in one transaction per level, so readers never see
+a half-built level; writers wait for it. Captures moved out by archive_captures.py are
+not in user_captures any more, so a rebuild drops them from the counts of their buckets.
+
+Usage (from the server directory):
+    python rebuild_rollups.py [--since 2025-11-01T00:00:00]
+"""
+import argparse
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+
+from config import ROLLUP_LEVELS
+from database import engine, rollup_backfill_sql
+from rollups import epoch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def rebuild(since: Optional[datetime] = None) -> dict:
+    stats = {}
+    for precision, bucket_seconds in dict.fromkeys(ROLLUP_LEVELS):
+        level = (precision, bucket_seconds)
+        with engine.begin() as conn:
+            params = {"precision": precision, "bucket_seconds": bucket_seconds}
+            delete = "DELETE FROM capture_rollups WHERE precision = :precision AND bucket_seconds = :bucket_seconds"
+            if since is not None:
+                # Whole buckets: from the start of the one containing since
+                params["bucket_start"] = epoch(since) // bucket_seconds * bucket_seconds
+                params["since"] = datetime.utcfromtimestamp(params["bucket_start"]).strftime("%Y-%m-%d %H:%M:%S")
+                delete += " AND bucket_start >= :bucket_start"
+            conn.execute(text(delete), params)
+            conn.execute(text(rollup_backfill_sql(level, since=since is not None)), params)
+            stats[f"{precision}:{bucket_seconds}"] = conn.execute(text(
+                "SELECT COUNT(*) AS cells, COALESCE(SUM(count), 0) AS captures FROM capture_rollups "
+                "WHERE precision = :precision AND bucket_seconds = :bucket_seconds"
+            ), params).one()._asdict()
+        logger.info(f"Rebuilt level {precision}:{bucket_seconds}: {stats[f'{precision}:{bucket_seconds}']}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recount the analytics rollups from the captures.")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only buckets from this UTC time on")
+    args = parser.parse_args()
+    logger.info(f"Done: {rebuild(args.since)}")
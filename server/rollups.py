@@ -0,0 +1,138 @@
+# File: rollups.py
+import calendar
+import logging
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import ROLLUP_LEVELS, ROLLUP_MAX_ROWS
+from database import CaptureRollup
+from geo import geohash_bits, geohash_cell, geohash_center, geohash_encode
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+# Buckets are aligned to the unix epoch shifted back by this; weeks start on Monday (1969-12-29 was one)
+BUCKET_SHIFTS = {"hour": 0, "day": 0, "week": 3 * 86400}
+
+
+class RollupCounts(NamedTuple):
+    level: Tuple[int, int]  # (precision, bucket_seconds) the counts were summed from
+    items: List[dict]
+    truncated: bool  # more than the requested limit of rows matched
+
+
+def epoch(dt: datetime) -> int:
+    """Unix time of a datetime; naive datetimes are UTC, like created_at."""
+    return calendar.timegm(dt.utctimetuple())
+
+
+def choose_level(precision: int, bucket: str, levels: Sequence[Tuple[int, int]] = ROLLUP_LEVELS) -> Tuple[int, int]:
+    """
+    The stored level to sum for cells of precision characters and the named bucket: one whose
+    cells nest in the requested ones and whose buckets tile them, with the fewest cells per
+    requested (cell, bucket). Raises ValueError if no configured level is fine enough.
+    """
+    seconds, shift = BUCKETS[bucket], BUCKET_SHIFTS[bucket]
+    candidates = [
+        (p, s) for p, s in levels
+        if p >= precision and seconds % s == 0 and shift % s == 0
+    ]
+    if not candidates:
+        raise ValueError(
+            f"No rollup level answers precision {precision} by {bucket}; "
+            f"stored levels (precision:bucket_seconds): {', '.join(f'{p}:{s}' for p, s in levels) or 'none'}"
+        )
+    return min(candidates, key=lambda level: (32 ** (level[0] - precision)) * seconds / level[1])
+
+
+def _cell_range(column, low: int, high: int):
+    return and_(column >= low, column <= high)
+
+
+def _bbox_condition(level_precision: int, bbox: Tuple[float, float, float, float]):
+    """Stored cells of a level overlapping a (min_lat, min_lon, max_lat, max_lon) box; min_lon > max_lon wraps."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    low_lat, low_lon = geohash_cell(min_lat, min_lon, level_precision)
+    high_lat, high_lon = geohash_cell(max_lat, max_lon, level_precision)
+    lat_cond = _cell_range(CaptureRollup.lat_cell, low_lat, high_lat)
+    if min_lon <= max_lon:
+        return and_(lat_cond, _cell_range(CaptureRollup.lon_cell, low_lon, high_lon))
+    return and_(lat_cond, or_(CaptureRollup.lon_cell >= low_lon, CaptureRollup.lon_cell <= high_lon))
+
+
+def _items(rows, precision: int) -> List[dict]:
+    cells = {}  # the same cells recur in every bucket
+    items = []
+    for row in rows:
+        cell = (row.lat_cell, row.lon_cell)
+        if cell not in cells:
+            cells[cell] = (geohash_encode(*cell, precision), *geohash_center(*cell, precision))
+        geohash, latitude, longitude = cells[cell]
+        items.append({
+            "geohash": geohash,
+            "latitude": latitude,
+            "longitude": longitude,
+            "bucket_start": datetime.utcfromtimestamp(row.bucket_start),
+            "ordnance_type": row.ordnance_type,
+            "count": row.count,
+        })
+    return items
+
+
+async def rollup_counts(
+    db: AsyncSession,
+    precision: int,
+    bucket: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    ordnance_types: Optional[List[str]] = None,
+    limit: int = ROLLUP_MAX_ROWS,
+) -> RollupCounts:
+    """
+    Capture counts per (geohash cell of precision characters, bucket, ordnance type), summed
+    from the pre-aggregated capture_rollups rows of the chosen level; user_captures is not
+    read, so the cost follows the number of cells and buckets in range, not of captures.
+
+    start_time and end_time select whole buckets: those containing them and all between.
+    bbox keeps cells overlapping it. Rows come in (bucket_start, latitude, longitude) order.
+    """
+    level_precision, level_seconds = choose_level(precision, bucket)
+    seconds, shift = BUCKETS[bucket], BUCKET_SHIFTS[bucket]
+    level_lat_bits, level_lon_bits = geohash_bits(level_precision)
+    lat_bits, lon_bits = geohash_bits(precision)
+
+    lat_cell = CaptureRollup.lat_cell.op(">>")(level_lat_bits - lat_bits)
+    lon_cell = CaptureRollup.lon_cell.op(">>")(level_lon_bits - lon_bits)
+    if seconds == level_seconds:
+        bucket_start = CaptureRollup.bucket_start
+    else:
+        bucket_start = (CaptureRollup.bucket_start + shift) // seconds * seconds - shift
+
+    conditions = [CaptureRollup.precision == level_precision, CaptureRollup.bucket_seconds == level_seconds]
+    if start_time is not None:
+        conditions.append(CaptureRollup.bucket_start >= (epoch(start_time) + shift) // seconds * seconds - shift)
+    if end_time is not None:
+        conditions.append(CaptureRollup.bucket_start <= epoch(end_time))
+    if bbox is not None:
+        conditions.append(_bbox_condition(level_precision, bbox))
+    if ordnance_types:
+        conditions.append(CaptureRollup.ordnance_type.in_(ordnance_types))
+
+    stmt = (
+        select(
+            bucket_start.label("bucket_start"), lat_cell.label("lat_cell"), lon_cell.label("lon_cell"),
+            CaptureRollup.ordnance_type, func.sum(CaptureRollup.count).label("count"),
+        )
+        .where(*conditions)
+        .group_by(bucket_start, lat_cell, lon_cell, CaptureRollup.ordnance_type)
+        .order_by(bucket_start, lat_cell, lon_cell, CaptureRollup.ordnance_type)
+        .limit(limit + 1)
+    )
+    rows = (await db.execute(stmt)).all()
+    items = await run_in_threadpool(_items, rows[:limit], precision)
+    return RollupCounts((level_precision, level_seconds), items, len(rows) > limit)
@@ -1,34 +1,92 @@
 # routers/core.py
 from fastapi import APIRouter, HTTPException, File, UploadFile, Form, Query, Depends
-from typing import Optional
+from fastapi.responses import JSONResponse
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
 import base64
+import logging
+import time
 import uuid
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from models import TextQueryRequest, ImageQueryRequest
-from clients import client
-from config import DEFAULT_SYSTEM_PROMPT
+from clients import llm, LLMTimeoutError
+from batching import vision_dispatcher
+from config import LLM_MODEL, IMAGE_STORE_ORIGINAL, IMAGE_PREPROCESS
 
-from database import get_db, UserCapture
-from schemas import UserCaptureCreate
+from database import get_async_db, AsyncSessionLocal, UserCapture
+from image_store import image_store, encode_data_url
+from uploads import spool_upload, SpooledUpload, UploadTooLargeError
+from inference_cache import inference_cache, make_key
+from image_processing import prepare_image, preprocess_signature, image_phash, ImageDecodeError, PreparedImage
+from jobs import inference_jobs
+from events import capture_events, CAPTURE_CREATED
+from utils import sse_event, sse_response, vision_messages
+from metrics import span, DUPLICATE_ANSWERS
+from analysis import analysis_columns
+from prompts import prompt_registry, UnknownPromptError
+from incidents import IncidentMatch, find_duplicate, reusable_answer, link_capture
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="", tags=["core"])
 
+async def _sse_relay(
+    deltas: AsyncIterator[str],
+    on_complete: Optional[Callable[[str], Awaitable[dict]]] = None,
+):
+    """
+    Relay content deltas as Server-Sent Events, then send a final "done" event with the
+    assembled response, time-to-first-token and total time. on_complete runs once the
+    stream has finished and can add fields (e.g. capture_id) to the "done" event.
+    """
+    start = time.perf_counter()
+    ttft_ms = None
+    parts = []
+    try:
+        async for delta in deltas:
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+        response = "".join(parts)
+        done = {"response": response}
+        if on_complete is not None:
+            done.update(await on_complete(response))
+        done["ttft_ms"] = round(ttft_ms or 0.0, 2)
+        done["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        yield sse_event(done, event="done")
+    except Exception as e:
+        logger.error(f"Streaming response failed: {str(e)}")
+        yield sse_event({"detail": str(e)}, event="error")
+
+async def _single_delta(text: str):
+    yield text
+
 @router.post("/text_query")
 async def text_query_endpoint(request: TextQueryRequest):
     """Handle text-based queries for weapon identification."""
     try:
+        system_prompt = prompt_registry.resolve(request.prompt_id, request.system_prompt)
         user_prompt = "identify the weapon :" + request.prompt
         messages = [{"role": "user", "content": user_prompt}]
-        if request.system_prompt.strip():
-            messages.insert(0, {"role": "system", "content": request.system_prompt})
-        
-        response = client.chat.completions.create(
-            model="gemma3",
+        if system_prompt.text:
+            messages.insert(0, {"role": "system", "content": system_prompt.text})
+
+        if request.stream:
+            return sse_response(_sse_relay(llm.stream_chat_completion(model=LLM_MODEL, messages=messages)))
+
+        response = await llm.chat_completion(
+            model=LLM_MODEL,
             messages=messages,
         )
         return {"response": response.choices[0].message.content}
+    except UnknownPromptError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -49,78 +107,211 @@ async def image_query_endpoint(request: ImageQueryRequest):
             }
         ]
 
-        kwargs = {"model": "gemma3", "messages": messages}
+        kwargs = {"model": LLM_MODEL, "messages": messages}
+        if request.max_tokens:
+            kwargs["max_tokens"] = request.max_tokens
 
-        response = client.chat.completions.create(**kwargs)
+        if request.stream:
+            # Streams bypass the micro-batcher, which only deals in complete responses
+            return sse_response(_sse_relay(llm.stream_chat_completion(**kwargs)))
+
+        response = await vision_dispatcher.submit(**kwargs)
         return {"response": response.choices[0].message.content}
+    except HTTPException:
+        raise
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _store_upload(upload: SpooledUpload, prepared: Optional[PreparedImage]) -> Tuple[str, int, str]:
+    """
+    Store the uploaded image once, keyed by hash, and return (sha256, size, mime) for its row.
+    The original is copied from the spooled upload in chunks; with IMAGE_STORE_ORIGINAL off
+    the normalized image is stored instead.
+    """
+    if IMAGE_STORE_ORIGINAL or not IMAGE_PREPROCESS:
+        stored_sha256 = await run_in_threadpool(image_store.put_file, upload.file, upload.sha256)
+        return stored_sha256, upload.size, upload.mime
+    prepared = prepared or await prepare_image(upload.file, upload.mime)
+    stored_sha256 = await run_in_threadpool(image_store.put, prepared.data)
+    return stored_sha256, len(prepared.data), prepared.mime
+
+async def _save_upload_capture(
+    db: AsyncSession,
+    text: str,
+    lat: float,
+    lon: float,
+    ai_response: Optional[str],
+    stored: Tuple[str, int, str],
+    commit: bool = True,
+    phash: Optional[int] = None,
+    duplicate: Optional[IncidentMatch] = None,
+) -> UserCapture:
+    """
+    Insert the UserCapture row for an upload whose image is already stored; with its
+    perceptual hash it joins the incident of the duplicate found for it, or opens one.
+    """
+    # Generate a unique user_id for this capture
+    user_id = str(uuid.uuid4())
+
+    # Check for existing (though unlikely with UUID)
+    existing = await db.scalar(select(UserCapture.id).where(UserCapture.user_id == user_id).limit(1))
+    if existing:
+        raise HTTPException(status_code=409, detail="User capture already exists (unlikely with UUID)")
+
+    # Insert into database; the row only keeps the image reference
+    image_sha256, image_size, image_mime = stored
+    db_capture = UserCapture(
+        user_id=user_id,
+        query_text=text,
+        image_sha256=image_sha256,
+        image_size=image_size,
+        image_mime=image_mime,
+        latitude=lat,
+        longitude=lon,
+        ai_response=ai_response,
+        # created_at auto-generated
+        **analysis_columns(ai_response)
+    )
+    db.add(db_capture)
+    if phash is not None:
+        await link_capture(db, db_capture, phash, duplicate)
+    if commit:
+        await db.commit()
+        capture_events.publish(CAPTURE_CREATED, db_capture)
+    return db_capture
+
 @router.post("/upload_image_query")
 async def upload_image_query_endpoint(
     text: str = Form(...),
-    system_prompt: str = Form(DEFAULT_SYSTEM_PROMPT),
+    prompt_id: Optional[str] = Form(None),
+    system_prompt: Optional[str] = Form(None),
     lat: float = Form(52.5200),
     lon: float = Form(13.4050),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    deadline_ms: Optional[float] = Form(None),
+    stream: bool = Form(False),
+    wait: bool = Form(True),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Handle image upload and query with optional system prompt and GPS coordinates."""
+    """
+    Handle image upload and query with optional system prompt and GPS coordinates.
+    Prefer prompt_id (a registered prompt such as "ordnance") over posting system_prompt
+    text; with neither, the default prompt is used.
+    Files above UPLOAD_MAX_BYTES are rejected with 413.
+    deadline_ms caps how long the query may wait for a micro-batch to fill.
+    With stream=true the response is relayed as Server-Sent Events and the capture
+    is saved once the stream completes; its id is sent in the final "done" event.
+    With wait=false the capture is saved right away and 202 is returned with its id;
+    a background inference job fills in the response (poll /v1/user-captures/{id}
+    or /v1/inference-jobs/{job_id}). Cached answers are still returned directly.
+    """
     try:
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
+        # Canonical text, so equivalent prompts share the backend's prefix cache and our inference cache
+        system_prompt = prompt_registry.resolve(prompt_id, system_prompt).text
 
-        contents = await file.read()
-        base64_image = base64.b64encode(contents).decode('utf-8')
-        image_url = f"data:{file.content_type};base64,{base64_image}"
+        # Hashed in chunks where the multipart parser spooled it; never read whole into memory
+        with span("upload_read"):
+            upload = await spool_upload(file)
+        image_sha256 = upload.sha256
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": text},
-                    {"type": "image_url", "image_url": {"url": image_url}},
-                ],
-            }
-        ]
+        print(f"{text} (Location: {lat}, {lon})")
+        # Identical (model, prompt, text, image) queries are answered from cache without touching the GPU
+        cache_key = make_key(LLM_MODEL, system_prompt, text, image_sha256, preprocess_signature())
+        ai_response = await run_in_threadpool(inference_cache.get, cache_key)
+        cached = ai_response is not None
 
-        kwargs = {"model": "gemma3", "messages": messages}
+        # The same object photographed by someone else nearby, minutes ago: same incident,
+        # and a confident answer about the near-identical photo is reused
+        with span("image_hash"):
+            phash = await image_phash(upload.file)
+        duplicate = await find_duplicate(db, phash, lat, lon) if phash is not None else None
+        duplicate_of = None
+        if not cached:
+            ai_response = await reusable_answer(duplicate, system_prompt, text)
+            if ai_response is not None:
+                cached, duplicate_of = True, duplicate.capture_id
+                DUPLICATE_ANSWERS.inc()
+                await run_in_threadpool(inference_cache.set, cache_key, ai_response)
 
-        print(f"{text} (Location: {lat}, {lon})")
-        response = client.chat.completions.create(**kwargs)
-        ai_response = response.choices[0].message.content
-
-        # Generate a unique user_id for this capture
-        user_id = str(uuid.uuid4())
-
-        # Prepare data for UserCapture insertion
-        capture_create = UserCaptureCreate(
-            user_id=user_id,
-            query_text=text,
-            image=image_url,  # Store base64 image URL
-            latitude=lat,
-            longitude=lon,
-            ai_response=ai_response
-            # created_at auto-generated
-        )
+        if not cached and not wait:
+            # Capture first: nothing is sent to the model while the client is connected
+            stored = await _store_upload(upload, None)
+            db_capture = await _save_upload_capture(
+                db, text, lat, lon, None, stored, commit=False, phash=phash, duplicate=duplicate
+            )
+            job = await inference_jobs.enqueue(db, db_capture, system_prompt, cache_key)
+            capture_events.publish(CAPTURE_CREATED, db_capture)
+            return JSONResponse(status_code=202, content={
+                "capture_id": db_capture.id,
+                "incident_id": db_capture.incident_id,
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/v1/inference-jobs/{job.id}",
+            })
+
+        prepared = None
+        kwargs = None
+        if not cached:
+            with span("image_encode"):
+                if IMAGE_PREPROCESS:
+                    # Downscale to the model's input resolution and strip metadata before encoding
+                    prepared = await prepare_image(upload.file, upload.mime)
+                    image_url = f"data:{prepared.mime};base64,{base64.b64encode(prepared.data).decode('ascii')}"
+                else:
+                    image_url = await run_in_threadpool(encode_data_url, upload.file, upload.mime, upload.size)
+
+            kwargs = {"model": LLM_MODEL, "messages": vision_messages(system_prompt, text, image_url)}
+
+        # Stored before the query: the spooled upload is not guaranteed to outlive this handler,
+        # and a streamed response completes after it returns
+        stored = await _store_upload(upload, prepared)
 
-        # Check for existing (though unlikely with UUID)
-        existing = db.query(UserCapture).filter(UserCapture.user_id == user_id).first()
-        if existing:
-            raise HTTPException(status_code=409, detail="User capture already exists (unlikely with UUID)")
+        if stream:
+            async def on_complete(response: str) -> dict:
+                if not cached:
+                    await run_in_threadpool(inference_cache.set, cache_key, response)
+                # The request-scoped session is closed once the handler returns, before the stream ends
+                async with AsyncSessionLocal() as stream_db:
+                    capture = await _save_upload_capture(
+                        stream_db, text, lat, lon, response, stored, phash=phash, duplicate=duplicate
+                    )
+                return {"capture_id": capture.id, "incident_id": capture.incident_id, "cached": cached}
 
-        # Insert into database
-        db_capture = UserCapture(**capture_create.dict())
-        db.add(db_capture)
-        db.commit()
-        db.refresh(db_capture)
+            deltas = _single_delta(ai_response) if cached else llm.stream_chat_completion(**kwargs)
+            return sse_response(_sse_relay(deltas, on_complete))
+
+        if not cached:
+            deadline = deadline_ms / 1000 if deadline_ms is not None else None
+            response = await vision_dispatcher.submit(deadline=deadline, **kwargs)
+            ai_response = response.choices[0].message.content
+            await run_in_threadpool(inference_cache.set, cache_key, ai_response)
+
+        db_capture = await _save_upload_capture(
+            db, text, lat, lon, ai_response, stored, phash=phash, duplicate=duplicate
+        )
 
         # Return the AI response (you could also include the capture ID if needed)
-        return {"response": ai_response, "capture_id": db_capture.id}
+        result = {
+            "response": ai_response, "capture_id": db_capture.id, "incident_id": db_capture.incident_id, "cached": cached
+        }
+        if duplicate_of is not None:
+            result["duplicate_of"] = duplicate_of
+        return result
 
     except HTTPException:
         raise
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnknownPromptError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,42 +1,169 @@
 # routers/v1.py
-from fastapi import APIRouter, File, UploadFile, Form, Query, Header, HTTPException, Depends, status
-from typing import Optional
+from fastapi import APIRouter, File, UploadFile, Form, Query, Header, HTTPException, Depends, Request, Response, status
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from typing import Literal, Optional, Union
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List
 from models import (
     ChatRequest, ChatResponse, VisualQueryResponse, ExtractTextResponse, PdfSummaryResponse
 )
 from routers.core import upload_image_query_endpoint
-from config import DEFAULT_SYSTEM_PROMPT
-from database import get_db, UserCapture
-from schemas import UserCaptureCreate, UserCaptureUpdate, UserCaptureResponse
+from config import INGEST_BATCH_SIZE, EVENTS_BULK_LIMIT, PDF_MAX_BYTES, LLM_MODEL, ROLLUP_LEVELS, ROLLUP_MAX_ROWS, TILE_MAX_ZOOM
+from database import get_async_db, fetch_all, SessionLocal, AsyncSessionLocal, UserCapture, InferenceJob, Incident, ArchivedImage
+from image_store import image_store, image_columns
+from inference_cache import inference_cache
+from batching import vision_dispatcher
+from clients import llm, LLMTimeoutError
+from jobs import inference_jobs
+from events import capture_events, SubscriberLimitError, CAPTURE_CREATED, CAPTURE_UPDATED, CAPTURE_DELETED
+from analysis import analysis_columns
+from prompts import prompt_registry, UnknownPromptError
+from schemas import (
+    UserCaptureCreate, UserCaptureUpdate, UserCaptureResponse, NearbyCaptureResponse, UserCaptureSummary,
+    BulkIngestResponse, InferenceJobResponse, PromptResponse, IncidentResponse, CaptureAnalyticsResponse
+)
+from pydantic import TypeAdapter
+from image_processing import thumbnail_data_url
+from geo import captures_in_bbox_select, nearest_captures
+from pagination import keyset_page, NEXT_CURSOR_HEADER
+from ingest import ingest_captures, ingest_summary, ndjson_batches, NDJSON_MEDIA_TYPES
+from utils import sse_response
+from uploads import spool_upload, UploadTooLargeError
+from pdfs import extract_pages, summarize
+from incidents import incident_items
+from rollups import rollup_counts
+from export import export_select, export_stream, export_filename, FORMATS as EXPORT_FORMATS, COMPRESSIONS
+from tiles import tile_cache, etag_matches, EXTENSIONS as TILE_EXTENSIONS
+from archive import archive_files, archived_capture, keyset_page_with_archive
+from metrics import TILE_REQUESTS
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1", tags=["v1"])
 
-@router.get("/user-captures/", response_model=List[UserCaptureResponse])
-def read_user_captures(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+# Columns read for view=summary; the image column and blob are never touched
+SUMMARY_COLUMNS = (
+    UserCapture.id, UserCapture.user_id, UserCapture.latitude, UserCapture.longitude,
+    UserCapture.created_at, UserCapture.ordnance_type, UserCapture.warcrime_assessment,
+    UserCapture.needs_specialist, UserCapture.confidence, UserCapture.short_advice,
+    UserCapture.image_sha256, UserCapture.inference_status, UserCapture.incident_id,
+)
+capture_list_adapter = TypeAdapter(List[UserCaptureResponse])
+nearby_list_adapter = TypeAdapter(List[NearbyCaptureResponse])
+summary_list_adapter = TypeAdapter(List[UserCaptureSummary])
+incident_list_adapter = TypeAdapter(List[IncidentResponse])
+analytics_adapter = TypeAdapter(CaptureAnalyticsResponse)
+# List endpoints return full items, or summaries with view=summary
+CaptureListResponse = Union[List[UserCaptureResponse], List[UserCaptureSummary]]
+
+def capture_select(view: str):
+    """Base select for list endpoints: full ORM rows, or only the summary columns."""
+    if view == "summary":
+        return select(*SUMMARY_COLUMNS)
+    return select(UserCapture)
+
+def list_adapter(view: str) -> TypeAdapter:
+    return summary_list_adapter if view == "summary" else capture_list_adapter
+
+def _list_response(rows, adapter: TypeAdapter, thumbnails: bool, headers: dict) -> Response:
+    items = adapter.validate_python(rows, from_attributes=True)
+    if thumbnails and adapter is summary_list_adapter:
+        for item in items:
+            if item.imageSha256:
+                item.thumbnail = thumbnail_data_url(item.imageSha256)
+    return Response(
+        content=adapter.dump_json(items, by_alias=True),
+        media_type="application/json",
+        headers=headers,
+    )
+
+async def list_response(
+    rows, adapter: TypeAdapter, thumbnails: bool = False, next_cursor: Optional[str] = None
+) -> Response:
+    """
+    Serialize list rows straight to JSON in the threadpool: full rows read their image
+    blobs from disk and thumbnails may be generated, neither of which belongs on the event loop.
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return await run_in_threadpool(_list_response, rows, adapter, thumbnails, headers)
+
+def apply_analysis_filters(
+    stmt,
+    ordnance_type: Optional[List[str]] = None,
+    needs_specialist: Optional[bool] = None,
+    warcrime_assessment: Optional[List[str]] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+):
+    """Filter on the typed analysis columns; each condition is served by an index."""
+    if ordnance_type:
+        stmt = stmt.where(UserCapture.ordnance_type.in_(ordnance_type))
+    if needs_specialist is not None:
+        stmt = stmt.where(UserCapture.needs_specialist == needs_specialist)
+    if warcrime_assessment:
+        stmt = stmt.where(UserCapture.warcrime_assessment.in_(warcrime_assessment))
+    if min_confidence is not None:
+        stmt = stmt.where(UserCapture.confidence >= min_confidence)
+    if max_confidence is not None:
+        stmt = stmt.where(UserCapture.confidence <= max_confidence)
+    return stmt
+
+async def get_capture(db: AsyncSession, capture_id: int) -> UserCapture:
+    """Load a capture by id, or raise 404."""
+    capture = await db.get(UserCapture, capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="User capture not found")
+    return capture
+
+@router.get("/user-captures/", response_model=CaptureListResponse)
+async def read_user_captures(
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    view: Literal["full", "summary"] = "full",
+    thumbnails: bool = False,
+    ordnance_type: Optional[List[str]] = Query(None),
+    needs_specialist: Optional[bool] = None,
+    warcrime_assessment: Optional[List[str]] = Query(None),
+    min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    max_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Retrieve a paginated list of user captures.
+    Retrieve a paginated list of user captures in (created_at, id) order.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page;
+    skip is still accepted for offset pagination but gets slower on deep pages.
+    Optionally filter by the parsed analysis fields, e.g.
+    ?ordnance_type=mine_anti_tank&needs_specialist=true&min_confidence=0.7
+    view=summary returns UserCaptureSummary items (no image; thumbnails=true adds a small one).
     """
     try:
-        captures = db.query(UserCapture).offset(skip).limit(limit).all()
+        stmt = apply_analysis_filters(
+            capture_select(view), ordnance_type, needs_specialist,
+            warcrime_assessment, min_confidence, max_confidence
+        )
+        captures, next_cursor = await keyset_page(db, stmt, limit, cursor, order, skip)
         logger.info(f"Retrieved {len(captures)} user captures.")
-        return captures
+        return await list_response(captures, list_adapter(view), thumbnails, next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving user captures: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/user-captures/by-user/{user_id}", response_model=UserCaptureResponse)
-def read_user_capture_by_user_id(user_id: str, db: Session = Depends(get_db)):
+async def read_user_capture_by_user_id(user_id: str, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a specific user capture by user_id.
     """
     try:
-        capture = db.query(UserCapture).filter(UserCapture.user_id == user_id).first()
+        capture = await db.scalar(select(UserCapture).where(UserCapture.user_id == user_id).limit(1))
         if capture is None:
             raise HTTPException(status_code=404, detail="User capture not found")
         return capture
@@ -47,119 +174,598 @@ def read_user_capture_by_user_id(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/user-captures/{capture_id}", response_model=UserCaptureResponse)
-def read_user_capture_by_capture_id(capture_id: int, db: Session = Depends(get_db)):
+async def read_user_capture_by_capture_id(capture_id: int, db: AsyncSession = Depends(get_async_db)):
     """
-    Retrieve a specific user capture by capture_id.
+    Retrieve a specific user capture by capture_id; archived captures are read from their archive file.
     """
     try:
-        capture = db.query(UserCapture).filter(UserCapture.id == capture_id).first()
+        return await get_capture(db, capture_id)
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+        capture = await archived_capture(db, capture_id)
         if capture is None:
-            raise HTTPException(status_code=404, detail="User capture not found")
+            raise
         return capture
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error retrieving user capture for capture_id {capture_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/user-captures/", response_model=UserCaptureResponse, status_code=status.HTTP_201_CREATED)
-def create_user_capture(capture_create: UserCaptureCreate, db: Session = Depends(get_db)):
+async def create_user_capture(capture_create: UserCaptureCreate, db: AsyncSession = Depends(get_async_db)):
     """
     Create a new user capture.
     """
     try:
         # Check if user_id already exists (enforce uniqueness)
-        existing = db.query(UserCapture).filter(UserCapture.user_id == capture_create.user_id).first()
+        existing = await db.scalar(
+            select(UserCapture.id).where(UserCapture.user_id == capture_create.user_id).limit(1)
+        )
         if existing:
             raise HTTPException(status_code=409, detail="User capture for this user_id already exists")
         
-        db_capture = UserCapture(**capture_create.dict())
+        capture_data = capture_create.dict()
+        # Decoding and hashing the image and writing the blob are blocking work
+        capture_data.update(await run_in_threadpool(image_columns, capture_data.pop("image")))
+        capture_data.update(analysis_columns(capture_data["ai_response"]))
+        db_capture = UserCapture(**capture_data)
         db.add(db_capture)
-        db.commit()
-        db.refresh(db_capture)
+        await db.commit()
+        capture_events.publish(CAPTURE_CREATED, db_capture)
         logger.info(f"Created user capture for user_id {capture_create.user_id}")
         return db_capture
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error creating user capture: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def publish_ingested(results: list):
+    """Push created events for a bulk ingest, or a single resync event when it is too large to stream."""
+    if not capture_events.active:
+        return
+    ids = [result["id"] for result in results if result["status"] == "created"]
+    if len(ids) > EVENTS_BULK_LIMIT:
+        capture_events.publish_resync("bulk_ingest", len(ids))
+        return
+    if ids:
+        async with AsyncSessionLocal() as db:
+            rows = await fetch_all(db, select(*SUMMARY_COLUMNS).where(UserCapture.id.in_(ids)).order_by(UserCapture.id))
+        for row in rows:
+            capture_events.publish(CAPTURE_CREATED, row)
+
+def _ingest(items: list, start_index: int = 0) -> list:
+    db = SessionLocal()
+    try:
+        return ingest_captures(db, items, start_index)
+    finally:
+        db.close()
+
+@router.post("/user-captures/bulk", response_model=BulkIngestResponse)
+async def bulk_ingest_user_captures(request: Request):
+    """
+    Create many user captures in one request, skipping user_ids that already exist.
+    The body is either a JSON array of captures (inserted in one transaction) or, with
+    Content-Type application/x-ndjson, one capture per line, streamed and committed
+    every INGEST_BATCH_SIZE lines. Returns counts and a status per item, in order.
+    """
+    try:
+        media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+        if media_type in NDJSON_MEDIA_TYPES:
+            results = []
+            async for batch in ndjson_batches(request.stream(), INGEST_BATCH_SIZE):
+                results.extend(await run_in_threadpool(_ingest, batch, len(results)))
+        else:
+            try:
+                items = json.loads(await request.body())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+            if not isinstance(items, list):
+                raise HTTPException(status_code=400, detail="Body must be a JSON array of captures")
+            results = await run_in_threadpool(_ingest, items)
+        summary = ingest_summary(results)
+        await publish_ingested(results)
+        logger.info(
+            f"Bulk ingest: {summary['created']} created, {summary['duplicates']} duplicates, {summary['invalid']} invalid."
+        )
+        # Plain json.dumps; running tens of thousands of status items through response validation costs more than the insert
+        return JSONResponse(summary)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in bulk ingest: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.put("/user-captures/{capture_id}", response_model=UserCaptureResponse)
-def update_user_capture(capture_id: int, capture_update: UserCaptureUpdate, db: Session = Depends(get_db)):
+async def update_user_capture(
+    capture_id: int, capture_update: UserCaptureUpdate, db: AsyncSession = Depends(get_async_db)
+):
     """
     Update an existing user capture by ID.
     """
     try:
-        db_capture = db.query(UserCapture).filter(UserCapture.id == capture_id).first()
-        if db_capture is None:
-            raise HTTPException(status_code=404, detail="User capture not found")
+        db_capture = await get_capture(db, capture_id)
         
         update_data = capture_update.dict(exclude_unset=True)
+        if "image" in update_data:
+            update_data.update(await run_in_threadpool(image_columns, update_data.pop("image")))
+        if "ai_response" in update_data:
+            update_data.update(analysis_columns(update_data["ai_response"]))
         for field, value in update_data.items():
             setattr(db_capture, field, value)
         
-        db.commit()
-        db.refresh(db_capture)
+        await db.commit()
+        capture_events.publish(CAPTURE_UPDATED, db_capture)
         logger.info(f"Updated user capture ID {capture_id}")
         return db_capture
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error updating user capture ID {capture_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
     
-@router.get("/user-captures/time-range/", response_model=List[UserCaptureResponse])
-def read_user_captures_by_time_range(
+@router.get("/user-captures/time-range/", response_model=CaptureListResponse)
+async def read_user_captures_by_time_range(
     start_time: datetime,
     end_time: datetime,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    view: Literal["full", "summary"] = "full",
+    thumbnails: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Retrieve a paginated list of user captures within a specified time range.
     start_time and end_time should be in ISO 8601 format (e.g., 2025-11-14T00:00:00).
+    Results are in (created_at, id) order via an index range scan; use the
+    X-Next-Cursor response header as `cursor` for the next page.
+    view=summary returns UserCaptureSummary items without the image.
+    Ranges reaching back into archived days also read the archive files (archive_captures.py).
     """
     try:
         if start_time > end_time:
             raise HTTPException(status_code=400, detail="start_time must be before end_time")
         
-        query = db.query(UserCapture).filter(
+        stmt = capture_select(view).where(
             UserCapture.created_at >= start_time,
             UserCapture.created_at <= end_time
         )
-        captures = query.offset(skip).limit(limit).all()
+        archived = await archive_files(db, start_time, end_time)
+        if archived:
+            captures, next_cursor = await keyset_page_with_archive(
+                db, stmt, archived, start_time, end_time, limit, cursor, order, skip
+            )
+        else:
+            captures, next_cursor = await keyset_page(db, stmt, limit, cursor, order, skip)
         logger.info(f"Retrieved {len(captures)} user captures from {start_time} to {end_time}.")
-        return captures
+        return await list_response(captures, list_adapter(view), thumbnails, next_cursor)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving user captures by time range: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/user-captures/bbox/", response_model=CaptureListResponse)
+async def read_user_captures_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    view: Literal["full", "summary"] = "full",
+    thumbnails: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retrieve user captures inside a bounding box, optionally within a time range.
+    A box with min_lon > max_lon wraps across the antimeridian.
+    view=summary returns UserCaptureSummary items without the image.
+    """
+    try:
+        if min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+        if start_time and end_time and start_time > end_time:
+            raise HTTPException(status_code=400, detail="start_time must be before end_time")
+
+        columns = SUMMARY_COLUMNS if view == "summary" else None
+        stmt = captures_in_bbox_select(min_lat, min_lon, max_lat, max_lon, start_time, end_time, columns)
+        captures = await fetch_all(db, stmt.order_by(UserCapture.id).offset(skip).limit(limit))
+        logger.info(f"Retrieved {len(captures)} user captures in bbox ({min_lat}, {min_lon}, {max_lat}, {max_lon}).")
+        return await list_response(captures, list_adapter(view), thumbnails)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving user captures by bbox: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/user-captures/export/")
+def export_user_captures(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    compression: Literal["none", "gzip", "zstd"] = "none",
+    images: Literal["reference", "inline", "none"] = "reference",
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    ordnance_type: Optional[List[str]] = Query(None),
+):
+    """
+    Download all user captures, or those in a time range / bounding box, as one NDJSON or
+    CSV file, optionally gzip or zstd compressed. The rows are streamed from a server-side
+    cursor, so memory use does not grow with the export. images=reference gives the
+    /v1/images/{sha256} path of each image, inline its data URL (an inline NDJSON export
+    can be loaded back through /v1/user-captures/bulk), none leaves it out.
+    """
+    try:
+        bounds = (min_lat, min_lon, max_lat, max_lon)
+        if any(b is None for b in bounds) and any(b is not None for b in bounds):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+        if min_lat is not None and min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+        if start_time and end_time and start_time > end_time:
+            raise HTTPException(status_code=400, detail="start_time must be before end_time")
+        stmt = export_select(start_time, end_time, bounds if min_lat is not None else None, ordnance_type)
+        chunks = export_stream(stmt, format, compression, images)
+        return StreamingResponse(
+            chunks,
+            media_type=COMPRESSIONS[compression][0] or EXPORT_FORMATS[format],
+            headers={"Content-Disposition": f'attachment; filename="{export_filename(format, compression)}"'},
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting user capture export: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/user-captures/nearby/", response_model=List[NearbyCaptureResponse])
+async def read_user_captures_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, gt=0),
+    limit: int = Query(20, ge=1, le=1000),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retrieve the `limit` user captures nearest to (lat, lon), ordered by distance.
+    radius_m restricts the search to a circle; start_time/end_time to a time range.
+    """
+    try:
+        if start_time and end_time and start_time > end_time:
+            raise HTTPException(status_code=400, detail="start_time must be before end_time")
+
+        results = await nearest_captures(db, lat, lon, limit, radius_m, start_time, end_time)
+        captures = []
+        for capture, distance in results:
+            capture.distance_m = round(distance, 1)
+            captures.append(capture)
+        logger.info(f"Retrieved {len(captures)} user captures near ({lat}, {lon}).")
+        return await list_response(captures, nearby_list_adapter)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving nearby user captures: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.delete("/user-captures/{capture_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user_capture(capture_id: int, db: Session = Depends(get_db)):
+async def delete_user_capture(capture_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a user capture by ID.
     """
     try:
-        db_capture = db.query(UserCapture).filter(UserCapture.id == capture_id).first()
-        if db_capture is None:
-            raise HTTPException(status_code=404, detail="User capture not found")
+        db_capture = await get_capture(db, capture_id)
         
-        db.delete(db_capture)
-        db.commit()
+        await db.delete(db_capture)
+        await db.commit()
+        capture_events.publish(CAPTURE_DELETED, db_capture)
         logger.info(f"Deleted user capture ID {capture_id}")
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error deleting user capture ID {capture_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/images/{sha256}")
+async def read_image(sha256: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Serve a stored image by its SHA-256 digest. Blobs are immutable, so they can be cached forever.
+    """
+    try:
+        path = image_store.path_for(sha256)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image digest")
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{sha256}"'}
+    if not path.exists():
+        # Archived blobs are read back from their zip
+        mime = await db.scalar(select(ArchivedImage.mime).where(ArchivedImage.sha256 == sha256))
+        try:
+            data = await run_in_threadpool(image_store.read, sha256)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Image not found")
+        return Response(data, media_type=mime or "application/octet-stream", headers=headers)
+    mime = await db.scalar(select(UserCapture.image_mime).where(UserCapture.image_sha256 == sha256).limit(1))
+    return FileResponse(path, media_type=mime or "application/octet-stream", headers=headers)
+
+@router.get("/inference-cache/stats")
+def read_inference_cache_stats():
+    """
+    Hit/miss counters and occupancy of the inference result cache.
+    """
+    return inference_cache.snapshot()
+
+@router.get("/batching/stats")
+def read_batching_stats():
+    """
+    Batch size, wait time and batch service time statistics of the vision query dispatcher.
+    """
+    return vision_dispatcher.snapshot()
+
+@router.get("/llm/stats")
+def read_llm_stats():
+    """
+    In-flight requests and latency percentiles of the LLM client.
+    Streamed calls report time-to-first-token separately from total stream time.
+    Each backend reports its health, circuit breaker state, load, errors and latency.
+    """
+    return llm.snapshot()
+
+def _prompt_response(prompt, include_text: bool) -> PromptResponse:
+    return PromptResponse.model_validate({
+        **prompt._asdict(),
+        "latest": prompt_registry.latest_id(prompt.name) == prompt.id,
+        "text": prompt.text if include_text else None,
+    })
+
+@router.get("/prompts", response_model=List[PromptResponse])
+def read_prompts():
+    """
+    Registered system prompts (without their text). Send the id, or the name for the
+    latest version, as prompt_id instead of posting system_prompt text.
+    """
+    return [_prompt_response(prompt, include_text=False) for prompt in prompt_registry.prompts()]
+
+@router.get("/prompts/{prompt_id}", response_model=PromptResponse)
+def read_prompt(prompt_id: str):
+    """
+    A registered system prompt with its canonical text, by id or by name (latest version).
+    """
+    try:
+        return _prompt_response(prompt_registry.get(prompt_id), include_text=True)
+    except UnknownPromptError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/inference-jobs/stats")
+async def read_inference_job_stats():
+    """
+    Queue depth by status, queue wait and service time percentiles, and worker
+    utilization of the background inference jobs (uploads with wait=false).
+    """
+    return await inference_jobs.snapshot()
+
+@router.get("/inference-jobs/{job_id}", response_model=InferenceJobResponse)
+async def read_inference_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Status of a background inference job; the response itself is stored on its capture.
+    """
+    try:
+        job = await db.get(InferenceJob, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Inference job not found")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving inference job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/capture-events")
+async def stream_capture_events(
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    """
+    Server-Sent Events for captures as they are created, updated (e.g. answered by an
+    inference job) and deleted, instead of polling /v1/user-captures/. Each event
+    carries a UserCaptureSummary. An optional bounding box (all four bounds; min_lon >
+    max_lon wraps the antimeridian) and created_at range limit which captures are sent.
+    A "gap" event means events were dropped because this console fell behind, and a
+    "resync" event that a bulk ingest was too large to stream; backfill over REST.
+    """
+    bounds = (min_lat, min_lon, max_lat, max_lon)
+    if any(b is None for b in bounds) and any(b is not None for b in bounds):
+        raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+    bbox = bounds if min_lat is not None else None
+    if bbox and min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+    if start_time and end_time and start_time > end_time:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
+    try:
+        capture_events.check_capacity()
+    except SubscriberLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return sse_response(capture_events.stream(bbox, start_time, end_time))
+
+@router.get("/capture-events/stats")
+def read_capture_event_stats():
+    """
+    Subscriber count, deepest subscriber queue and published/delivered/dropped event counters.
+    """
+    return capture_events.snapshot()
+
+@router.get("/incidents", response_model=List[IncidentResponse])
+async def read_incidents(
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    min_captures: int = Query(1, ge=1),
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Near-duplicate uploads grouped by incident, most recently active first: one entry per
+    object however many people photographed it. start_time/end_time bound last_seen_at;
+    min_captures=2 lists only objects reported more than once. Each incident carries its
+    capture ids and its most confident analysis as `representative`.
+    """
+    try:
+        if start_time and end_time and start_time > end_time:
+            raise HTTPException(status_code=400, detail="start_time must be before end_time")
+        stmt = select(Incident).where(Incident.capture_count >= min_captures)
+        if start_time is not None:
+            stmt = stmt.where(Incident.last_seen_at >= start_time)
+        if end_time is not None:
+            stmt = stmt.where(Incident.last_seen_at <= end_time)
+        stmt = stmt.order_by(Incident.last_seen_at.desc(), Incident.id.desc()).offset(skip).limit(limit)
+        incidents = await fetch_all(db, stmt)
+        return await list_response(await incident_items(db, incidents, SUMMARY_COLUMNS), incident_list_adapter)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving incidents: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/incidents/{incident_id}", response_model=IncidentResponse)
+async def read_incident(incident_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    One incident with the summaries of all of its captures, oldest first.
+    """
+    try:
+        incident = await db.get(Incident, incident_id)
+        if incident is None:
+            raise HTTPException(status_code=404, detail="Incident not found")
+        [item] = await incident_items(db, [incident], SUMMARY_COLUMNS, with_captures=True)
+        return item
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving incident {incident_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def _analytics_response(value: dict) -> Response:
+    return Response(
+        content=analytics_adapter.dump_json(analytics_adapter.validate_python(value), by_alias=True),
+        media_type="application/json",
+    )
+
+@router.get("/analytics/captures", response_model=CaptureAnalyticsResponse)
+async def read_capture_analytics(
+    precision: int = Query(5, ge=1, le=max((p for p, _ in ROLLUP_LEVELS), default=1)),
+    bucket: Literal["hour", "day", "week"] = "hour",
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180),
+    ordnance_type: Optional[List[str]] = Query(None),
+    limit: int = Query(ROLLUP_MAX_ROWS, ge=1, le=ROLLUP_MAX_ROWS),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Captures per geohash cell (precision characters), time bucket (UTC hours, days or weeks
+    from Monday) and ordnance type, e.g. for heatmaps. Counts are read from rollups kept up
+    to date by every insert, update and delete, so the answer does not scan the captures.
+    start_time/end_time select whole buckets; a bounding box keeps the cells overlapping it.
+    """
+    try:
+        bounds = (min_lat, min_lon, max_lat, max_lon)
+        if any(b is None for b in bounds) and any(b is not None for b in bounds):
+            raise HTTPException(status_code=400, detail="Bounding box needs min_lat, min_lon, max_lat and max_lon")
+        bbox = bounds if min_lat is not None else None
+        if bbox and min_lat > max_lat:
+            raise HTTPException(status_code=400, detail="min_lat must not be greater than max_lat")
+        if start_time and end_time and start_time > end_time:
+            raise HTTPException(status_code=400, detail="start_time must be before end_time")
+        counts = await rollup_counts(
+            db, precision, bucket, start_time, end_time,
+            bbox=bbox, ordnance_types=ordnance_type, limit=limit,
+        )
+        return await run_in_threadpool(_analytics_response, {
+            "precision": precision,
+            "bucket": bucket,
+            "source_precision": counts.level[0],
+            "source_bucket_seconds": counts.level[1],
+            "truncated": counts.truncated,
+            "items": counts.items,
+        })
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing capture analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/tiles/stats")
+def read_tile_stats():
+    """
+    Hits, misses, invalidations and occupancy of the map tile cache.
+    """
+    return tile_cache.snapshot()
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def read_tile(
+    z: int,
+    x: int,
+    y: str,
+    format: Optional[Literal["geojson", "mvt"]] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Captures in web-mercator tile z/x/y, clustered on a grid: GeoJSON (default) or a
+    Mapbox Vector Tile with one "captures" layer, chosen by a .geojson/.json or .mvt/.pbf
+    extension on y or by format. Clusters carry point_count and specialist_count; single
+    captures their id, type, specialist flag, confidence and time. Tiles are cached until
+    a capture inside them changes and carry an ETag; If-None-Match answers 304.
+    """
+    try:
+        y_part, _, extension = y.partition(".")
+        if extension:
+            if extension not in TILE_EXTENSIONS:
+                raise HTTPException(status_code=400, detail="Tile extension must be .geojson, .json, .mvt or .pbf")
+            if format and format != TILE_EXTENSIONS[extension]:
+                raise HTTPException(status_code=400, detail="format does not match the tile extension")
+            format = TILE_EXTENSIONS[extension]
+        if not y_part.isdigit():
+            raise HTTPException(status_code=400, detail="Tile y must be an integer")
+        y_index = int(y_part)
+        if not 0 <= z <= TILE_MAX_ZOOM:
+            raise HTTPException(status_code=400, detail=f"Zoom must be between 0 and {TILE_MAX_ZOOM}")
+        if not (0 <= x < 1 << z and 0 <= y_index < 1 << z):
+            raise HTTPException(status_code=400, detail=f"Tile x and y must be between 0 and {(1 << z) - 1} at zoom {z}")
+        fmt = format or "geojson"
+        tile = await tile_cache.get(db, z, x, y_index, fmt)
+        headers = {"ETag": tile.etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, tile.etag):
+            TILE_REQUESTS.inc(("not_modified",))
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=tile.body, media_type=tile.media_type, headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error rendering tile {z}/{x}/{y}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.post("/indic_chat", response_model=ChatResponse)
 async def indic_chat_endpoint(chat_request: ChatRequest, api_key: Optional[str] = Header(None)):
     """Handle chat requests (dummy implementation)."""
@@ -173,21 +779,26 @@ async def indic_chat_endpoint(chat_request: ChatRequest, api_key: Optional[str]
 async def indic_visual_query_endpoint(
     file: UploadFile = File(...),
     query: str = Form(...),
+    prompt_id: Optional[str] = Form(None),
     src_lang: str = Query("eng_Latn"),
     tgt_lang: str = Query("eng_Latn"),
     api_key: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle visual queries via image upload."""
     # In production, validate api_key
-    # Pass system_prompt explicitly when calling internally
+    # Pass every form field explicitly when calling internally (no system_prompt: the registry default)
     # Note: upload_image_query_endpoint now requires db, but since it's async and Depends, it should work
     response_content = await upload_image_query_endpoint(
         text=query, 
-        system_prompt=DEFAULT_SYSTEM_PROMPT, 
+        prompt_id=prompt_id,
+        system_prompt=None, 
         lat=52.5200,  # Default lat
         lon=13.4050,  # Default lon
         file=file,
+        deadline_ms=None,
+        stream=False,
+        wait=True,
         db=db
     )
     return VisualQueryResponse(
@@ -199,31 +810,65 @@ async def indic_visual_query_endpoint(
 @router.post("/extract-text", response_model=ExtractTextResponse)
 async def extract_text_endpoint(
     file: UploadFile = File(...),
-    page_number: int = Query(...),
+    page_number: int = Query(..., ge=1),
     language: str = Query(...),
-    api_key: Optional[str] = Header(None)
+    api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Extract text from a specific PDF page (dummy implementation)."""
-    # In production, integrate real PDF extraction logic (e.g., using PyMuPDF or pdfplumber)
-    content = await file.read()
-    decoded_content = content[:200].decode('utf-8', errors='ignore')  # Limit for demo
-    return ExtractTextResponse(
-        extracted_text=f"Extracted from page {page_number}: {decoded_content}...",
-        page_number=page_number,
-        language=language
-    )
+    """
+    Text of one page (1-based) of an uploaded PDF, read from its text layer; language is
+    echoed back. Pages are cached by document hash, so a client paging through a document
+    it uploads with every request only waits for extraction once per page.
+    """
+    # In production, validate api_key
+    try:
+        upload = await spool_upload(file, max_bytes=PDF_MAX_BYTES)
+        document = await extract_pages(db, upload, [page_number])
+        return ExtractTextResponse(
+            extracted_text=document.pages[page_number],
+            page_number=page_number,
+            language=language,
+            page_count=document.page_count
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error extracting PDF text: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.post("/indic-summarize-pdf-all", response_model=PdfSummaryResponse)
 async def indic_summarize_pdf_endpoint(
     file: UploadFile = File(...),
     tgt_lang: str = Form(...),
-    model: str = Form(...),
-    api_key: Optional[str] = Header(None)
+    model: str = Form(LLM_MODEL),
+    api_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Summarize entire PDF (dummy implementation)."""
-    # In production, integrate real PDF summarization (e.g., extract all pages and use LLM)
-    return PdfSummaryResponse(
-        summary="Dummy PDF summary in target language.",
-        tgt_lang=tgt_lang,
-        model=model
-    )
\ No newline at end of file
+    """
+    Summarize every page of an uploaded PDF in tgt_lang (a FLORES-200 code such as kan_Knda).
+    Pages are extracted in parallel worker processes (or read from the page cache), then
+    summarized map-reduce: page chunks concurrently, and their summaries combined.
+    """
+    # In production, validate api_key
+    try:
+        upload = await spool_upload(file, max_bytes=PDF_MAX_BYTES)
+        document = await extract_pages(db, upload)
+        summary = await summarize(document.pages, tgt_lang, model)
+        return PdfSummaryResponse(
+            summary=summary.text,
+            tgt_lang=tgt_lang,
+            model=model,
+            page_count=document.page_count,
+            chunks=summary.chunks
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LLMTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error summarizing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error")
@@ -1,6 +1,6 @@
 # File: schemas.py (updated - added query_text and ai_response to UserCapture models)
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -26,11 +26,120 @@ class UserCaptureResponse(BaseModel):
     id: int = Field(..., alias="id")
     userId: str = Field(..., alias="user_id")
     queryText: str = Field(..., alias="query_text")
-    image: str = Field(..., alias="image")  # Base64 encoded string
+    image: str = Field(..., alias="image")  # Base64 data URL, served from the image store
+    imageSha256: Optional[str] = Field(None, alias="image_sha256")
+    imageSize: Optional[int] = Field(None, alias="image_size")
+    imageMime: Optional[str] = Field(None, alias="image_mime")
     latitude: float = Field(..., alias="latitude")
     longitude: float = Field(..., alias="longitude")
-    aiResponse: str = Field(..., alias="ai_response")
+    aiResponse: Optional[str] = Field(None, alias="ai_response")  # None while an inference job is pending
+    inferenceStatus: Optional[str] = Field(None, alias="inference_status")  # queued | done | failed; None if answered on upload
     createdAt: datetime = Field(..., alias="created_at")
+    ordnanceType: Optional[str] = Field(None, alias="ordnance_type")
+    ordnanceSubtype: Optional[str] = Field(None, alias="ordnance_subtype")
+    countryOfOrigin: Optional[str] = Field(None, alias="country_of_origin")
+    productionPeriod: Optional[str] = Field(None, alias="production_period")
+    warcrimeAssessment: Optional[str] = Field(None, alias="warcrime_assessment")
+    needsSpecialist: Optional[bool] = Field(None, alias="needs_specialist")
+    confidence: Optional[float] = Field(None, alias="confidence")
+    shortAdvice: Optional[str] = Field(None, alias="short_advice")
+    incidentId: Optional[int] = Field(None, alias="incident_id")  # near-duplicate uploads share one
 
     class Config:
-        from_attributes = True  # Allows mapping from SQLAlchemy models
\ No newline at end of file
+        from_attributes = True  # Allows mapping from SQLAlchemy models
+
+class NearbyCaptureResponse(UserCaptureResponse):
+    distanceM: float = Field(..., alias="distance_m")
+
+
+class UserCaptureSummary(BaseModel):
+    """Lightweight list item for maps and tables; never carries the full image."""
+    id: int = Field(..., alias="id")
+    userId: str = Field(..., alias="user_id")
+    latitude: float = Field(..., alias="latitude")
+    longitude: float = Field(..., alias="longitude")
+    createdAt: datetime = Field(..., alias="created_at")
+    ordnanceType: Optional[str] = Field(None, alias="ordnance_type")
+    warcrimeAssessment: Optional[str] = Field(None, alias="warcrime_assessment")
+    needsSpecialist: Optional[bool] = Field(None, alias="needs_specialist")
+    confidence: Optional[float] = Field(None, alias="confidence")
+    shortAdvice: Optional[str] = Field(None, alias="short_advice")
+    imageSha256: Optional[str] = Field(None, alias="image_sha256")  # fetch via /v1/images/{sha256}
+    inferenceStatus: Optional[str] = Field(None, alias="inference_status")
+    incidentId: Optional[int] = Field(None, alias="incident_id")
+    thumbnail: Optional[str] = Field(None, alias="thumbnail")  # small JPEG data URL, only with thumbnails=true
+
+    class Config:
+        from_attributes = True
+
+
+class BulkIngestItem(BaseModel):
+    """Outcome for one item of a bulk ingest, in request order."""
+    index: int = Field(..., alias="index")
+    userId: Optional[str] = Field(None, alias="user_id")
+    status: str = Field(..., alias="status")  # created | duplicate | invalid
+    id: Optional[int] = Field(None, alias="id")  # set for created items
+    detail: Optional[str] = Field(None, alias="detail")
+
+class BulkIngestResponse(BaseModel):
+    created: int = Field(..., alias="created")
+    duplicates: int = Field(..., alias="duplicates")
+    invalid: int = Field(..., alias="invalid")
+    items: List[BulkIngestItem] = Field(..., alias="items")
+
+
+class PromptResponse(BaseModel):
+    id: str = Field(..., alias="id")  # <name>.v<version>; send as prompt_id
+    name: str = Field(..., alias="name")  # also accepted as prompt_id, meaning the latest version
+    version: int = Field(..., alias="version")
+    latest: bool = Field(..., alias="latest")
+    sha256: str = Field(..., alias="sha256")  # of the canonical text
+    tokens: int = Field(..., alias="tokens")
+    tokensExact: bool = Field(..., alias="tokens_exact")  # false: estimated, the backend tokenizer was unavailable
+    text: Optional[str] = Field(None, alias="text")
+
+
+class InferenceJobResponse(BaseModel):
+    id: int = Field(..., alias="id")
+    captureId: int = Field(..., alias="capture_id")
+    status: str = Field(..., alias="status")  # queued | running | done | failed
+    attempts: int = Field(..., alias="attempts")
+    lastError: Optional[str] = Field(None, alias="last_error")
+    createdAt: datetime = Field(..., alias="created_at")
+    availableAt: Optional[datetime] = Field(None, alias="available_at")  # next attempt is not before this
+    startedAt: Optional[datetime] = Field(None, alias="started_at")
+    finishedAt: Optional[datetime] = Field(None, alias="finished_at")
+
+    class Config:
+        from_attributes = True
+
+
+class IncidentResponse(BaseModel):
+    """Near-duplicate captures of one object, for reviewing a report once instead of per upload."""
+    id: int = Field(..., alias="id")
+    latitude: Optional[float] = Field(None, alias="latitude")  # of the first capture
+    longitude: Optional[float] = Field(None, alias="longitude")
+    firstSeenAt: datetime = Field(..., alias="first_seen_at")
+    lastSeenAt: datetime = Field(..., alias="last_seen_at")
+    captureCount: int = Field(..., alias="capture_count")
+    representative: Optional[UserCaptureSummary] = Field(None, alias="representative")  # most confident analysis
+    captureIds: List[int] = Field(..., alias="capture_ids")
+    captures: Optional[List[UserCaptureSummary]] = Field(None, alias="captures")  # only on /v1/incidents/{id}
+
+
+class RollupCountResponse(BaseModel):
+    geohash: str = Field(..., alias="geohash")
+    latitude: float = Field(..., alias="latitude")  # cell centre
+    longitude: float = Field(..., alias="longitude")
+    bucketStart: datetime = Field(..., alias="bucket_start")  # UTC
+    ordnanceType: str = Field(..., alias="ordnance_type")  # "unclassified" until the capture is analyzed
+    count: int = Field(..., alias="count")
+
+class CaptureAnalyticsResponse(BaseModel):
+    """Capture counts per geohash cell, time bucket and ordnance type, from the pre-aggregated rollups."""
+    precision: int = Field(..., alias="precision")  # geohash characters
+    bucket: str = Field(..., alias="bucket")  # hour | day | week
+    sourcePrecision: int = Field(..., alias="source_precision")  # stored level the counts were summed from
+    sourceBucketSeconds: int = Field(..., alias="source_bucket_seconds")
+    truncated: bool = Field(..., alias="truncated")  # more rows matched than limit; narrow the range
+    items: List[RollupCountResponse] = Field(..., alias="items")
@@ -0,0 +1,239 @@
+# File: tiles.py
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from config import TILE_MAX_ZOOM, TILE_CLUSTER_GRID, TILE_EXTENT, TILE_CACHE_SIZE, TILE_INVALIDATE_MAX
+from database import CaptureChange, UserCapture
+from geo import captures_in_bbox_select, mercator, tile_bounds, tile_for_point
+from metrics import TILE_REQUESTS, span
+from mvt import PointFeature, encode_layer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"geojson": "application/geo+json", "mvt": "application/vnd.mapbox-vector-tile"}
+EXTENSIONS = {"geojson": "geojson", "json": "geojson", "mvt": "mvt", "pbf": "mvt"}  # tile path suffix -> format
+LAYER = "captures"
+
+
+class Tile(NamedTuple):
+    body: bytes
+    etag: str
+    media_type: str
+
+
+class Cluster(NamedTuple):
+    """The captures of one grid cell of a tile; for a single capture, its own fields."""
+    count: int
+    latitude: float  # mean of the captures
+    longitude: float
+    specialists: int  # captures that need a specialist
+    id: int  # the fields below are those of the single capture when count == 1
+    ordnance_type: Optional[str]
+    needs_specialist: Optional[bool]
+    confidence: Optional[float]
+    created_at: Optional[str]
+
+
+async def cluster_tile(db: AsyncSession, z: int, x: int, y: int, grid: int = TILE_CLUSTER_GRID) -> List[Cluster]:
+    """
+    Captures inside tile z/x/y grouped into grid x grid cells, aggregated in SQL over the
+    R*Tree, so a tile costs one query and at most grid * grid rows however many captures
+    it holds. Cells are split evenly in latitude rather than in mercator y; inside one
+    tile the difference only shows at the lowest zooms, and only in where cell borders fall.
+    """
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+    n = 1 << z
+    gx = func.min(cast((UserCapture.longitude - min_lon) * grid / (max_lon - min_lon), Integer), grid - 1)
+    gy = func.min(cast((max_lat - UserCapture.latitude) * grid / (max_lat - min_lat), Integer), grid - 1)
+    columns = (
+        func.count().label("count"),
+        func.avg(UserCapture.latitude).label("latitude"),
+        func.avg(UserCapture.longitude).label("longitude"),
+        func.coalesce(func.sum(cast(UserCapture.needs_specialist, Integer)), 0).label("specialists"),
+        func.max(UserCapture.id).label("id"),
+        func.max(UserCapture.ordnance_type).label("ordnance_type"),
+        func.max(UserCapture.needs_specialist).label("needs_specialist"),
+        func.max(UserCapture.confidence).label("confidence"),
+        func.max(UserCapture.created_at).label("created_at"),
+    )
+    stmt = captures_in_bbox_select(min_lat, min_lon, max_lat, max_lon, columns=columns)
+    # Tiles share their edges; a capture on one belongs to the tile east / south of it
+    if x < n - 1:
+        stmt = stmt.where(UserCapture.longitude < max_lon)
+    if y < n - 1:
+        stmt = stmt.where(UserCapture.latitude > min_lat)
+    rows = (await db.execute(stmt.group_by(gx, gy))).all()
+    return [
+        Cluster(
+            row.count, row.latitude, row.longitude, row.specialists, row.id, row.ordnance_type,
+            None if row.needs_specialist is None else bool(row.needs_specialist), row.confidence,
+            str(row.created_at).replace(" ", "T") if row.created_at is not None else None,
+        )
+        for row in rows
+    ]
+
+
+def _properties(cluster: Cluster) -> dict:
+    if cluster.count > 1:
+        return {"cluster": True, "point_count": cluster.count, "specialist_count": cluster.specialists}
+    return {
+        "cluster": False, "id": cluster.id, "ordnance_type": cluster.ordnance_type,
+        "needs_specialist": cluster.needs_specialist, "confidence": cluster.confidence,
+        "created_at": cluster.created_at,
+    }
+
+
+def render_geojson(clusters: List[Cluster]) -> bytes:
+    features = []
+    for cluster in clusters:
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(cluster.longitude, 7), round(cluster.latitude, 7)]},
+            "properties": _properties(cluster),
+        }
+        if cluster.count == 1:
+            feature["id"] = cluster.id
+        features.append(feature)
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode("utf-8")
+
+
+def render_mvt(clusters: List[Cluster], z: int, x: int, y: int, extent: int = TILE_EXTENT) -> bytes:
+    n = 1 << z
+    features = []
+    for cluster in clusters:
+        fx, fy = mercator(cluster.latitude, cluster.longitude)
+        px = min(max(round((fx * n - x) * extent), 0), extent)
+        py = min(max(round((fy * n - y) * extent), 0), extent)
+        features.append(PointFeature(px, py, _properties(cluster), cluster.id if cluster.count == 1 else None))
+    return encode_layer(LAYER, features, extent)
+
+
+def render(clusters: List[Cluster], z: int, x: int, y: int, fmt: str) -> Tile:
+    body = render_geojson(clusters) if fmt == "geojson" else render_mvt(clusters, z, x, y)
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+    return Tile(body, etag, FORMATS[fmt])
+
+
+class TileCache:
+    """
+    LRU of rendered tiles, (z, x, y, format) -> Tile, invalidated from capture_changes.
+
+    Triggers log the position of every capture insert, delete and tile-visible update to
+    capture_changes, whatever the write path. Before each lookup the rows past the last
+    seq seen are read and every cached tile containing one of those positions, at every
+    zoom, is dropped. More than TILE_INVALIDATE_MAX pending changes, or changes pruned
+    before they were read, clear the whole cache. Tiles are per process, like the cache
+    state; a tile rendered while an invalidation ran is served but not kept.
+    """
+
+    def __init__(self, max_entries: int = TILE_CACHE_SIZE, max_zoom: int = TILE_MAX_ZOOM):
+        self.max_entries = max_entries
+        self.max_zoom = max_zoom
+        self._entries = OrderedDict()
+        self._zooms = Counter()  # cached tiles per zoom; zooms without any are skipped when invalidating
+        self._seq: Optional[int] = None  # last capture_changes row applied
+        self._generation = 0  # bumped by every invalidation
+        self.stats = {"hits": 0, "misses": 0, "invalidated": 0, "cleared": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def clear(self):
+        self._entries.clear()
+        self._zooms.clear()
+        self._generation += 1
+        self.stats["cleared"] += 1
+
+    def _drop(self, key):
+        if self._entries.pop(key, None) is not None:
+            self._zooms[key[0]] -= 1
+            self.stats["invalidated"] += 1
+
+    def invalidate_point(self, lat: float, lon: float):
+        for z in range(self.max_zoom + 1):
+            if self._zooms[z]:
+                x, y = tile_for_point(lat, lon, z)
+                for fmt in FORMATS:
+                    self._drop((z, x, y, fmt))
+
+    async def sync(self, db: AsyncSession):
+        """Apply the capture changes logged since the last call."""
+        last = self._seq
+        if last is None:
+            self._seq = await db.scalar(select(func.coalesce(func.max(CaptureChange.seq), 0)))
+            return
+        rows = (await db.execute(
+            select(CaptureChange.seq, CaptureChange.latitude, CaptureChange.longitude)
+            .where(CaptureChange.seq > last).order_by(CaptureChange.seq).limit(TILE_INVALIDATE_MAX + 1)
+        )).all()
+        if not rows:
+            return
+        if len(rows) > TILE_INVALIDATE_MAX or rows[0].seq != last + 1:
+            self.clear()
+            self._seq = await db.scalar(select(func.max(CaptureChange.seq)))
+            return
+        if self._entries:
+            for _, lat, lon in rows:
+                self.invalidate_point(lat, lon)
+            self._generation += 1
+        self._seq = rows[-1].seq
+
+    async def get(self, db: AsyncSession, z: int, x: int, y: int, fmt: str) -> Tile:
+        """The tile, from the cache if no capture inside it changed since it was rendered."""
+        if not self.enabled:
+            return await self._render(db, z, x, y, fmt)
+        await self.sync(db)
+        key = (z, x, y, fmt)
+        tile = self._entries.get(key)
+        if tile is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            TILE_REQUESTS.inc(("hit",))
+            return tile
+        self.stats["misses"] += 1
+        generation = self._generation
+        tile = await self._render(db, z, x, y, fmt)
+        if generation == self._generation and key not in self._entries:
+            self._entries[key] = tile
+            self._zooms[z] += 1
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._zooms[evicted[0]] -= 1
+                self.stats["evictions"] += 1
+        return tile
+
+    async def _render(self, db: AsyncSession, z: int, x: int, y: int, fmt: str) -> Tile:
+        TILE_REQUESTS.inc(("rendered",))
+        with span("tile_render"):
+            clusters = await cluster_tile(db, z, x, y)
+            return await run_in_threadpool(render, clusters, z, x, y, fmt)
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "change_seq": self._seq,
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names etag (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+tile_cache = TileCache()
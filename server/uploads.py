@@ -0,0 +1,48 @@
+# File: uploads.py
+import hashlib
+from typing import BinaryIO, NamedTuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from config import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class SpooledUpload(NamedTuple):
+    """
+    An uploaded file left where the multipart parser spooled it (memory up to 1 MB,
+    a temporary file above), with its size and digest. Consumers read it in chunks
+    or hand the file object to Pillow instead of copying it into one bytes object.
+    """
+    file: BinaryIO
+    size: int
+    sha256: str
+    mime: str
+
+
+def _hash_file(f: BinaryIO, max_bytes: int, chunk_size: int):
+    digest = hashlib.sha256()
+    size = 0
+    f.seek(0)
+    while chunk := f.read(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLargeError(f"File exceeds the {max_bytes} byte upload limit")
+        digest.update(chunk)
+    f.seek(0)
+    return size, digest.hexdigest()
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> SpooledUpload:
+    """
+    Size-check and hash an upload chunk by chunk, off the event loop.
+    Raises UploadTooLargeError above max_bytes.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"File exceeds the {max_bytes} byte upload limit")
+    size, sha256 = await run_in_threadpool(_hash_file, file.file, max_bytes, UPLOAD_CHUNK_SIZE)
+    return SpooledUpload(file.file, size, sha256, file.content_type)
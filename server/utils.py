@@ -1,7 +1,45 @@
 # utils.py
 import base64
+import json
+from typing import Optional
+
+from fastapi.responses import StreamingResponse
 
 def encode_image(image_path: str) -> str:
     """Encode a local image file to base64 string."""
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
\ No newline at end of file
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..1) of an unsorted sequence; 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def sse_event(data: dict, event: Optional[str] = None, id: Optional[int] = None) -> str:
+    """Format one Server-Sent Event."""
+    prefix = f"id: {id}\n" if id is not None else ""
+    prefix += f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+def sse_response(events) -> StreamingResponse:
+    """Stream Server-Sent Events without caching or proxy buffering."""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def vision_messages(system_prompt: str, text: str, image_url: str) -> list:
+    """Chat messages for one vision query: system prompt, then the user's text and image."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": text},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        }
+    ]